@@ -0,0 +1,37 @@
+"""add short code allocator
+
+Revision ID: 3f6c1b2a9d41
+Revises: dbe828825ee7
+Create Date: 2026-10-18 10:12:40.218311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c1b2a9d41'
+down_revision: Union[str, None] = 'dbe828825ee7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases without sequences (SQLite) allocate from code_counters instead.
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_seq', start=1)))
+    op.create_table('code_counters',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('code_counters')
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.DropSequence(sa.Sequence('short_code_seq')))
@@ -0,0 +1,47 @@
+"""add click events and rollups
+
+Revision ID: 5d0b8e3f1c72
+Revises: a57f2c0e9d84
+Create Date: 2026-10-18 19:12:26.330418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0b8e3f1c72'
+down_revision: Union[str, None] = 'a57f2c0e9d84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('clicks',
+    sa.Column('clicked_at', sa.DateTime(), nullable=False),
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('short_code', sa.String(), nullable=False),
+    sa.Column('referrer_host', sa.String(), nullable=True),
+    sa.Column('ua_class', sa.String(length=16), nullable=True),
+    sa.Column('country', sa.String(length=2), nullable=True),
+    sa.PrimaryKeyConstraint('clicked_at', 'event_id'),
+    postgresql_partition_by='RANGE (clicked_at)'
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        # Daily partitions are created ahead by the event consumer; this only catches strays.
+        op.execute('CREATE TABLE clicks_default PARTITION OF clicks DEFAULT')
+    op.create_table('click_rollups',
+    sa.Column('short_code', sa.String(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('short_code', 'bucket')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('click_rollups')
+    op.drop_table('clicks')
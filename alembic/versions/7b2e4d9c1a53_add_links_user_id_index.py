@@ -0,0 +1,28 @@
+"""add links user_id index
+
+Revision ID: 7b2e4d9c1a53
+Revises: 3f6c1b2a9d41
+Create Date: 2026-10-18 14:03:11.540219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d9c1a53'
+down_revision: Union[str, None] = '3f6c1b2a9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_links_user_id_id', 'links', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_links_user_id_id', table_name='links')
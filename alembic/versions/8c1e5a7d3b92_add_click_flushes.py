@@ -0,0 +1,32 @@
+"""add click flush markers
+
+Revision ID: 8c1e5a7d3b92
+Revises: 5d0b8e3f1c72
+Create Date: 2026-10-18 21:40:11.502317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1e5a7d3b92'
+down_revision: Union[str, None] = '5d0b8e3f1c72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('click_flushes',
+    sa.Column('batch_id', sa.String(), nullable=False),
+    sa.Column('flushed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('batch_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('click_flushes')
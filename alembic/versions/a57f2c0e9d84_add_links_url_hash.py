@@ -0,0 +1,54 @@
+"""add links url_hash
+
+Revision ID: a57f2c0e9d84
+Revises: e91d3b7f6a20
+Create Date: 2026-10-18 17:55:32.604871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.urls import url_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a57f2c0e9d84'
+down_revision: Union[str, None] = 'e91d3b7f6a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('links', sa.Column('url_hash', sa.BigInteger(), nullable=True))
+
+    links = sa.table('links', sa.column('id', sa.Integer), sa.column('original_url', sa.String),
+                     sa.column('url_hash', sa.BigInteger))
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(links.c.id, links.c.original_url)
+            .where(links.c.id > last_id)
+            .order_by(links.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            links.update().where(links.c.id == sa.bindparam('b_id')).values(url_hash=sa.bindparam('b_hash')),
+            [{'b_id': row.id, 'b_hash': url_hash(row.original_url)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    op.create_index('ix_links_user_id_url_hash', 'links', ['user_id', 'url_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_links_user_id_url_hash', table_name='links')
+    op.drop_column('links', 'url_hash')
@@ -0,0 +1,36 @@
+"""add links expires_at partial index
+
+Revision ID: c4a8e0f27b16
+Revises: 7b2e4d9c1a53
+Create Date: 2026-10-18 15:21:47.903114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e0f27b16'
+down_revision: Union[str, None] = '7b2e4d9c1a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction; it keeps links writable while the index builds.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_links_expires_at', 'links', ['expires_at'], unique=False,
+            postgresql_where=sa.text('expires_at IS NOT NULL'),
+            postgresql_concurrently=True,
+            sqlite_where=sa.text('expires_at IS NOT NULL'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_links_expires_at', table_name='links', postgresql_concurrently=True)
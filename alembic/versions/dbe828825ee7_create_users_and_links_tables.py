@@ -29,16 +29,19 @@ def upgrade() -> None:
     )
     op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
     op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
-    op.add_column('links', sa.Column('user_id', sa.Integer(), nullable=True))
-    op.create_foreign_key(None, 'links', 'users', ['user_id'], ['id'])
+    # Batch mode so SQLite, which can't ALTER constraints, rebuilds the table; elsewhere it is a plain ALTER.
+    with op.batch_alter_table('links') as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('links_user_id_fkey', 'users', ['user_id'], ['id'])
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(None, 'links', type_='foreignkey')
-    op.drop_column('links', 'user_id')
+    with op.batch_alter_table('links') as batch_op:
+        batch_op.drop_constraint('links_user_id_fkey', type_='foreignkey')
+        batch_op.drop_column('user_id')
     op.drop_index(op.f('ix_users_id'), table_name='users')
     op.drop_index(op.f('ix_users_email'), table_name='users')
     op.drop_table('users')
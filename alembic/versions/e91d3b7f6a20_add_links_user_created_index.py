@@ -0,0 +1,28 @@
+"""add links user_id created_at index
+
+Revision ID: e91d3b7f6a20
+Revises: c4a8e0f27b16
+Create Date: 2026-10-18 16:40:05.117382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91d3b7f6a20'
+down_revision: Union[str, None] = 'c4a8e0f27b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_links_user_id_created_at_id', 'links', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_links_user_id_created_at_id', table_name='links')
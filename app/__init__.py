@@ -0,0 +1,7 @@
+# Loads .env before any submodule reads its settings from the environment.
+from app import settings
+
+if settings.env_flag("PROFILE_STARTUP"):
+    # Installed before anything heavy is imported, so the report covers FastAPI, SQLAlchemy, Redis, ...
+    from app.profiling import import_timer
+    import_timer.install()
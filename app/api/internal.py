@@ -0,0 +1,116 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.auth.hashing import password_hasher
+from app.bloom import link_guard
+from app.cache_warmup import warmup_state
+from app.db.metrics import pool_metrics
+from app.db.replicas import replica_set
+from app.local_cache import link_cache
+from app.metrics import Gauge, cache_lookups, register, render_metrics
+from app.rate_limit import rate_limiter
+from app.redis_cache import redis_stats
+from app.stampede import link_loads
+
+# /internal/* answers only to "Authorization: Bearer <INTERNAL_TOKEN>"; unset, the endpoints don't exist.
+# The readiness probe is the exception: orchestrator healthchecks call it without credentials.
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN", "")
+
+
+async def require_internal_token(authorization: str | None = Header(None)):
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {INTERNAL_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid internal token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/internal", tags=["Internal"], dependencies=[Depends(require_internal_token)])
+# Unauthenticated: /metrics and the readiness probe.
+metrics_router = APIRouter(include_in_schema=False)
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def redis_gauges() -> dict:
+    stats = redis_stats()
+    if not stats:
+        return {}
+    return {
+        ("breaker_state",): BREAKER_STATES[stats["breaker"]["state"]],
+        ("breaker_opened",): stats["breaker"]["opened"],
+        ("breaker_rejected",): stats["breaker"]["rejected"],
+        ("pool_in_use",): stats["pool"]["in_use"],
+        ("pool_max",): stats["pool"]["max_connections"],
+    }
+
+
+register(Gauge("db_pool_connections_in_use", "Checked-out connections per engine.", ("engine",),
+               lambda: {(name,): metrics.in_use for name, metrics in pool_metrics.items()}))
+# The local tier already counts its lookups, so the hot path pays nothing extra for them.
+cache_lookups.collect = lambda: {
+    ("local", "hit"): link_cache.hits, ("local", "stale"): link_cache.stale_hits, ("local", "miss"): link_cache.misses,
+}
+register(Gauge("local_cache_entries", "Entries in the in-process link cache.", (), lambda: {(): len(link_cache)}))
+register(Gauge("link_loads_inflight", "Coalesced cache-miss loads in progress.", (),
+               lambda: {(): link_loads.stats()["inflight"]}))
+register(Gauge("bloom_filter_items", "Short codes in this worker's Bloom filter.", (),
+               lambda: {(): link_guard.filter.count if link_guard.filter is not None else 0}))
+register(Gauge("password_hash_queue_depth", "Password operations waiting for a hashing worker.", (),
+               lambda: {(): password_hasher.waiting}))
+register(Gauge("redis_client", "Redis breaker state (0 closed, 1 half-open, 2 open) and pool usage.", ("stat",), redis_gauges))
+
+
+@router.get("/db/pool")
+async def db_pool_stats():
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+
+
+@router.get("/db/replicas")
+async def db_replica_status():
+    return replica_set.snapshot()
+
+
+@router.get("/cache")
+async def cache_stats():
+    return {"local": link_cache.stats(), "loads": link_loads.stats()}
+
+
+@router.get("/redis")
+async def redis_status():
+    return redis_stats()
+
+
+@router.get("/bloom")
+async def bloom_stats():
+    return link_guard.stats()
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats():
+    return rate_limiter.stats()
+
+
+@router.get("/stats")
+async def worker_stats():
+    # This worker's components in one response; the per-component endpoints above return the same sections.
+    return {
+        "cache": {"local": link_cache.stats(), "loads": link_loads.stats()},
+        "redis": redis_stats(),
+        "bloom": link_guard.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
+
+
+@metrics_router.get("/internal/ready")
+async def readiness():
+    # 503 until the startup cache warm-up reaches CACHE_WARMUP_READY_PERCENT.
+    return JSONResponse(warmup_state.snapshot(), status_code=200 if warmup_state.ready else 503)
+
+
+@metrics_router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,18 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import RedirectResponse
+import json
+import os
+import time
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from urllib.parse import quote
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime, timedelta
-from app.schemas.schemas import LinkCreate, LinkInfo, LinkUpdate
-from app.models.models import Link, User
-from app.db import get_db
-from app.redis_cache import get_redis
-from app.auth.utils import get_current_user
-from app.crud import create_link
-from sqlalchemy import or_
+from datetime import date, datetime, timedelta
+from app.schemas.schemas import LinkCreate, LinkInfo, LinkUpdate, LinkBatchResult, LinkBatchItemResult, CleanupJobStatus, LinkStats
+from app.models.models import Link
+from app.db import get_db, get_read_db, RedirectSessionLocal, replica_set
+from app.metrics import cache_lookups, label_route
+from app.redis_cache import get_redis, get_with_ttl, link_cache_ttl, jittered_ttl, report_redis_error
+from app.local_cache import link_cache, invalidate_link
+from app.stampede import link_loads, acquire_fill_lock, release_fill_lock, wait_for_fill
+from app.bloom import link_guard
+from app.click_counter import count_click, pending_clicks
+from app.click_events import record_click_event, click_histograms, unique_visitors
+from app.auth.utils import get_current_user, Principal
+from app.crud import RESERVED_ALIASES, create_link, create_links
+from app.crud.cleanup import start_cleanup, get_cleanup_job
+from app.utils.urls import normalize_url, url_hash
+from app.crud.listing import LINKS_PAGE_SIZE, LINKS_PAGE_MAX, fetch_page, export_response, link_rows, row_to_dict
+from app.api.responses import FastJSONResponse
+from app.settings import get_settings
+from sqlalchemy import or_, bindparam
 from fastapi import Response
 
 router = APIRouter()
+# Registered last by the app: its catch-all path would otherwise shadow single-segment routes.
+redirect_router = APIRouter()
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+NEGATIVE_DETAILS = {404: "Short link not found", 410: "Link has expired"}
+NEGATIVE_BODIES = {code: json.dumps({"detail": detail}).encode() for code, detail in NEGATIVE_DETAILS.items()}
+REDIRECT_QUERY = select(Link.original_url, Link.expires_at).where(Link.short_code == bindparam("short_code"))
 
 
 @router.get("/")
@@ -21,44 +44,86 @@ def read_root():
 
 
 @router.post("/links/shorten", response_model=LinkInfo)
-async def shorten_link(link: LinkCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def shorten_link(link: LinkCreate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     return await create_link(db, link, current_user)
 
 
-@router.get("/{short_code}")
-async def redirect_link(short_code: str, db: AsyncSession = Depends(get_db)):
-    cached_url = None
+def _parse_batch_item(raw):
     try:
-        redis = await get_redis()
-        cached_url = await redis.get(short_code)
-    except Exception as e:
-        print(f"[Redis] GET failed: {e}")
+        return LinkCreate.model_validate(raw), None
+    except ValidationError as e:
+        error = e.errors()[0]
+        return None, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
 
-    if cached_url:
-        return RedirectResponse(cached_url)
 
-    result = await db.execute(select(Link).where(Link.short_code == short_code))
-    link = result.scalar_one_or_none()
-    if not link:
-        raise HTTPException(status_code=404, detail="Short link not found")
-    if link.expires_at and link.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=410, detail="Link has expired")
+async def _read_batch(request: Request) -> list:
+    too_large = HTTPException(status_code=413, detail=f"Batch is limited to {BATCH_MAX_ITEMS} items")
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items, buffer = [], b""
+            async for chunk in request.stream():
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+                if len(items) > BATCH_MAX_ITEMS:
+                    raise too_large
+            if buffer.strip():
+                items.append(json.loads(buffer))
+        else:
+            items = json.loads(await request.body())
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON in batch body")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail="Batch body must be a JSON array or NDJSON")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise too_large
+    return items
 
-    link.click_count += 1
-    link.last_click = datetime.utcnow()
-    await db.commit()
 
-    try:
-        redis = await get_redis()
-        await redis.setex(short_code, 3600, link.original_url)
-    except Exception as e:
-        print(f"[Redis] SET failed: {e}")
+@router.post("/links/shorten/batch", response_model=LinkBatchResult)
+async def shorten_links_batch(request: Request, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    results = {}
+    valid = []
+    for index, raw in enumerate(await _read_batch(request)):
+        link_data, error = _parse_batch_item(raw)
+        if error:
+            results[index] = LinkBatchItemResult(index=index, error=error)
+        else:
+            valid.append((index, link_data))
 
-    return RedirectResponse(link.original_url)
+    created = await create_links(db, [link_data for _, link_data in valid], current_user) if valid else []
+    for (index, _), (_, row, error) in zip(valid, created):
+        link = LinkInfo.model_validate(dict(row)) if row is not None else None
+        results[index] = LinkBatchItemResult(index=index, link=link, error=error)
+
+    ordered = [results[index] for index in sorted(results)]
+    created_count = sum(1 for result in ordered if result.link is not None)
+    return LinkBatchResult(created=created_count, failed=len(ordered) - created_count, results=ordered)
+
+
+@router.delete("/links/cleanup", status_code=status.HTTP_204_NO_CONTENT, responses={202: {"model": CleanupJobStatus}})
+async def delete_old_links(days: int = Query(..., gt=0), db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    job = await start_cleanup(db, current_user.id, cutoff_date)
+    if job.status == "done":
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    # Too big to finish inline; the rest runs in the background.
+    return FastJSONResponse(
+        CleanupJobStatus(**job.snapshot()).model_dump(),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/links/cleanup/{job.id}"},
+    )
+
+
+@router.get("/links/cleanup/{job_id}", response_model=CleanupJobStatus)
+async def get_cleanup_status(job_id: str, current_user: Principal = Depends(get_current_user)):
+    job = await get_cleanup_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Cleanup job not found")
+    return job
 
 
 @router.delete("/links/{short_code}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_link(short_code: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_link(short_code: str, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     result = await db.execute(select(Link).where(Link.short_code == short_code))
     link = result.scalar_one_or_none()
     if not link or link.user_id != current_user.id:
@@ -71,17 +136,22 @@ async def delete_link(short_code: str, db: AsyncSession = Depends(get_db), curre
         redis = await get_redis()
         await redis.delete(short_code)
     except Exception as e:
-        print(f"[Redis] DELETE failed: {e}")
+        report_redis_error("[Redis] DELETE", e)
+    await invalidate_link(short_code)
 
 
 @router.put("/links/{short_code}", response_model=LinkInfo)
-async def update_link(short_code: str, update_data: LinkUpdate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_link(short_code: str, update_data: LinkUpdate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    if short_code in RESERVED_ALIASES:
+        # A link left on a reserved code from before they were refused can't be redirected to; recreate it instead.
+        raise HTTPException(status_code=400, detail="Short code is reserved; create the link under another alias")
     result = await db.execute(select(Link).where(Link.short_code == short_code))
     link = result.scalar_one_or_none()
     if not link or link.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Link not found or not yours")
 
     link.original_url = str(update_data.original_url)
+    link.url_hash = url_hash(link.original_url)
 
     if update_data.last_click:
         link.last_click = update_data.last_click
@@ -89,60 +159,229 @@ async def update_link(short_code: str, update_data: LinkUpdate, db: AsyncSession
     await db.commit()
     await db.refresh(link)
 
+    ttl = link_cache_ttl(link.expires_at)
     try:
         redis = await get_redis()
-        await redis.setex(short_code, 3600, link.original_url)
+        if ttl > 0:
+            await redis.setex(short_code, ttl, link.original_url)
+        else:
+            await redis.delete(short_code)
     except Exception as e:
-        print(f"[Redis] SET failed: {e}")
+        report_redis_error("[Redis] SET", e)
+    await invalidate_link(short_code)
 
     return link
 
 
-@router.get("/links/{short_code}/stats", response_model=LinkInfo)
-async def get_link_stats(short_code: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/links/{short_code}/stats", response_model=LinkStats)
+async def get_link_stats(
+    short_code: str,
+    visitors_from: date | None = None,
+    visitors_to: date | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    clicks = get_settings().clicks
+    visitors_to = visitors_to or datetime.utcnow().date()
+    visitors_from = visitors_from or visitors_to - timedelta(days=clicks.stats_days - 1)
+    if not 0 <= (visitors_to - visitors_from).days < clicks.visitor_hll_retention_days:
+        raise HTTPException(status_code=400, detail=f"Visitor range must be 1 to {clicks.visitor_hll_retention_days} days")
+
     result = await db.execute(select(Link).where(Link.short_code == short_code))
     link = result.scalar_one_or_none()
     if not link or link.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Link not found or not yours")
-    return link
 
+    info = LinkStats.model_validate(link)
+    info.hourly, info.daily = await click_histograms(db, short_code)
+    info.visitors_from, info.visitors_to = visitors_from, visitors_to
+    info.unique_visitors = await unique_visitors(short_code, visitors_from, visitors_to)
+    pending_count, pending_last = await pending_clicks(short_code)
+    if pending_count:
+        info.click_count = (info.click_count or 0) + pending_count
+        pending_last = datetime.utcfromtimestamp(pending_last)
+        if info.last_click is None or info.last_click < pending_last:
+            info.last_click = pending_last
+    return info
 
-@router.get("/links/expired", response_model=list[LinkInfo])
-async def get_expired_links(db: AsyncSession = Depends(get_db)):
-    now = datetime.utcnow()
-    result = await db.execute(select(Link).where(Link.expires_at.is_not(None), Link.expires_at < now))
-    return result.scalars().all()
-
-from sqlalchemy import or_, and_
-@router.delete("/links/cleanup", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_old_links(days: int = Query(..., gt=0), db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    result = await db.execute(
-        select(Link).where(
-            and_(
-                or_(Link.last_click < cutoff_date, Link.last_click.is_(None)),
-                Link.user_id == current_user.id
-            )
-        )
-    )
-    old_links = result.scalars().all()
-    for link in old_links:
-        print(f"[DEBUG] cutoff={cutoff_date} | link.last_click={link.last_click}")
-        await db.delete(link)
-        try:
-            redis = await get_redis()
-            await redis.delete(link.short_code)
-        except Exception as e:
-            print(f"[Redis] DELETE in cleanup failed: {e}")
-    await db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+def _page_response(request: Request, rows, next_cursor) -> Response:
+    # Returning the response skips response_model validation; the model still documents the shape.
+    response = FastJSONResponse([row_to_dict(row) for row in rows])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return response
 
-@router.get("/links/search", response_model=LinkInfo)
-async def search_by_original_url(original_url: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(Link).where(Link.original_url == str(original_url), Link.user_id == current_user.id))
-    link = result.scalar_one_or_none()
-    if not link:
+
+async def _links_page(request: Request, db: AsyncSession, stmt, cursor, limit, export, filename):
+    if export:
+        return export_response(stmt, cursor, export, filename)
+    return _page_response(request, *await fetch_page(db, stmt, cursor, limit))
+
+
+@router.get("/links", response_model=list[LinkInfo])
+async def list_links(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(LINKS_PAGE_SIZE, ge=1, le=LINKS_PAGE_MAX),
+    export: str | None = Query(None, pattern="^(ndjson|csv)$"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    stmt = link_rows().where(Link.user_id == current_user.id)
+    return await _links_page(request, db, stmt, cursor, limit, export, "links")
+
+
+@router.get("/links/expired", response_model=list[LinkInfo])
+async def get_expired_links(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(LINKS_PAGE_SIZE, ge=1, le=LINKS_PAGE_MAX),
+    export: str | None = Query(None, pattern="^(ndjson|csv)$"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    stmt = link_rows().where(Link.expires_at.is_not(None), Link.expires_at < datetime.utcnow())
+    return await _links_page(request, db, stmt, cursor, limit, export, "expired-links")
+
+@router.get("/links/search", response_model=list[LinkInfo])
+async def search_by_original_url(
+    request: Request,
+    original_url: str,
+    cursor: str | None = None,
+    limit: int = Query(LINKS_PAGE_SIZE, ge=1, le=LINKS_PAGE_MAX),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    normalized = normalize_url(original_url)
+    stmt = link_rows().where(Link.user_id == current_user.id, Link.url_hash == url_hash(normalized))
+    rows, next_cursor = await fetch_page(db, stmt, cursor, limit)
+    # A 64-bit hash can collide, so the URL itself gets the final say.
+    rows = [row for row in rows if normalize_url(row.original_url) == normalized]
+    if not rows and cursor is None:
         raise HTTPException(status_code=404, detail="Link not found")
-    return link
\ No newline at end of file
+    return _page_response(request, rows, next_cursor)
+
+
+class FastRedirectResponse(Response):
+    # Same bytes on the wire as RedirectResponse(url), without the generic header initialisation.
+    def __init__(self, url: str):
+        self.status_code = 307
+        self.background = None
+        self.body = b""
+        location = quote(url, safe=":/%#?=@[]!$&'()*+,;")
+        self.raw_headers = [(b"location", location.encode("latin-1")), (b"content-length", b"0")]
+
+
+def negative_response(status_code: int) -> Response:
+    return Response(NEGATIVE_BODIES[status_code], status_code=status_code, media_type="application/json")
+
+
+def record_click(request: Request, short_code: str):
+    count_click(short_code)
+    client = request.scope.get("client")
+    record_click_event(short_code, request.scope["headers"], client[0] if client else "")
+
+
+def cache_locally(short_code: str, url: str, ttl: float | None, delta: float):
+    # ttl is what the cached copy has left (None: no expiry); a local copy, stale window included, never outlives it.
+    stale_ttl = get_settings().cache.local_stale_ttl
+    if ttl is None:
+        link_cache.set(short_code, url, stale=stale_ttl, delta=delta)
+    elif ttl > 0:
+        local_ttl = min(link_cache.ttl, ttl)
+        link_cache.set(short_code, url, ttl=local_ttl, stale=min(stale_ttl, ttl - local_ttl), delta=delta)
+
+
+async def resolve_link(short_code: str):
+    # Cache-miss path, shared by every concurrent request for the code: the URL, or 404/410.
+    started = time.monotonic()
+    redis = None
+    cached_url = cached_ttl = None
+    try:
+        redis = await get_redis()
+        cached_url, cached_ttl = await get_with_ttl(redis, short_code)
+    except Exception as e:
+        redis = None
+        report_redis_error("[Redis] GET", e)
+
+    if cached_url:
+        cache_lookups.inc(("redis", "hit"))
+        cache_locally(short_code, cached_url, cached_ttl, time.monotonic() - started)
+        return cached_url
+    cache_lookups.inc(("redis", "miss"))
+
+    if link_guard.definitely_absent(short_code):
+        # Not negatively cached: the filter already answers this without I/O.
+        cache_lookups.inc(("bloom", "rejected"))
+        return 404
+
+    # Across workers only the lock holder goes to the database; the rest wait briefly for its Redis write.
+    lock = await acquire_fill_lock(redis, short_code) if redis is not None else None
+    if lock is False:
+        cached_url, cached_ttl = await wait_for_fill(redis, short_code)
+        if cached_url:
+            cache_locally(short_code, cached_url, cached_ttl, time.monotonic() - started)
+            return cached_url
+    try:
+        # Only a cache miss checks out a connection, and only for the two columns it needs.
+        async with RedirectSessionLocal() as db:
+            row = (await db.execute(REDIRECT_QUERY, {"short_code": short_code})).first()
+        if row is None and replica_set:
+            # A link created moments ago may not have replicated yet; only the primary can say it doesn't exist.
+            async with RedirectSessionLocal(info={"replica": False}) as db:
+                row = (await db.execute(REDIRECT_QUERY, {"short_code": short_code})).first()
+        cache_lookups.inc(("db", "miss" if row is None else "hit"))
+        if row is None:
+            link_cache.set(short_code, 404, ttl=get_settings().cache.local_negative_ttl)
+            return 404
+        original_url, expires_at = row
+        if expires_at and expires_at < datetime.utcnow():
+            link_cache.set(short_code, 410, ttl=get_settings().cache.local_negative_ttl)
+            return 410
+
+        ttl = link_cache_ttl(expires_at)
+        if ttl > 0:
+            try:
+                redis = await get_redis()
+                await redis.setex(short_code, jittered_ttl(ttl), original_url)
+            except Exception as e:
+                report_redis_error("[Redis] SET", e)
+            # Never serve a stale copy past the link's own expiry.
+            cache_locally(short_code, original_url, ttl, time.monotonic() - started)
+        return original_url
+    finally:
+        if lock:
+            await release_fill_lock(lock)
+
+
+async def refresh_link(short_code: str):
+    # Shares the miss path's in-flight key, so a miss that joins it needs the same result (or error).
+    try:
+        return await resolve_link(short_code)
+    except Exception as e:
+        print(f"[Cache] refresh of {short_code} failed: {e}")
+        raise
+
+
+async def redirect_link(request: Request):
+    short_code = request.path_params["short_code"]
+    cached, refresh = link_cache.lookup(short_code)
+    if isinstance(cached, int):
+        return negative_response(cached)
+    if cached:
+        if refresh:
+            # Stale-while-revalidate: this request gets the cached URL, one task reloads it.
+            link_loads.start(short_code, lambda: refresh_link(short_code))
+        record_click(request, short_code)
+        return FastRedirectResponse(cached)
+
+    result = await link_loads.do(short_code, lambda: resolve_link(short_code))
+    if isinstance(result, int):
+        return negative_response(result)
+    record_click(request, short_code)
+    return FastRedirectResponse(result)
+
+
+redirect_router.add_route("/{short_code}", redirect_link, methods=["GET"], include_in_schema=False)
+label_route(redirect_router.routes[-1])
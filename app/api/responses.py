@@ -0,0 +1,9 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    # For bodies FastAPI doesn't serialize itself: routes with a response_model already get
+    # Pydantic's direct-to-bytes path, which any explicit response_class would switch off.
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
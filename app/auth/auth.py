@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from fastapi.security import OAuth2PasswordRequestForm
@@ -6,7 +6,8 @@ from fastapi.security import OAuth2PasswordRequestForm
 from app.schemas.users import UserCreate, UserOut
 from app.models.models import User
 from app.db import get_db
-from app.auth.utils import hash_password, verify_password, create_access_token
+from app.auth.utils import create_access_token, get_current_user, oauth2_scheme, revoke_token, Principal
+from app.auth.hashing import password_hasher, needs_rehash
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -18,7 +19,7 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(user.password)
+    hashed_pw = await password_hasher.hash(user.password)
     new_user = User(email=user.email, hashed_password=hashed_pw)
     db.add(new_user)
     await db.commit()
@@ -31,9 +32,18 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
     result = await db.execute(select(User).where(User.email == form_data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect email or pwd")
 
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await password_hasher.hash(form_data.password)
+        await db.commit()
+
     token = create_access_token(data={"sub": str(user.id)})
 
-    return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": token, "token_type": "bearer"}
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str = Depends(oauth2_scheme), current_user: Principal = Depends(get_current_user)):
+    await revoke_token(token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
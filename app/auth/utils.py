@@ -1,53 +1,137 @@
-import os
+import hashlib
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.auth.hashing import hash_password, verify_password, needs_rehash, password_hasher
 from app.models.models import User
 from app.db import get_db
+from app.db.replicas import current_user_id, load_recent_write
+from app.local_cache import LocalCache, register_invalidation_handler
+from app.redis_cache import get_redis, report_redis_error
+from app.settings import get_settings
 
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+AUTH_INVALIDATION_CHANNEL = "auth:invalidate"
+REVOKED_TOKEN_PREFIX = "auth:revoked:token:"
+REVOKED_USER_PREFIX = "auth:revoked:user:"
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+
+
+# sha256(token) -> Principal, each entry capped at the token's own expiry
+principal_cache = LocalCache(get_settings().auth.cache_max_size, get_settings().auth.cache_ttl)
+
+
+def _evict_principals(message: str):
+    kind, _, value = message.partition(":")
+    if kind == "user":
+        principal_cache.delete_where(lambda principal: principal.id == int(value))
+    else:
+        principal_cache.delete(value)
+
+
+register_invalidation_handler(AUTH_INVALIDATION_CHANNEL, _evict_principals, principal_cache.clear)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    # python-jose pulls in cryptography; only token issue and verification need it.
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, get_settings().auth.secret_key, algorithm=ALGORITHM)
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def is_revoked(key: str, user_id: int) -> bool:
+    if not get_settings().auth.revocation_enabled:
+        return False
+    try:
+        redis = await get_redis()
+        return bool(await redis.exists(REVOKED_TOKEN_PREFIX + key, f"{REVOKED_USER_PREFIX}{user_id}"))
+    except Exception as e:
+        report_redis_error("[Redis] revocation check", e)
+        return False
+
+async def _publish_revocation(redis_key: str, ttl: int, message: str):
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(redis_key, 1, ex=max(ttl, 1))
+        pipe.publish(AUTH_INVALIDATION_CHANNEL, message)
+        await pipe.execute()
+    except Exception as e:
+        report_redis_error("[Redis] revocation", e)
+
+async def revoke_token(token: str):
+    from jose import JWTError, jwt
+
+    key = token_key(token)
+    principal_cache.delete(key)
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp", 0)
+    except JWTError:
+        return
+    await _publish_revocation(REVOKED_TOKEN_PREFIX + key, int(exp - time.time()), key)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+async def revoke_user(user_id: int):
+    # Every token issued so far has expired once ACCESS_TOKEN_EXPIRE_MINUTES have passed.
+    principal_cache.delete_where(lambda principal: principal.id == user_id)
+    await _publish_revocation(f"{REVOKED_USER_PREFIX}{user_id}", ACCESS_TOKEN_EXPIRE_MINUTES * 60, f"user:{user_id}")
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    key = token_key(token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        current_user_id.set(principal.id)
+        await load_recent_write(principal.id)
+        return principal
+
+    from jose import JWTError, jwt
+
+    auth = get_settings().auth
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, auth.secret_key, algorithms=[ALGORITHM])
         sub = payload.get("sub")
         if sub is None:
             raise credentials_exception
         user_id: int = int(sub)
+        exp = payload.get("exp")
+        expires_in = float(exp) - time.time() if exp is not None else auth.cache_ttl
     except (JWTError, TypeError, ValueError):
         raise credentials_exception
 
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if user is None:
+    if await is_revoked(key, user_id):
+        raise credentials_exception
+
+    result = await db.execute(select(User.id, User.email).where(User.id == user_id))
+    row = result.first()
+    if row is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    principal = Principal(id=row.id, email=row.email)
+    principal_cache.set(key, principal, ttl=min(auth.cache_ttl, expires_in))
+    current_user_id.set(principal.id)
+    await load_recent_write(principal.id)
+    return principal
\ No newline at end of file
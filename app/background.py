@@ -0,0 +1,27 @@
+import asyncio
+
+_tasks: dict[str, asyncio.Task] = {}
+
+
+def start(name: str, coro) -> asyncio.Task:
+    task = _tasks.get(name)
+    if task is not None and not task.done():
+        coro.close()
+        return task
+    for done in [key for key, other in _tasks.items() if other.done()]:
+        del _tasks[done]
+    task = asyncio.create_task(coro, name=name)
+    _tasks[name] = task
+    return task
+
+
+def running() -> list[str]:
+    return [name for name, task in _tasks.items() if not task.done()]
+
+
+async def stop_all():
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
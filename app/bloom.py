@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import math
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import local_cache
+from app.db import AsyncSessionLocal
+from app.local_cache import register_invalidation_handler
+from app.models.models import CodeCounter, Link
+from app.redis_cache import get_redis, report_redis_error
+from app.settings import get_settings
+
+BLOOM_REBUILD_BATCH_SIZE = 10000
+LINK_CREATED_CHANNEL = "links:created"
+# code_counters row bumped whenever a links:created announcement could not be published.
+BLOOM_EPOCH_COUNTER = "bloom-epoch"
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Kirsch-Mitzenmacher: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "items": self.count,
+            "bits": self.size,
+            "hashes": self.hashes,
+            "memory_bytes": len(self.bits),
+            "target_error_rate": self.error_rate,
+            "estimated_error_rate": self.false_positive_rate(),
+        }
+
+
+class ShortCodeGuard:
+    # Answers "definitely absent" only for a filter built from the database that has seen every create since,
+    # which needs the invalidation listener to have stayed connected throughout and the epoch not to have moved.
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filter: BloomFilter | None = None
+        self.rejected = 0
+        self.built_at = None
+        # Announcement epoch the filter was built at; a newer one means some create may be missing from it.
+        self.epoch = None
+        self._pending: list | None = None
+        self.rebuild_requested = asyncio.Event()
+
+    def configure(self, capacity: int, error_rate: float):
+        # Takes effect with the next rebuild.
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+    @property
+    def active(self) -> bool:
+        return get_settings().bloom.enabled and self.filter is not None and local_cache.listener_connected
+
+    def definitely_absent(self, short_code: str) -> bool:
+        if not self.active or short_code in self.filter:
+            return False
+        self.rejected += 1
+        return True
+
+    def add(self, short_code: str):
+        if self.filter is not None:
+            self.filter.add(short_code)
+        if self._pending is not None:
+            self._pending.append(short_code)
+
+    def invalidate(self):
+        self.filter = None
+        self.rebuild_requested.set()
+
+    async def check_epoch(self, db):
+        if self.filter is not None and await read_epoch(db) != self.epoch:
+            # Another worker created links it couldn't announce: trust the database until rebuilt.
+            self.invalidate()
+
+    async def rebuild(self, db):
+        self._pending = []
+        try:
+            # Read before the scan, so a bump during it still triggers another rebuild.
+            epoch = await read_epoch(db)
+            # Highest id bounds the row count without a full COUNT(*).
+            count = await db.scalar(select(Link.id).order_by(Link.id.desc()).limit(1)) or 0
+            bloom = BloomFilter(max(self.capacity, 2 * count), self.error_rate)
+            result = await db.stream_scalars(select(Link.short_code).execution_options(yield_per=BLOOM_REBUILD_BATCH_SIZE))
+            async for codes in result.partitions():
+                for code in codes:
+                    bloom.add(code)
+            # Codes created while the table was being read.
+            for code in self._pending:
+                bloom.add(code)
+            self.filter = bloom
+            self.epoch = epoch
+            self.built_at = time.time()
+        finally:
+            self._pending = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": get_settings().bloom.enabled,
+            "active": self.active,
+            "rejected": self.rejected,
+            "built_at": self.built_at,
+            "epoch": self.epoch,
+            **(self.filter.stats() if self.filter is not None else {}),
+        }
+
+
+link_guard = ShortCodeGuard(get_settings().bloom.capacity, get_settings().bloom.error_rate)
+register_invalidation_handler(LINK_CREATED_CHANNEL, link_guard.add, link_guard.invalidate)
+
+
+def announce_created(pipe, short_codes):
+    # Queued on the caller's pipeline so it goes out with the cache warm-up; callers add locally first.
+    for short_code in short_codes:
+        pipe.publish(LINK_CREATED_CHANNEL, short_code)
+
+
+async def read_epoch(db) -> int:
+    return await db.scalar(select(CodeCounter.value).where(CodeCounter.name == BLOOM_EPOCH_COUNTER)) or 0
+
+
+async def bump_epoch(db):
+    counters = CodeCounter.__table__
+    dialect_insert = postgresql.insert if (await db.connection()).dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(counters).values(name=BLOOM_EPOCH_COUNTER, value=1)
+    await db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"value": counters.c.value + 1}))
+    await db.commit()
+
+
+async def announce_lost(db, short_codes):
+    # The pipeline carrying the announcement failed. Other workers would answer 404 for these codes until
+    # their next rebuild, so retry once and otherwise move the epoch they poll.
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        announce_created(pipe, short_codes)
+        await pipe.execute()
+        return
+    except Exception as e:
+        report_redis_error(f"[Bloom] announcing {len(short_codes)} created codes", e)
+    try:
+        await bump_epoch(db)
+    except Exception as e:
+        print(f"[Bloom] epoch bump failed: {e}")
+
+
+async def wait_for_rebuild():
+    # Until the rebuild interval passes, a rebuild is requested or the epoch moves.
+    settings = get_settings().bloom
+    deadline = time.monotonic() + settings.rebuild_interval
+    while not link_guard.rebuild_requested.is_set():
+        timeout = min(settings.epoch_poll_interval, deadline - time.monotonic())
+        if timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(link_guard.rebuild_requested.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            async with AsyncSessionLocal() as db:
+                await link_guard.check_epoch(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The epoch can't be checked, so the filter can't be trusted.
+            print(f"[Bloom] epoch check failed: {e}")
+            link_guard.invalidate()
+
+
+async def run_bloom_rebuilder():
+    if not get_settings().bloom.enabled:
+        return
+    while True:
+        started = time.monotonic()
+        try:
+            async with AsyncSessionLocal() as db:
+                await link_guard.rebuild(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Bloom] rebuild failed: {e}")
+        link_guard.rebuild_requested.clear()
+        await wait_for_rebuild()
+        # A Redis outage bumps the epoch on every create; don't rescan the table each time.
+        await asyncio.sleep(max(0.0, started + get_settings().bloom.rebuild_min_interval - time.monotonic()))
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select
+
+from app.db import ReadSessionLocal
+from app.leader import run_once
+from app.local_cache import link_cache
+from app.models.models import Link
+from app.redis_cache import get_redis, link_cache_ttl, jittered_ttl
+
+CACHE_WARMUP_ENABLED = os.getenv("CACHE_WARMUP_ENABLED", "true") == "true"
+CACHE_WARMUP_TOP_N = int(os.getenv("CACHE_WARMUP_TOP_N", "10000"))
+CACHE_WARMUP_CHUNK_SIZE = int(os.getenv("CACHE_WARMUP_CHUNK_SIZE", "1000"))
+# Only links clicked within this window count as hot.
+CACHE_WARMUP_RECENT_DAYS = float(os.getenv("CACHE_WARMUP_RECENT_DAYS", "7"))
+CACHE_WARMUP_LOCAL = os.getenv("CACHE_WARMUP_LOCAL", "false") == "true"
+CACHE_WARMUP_READY_PERCENT = float(os.getenv("CACHE_WARMUP_READY_PERCENT", "90"))
+
+
+class WarmupState:
+    def __init__(self):
+        self.total = None
+        self.loaded = 0
+        self.finished = False
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def percent(self) -> float:
+        if self.finished and not self.total:
+            return 100.0
+        return 100.0 * self.loaded / self.total if self.total else 0.0
+
+    @property
+    def ready(self) -> bool:
+        # A failed warm-up still lets the worker serve, just from the database.
+        return not CACHE_WARMUP_ENABLED or self.finished or self.percent >= CACHE_WARMUP_READY_PERCENT
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "percent": round(self.percent, 1),
+            "loaded": self.loaded,
+            "total": self.total,
+            "finished": self.finished,
+            "error": self.error,
+            "seconds": (self.finished_at or time.time()) - self.started_at if self.started_at else None,
+        }
+
+
+warmup_state = WarmupState()
+
+
+def hot_links_query(limit: int):
+    now = datetime.utcnow()
+    return (
+        select(Link.short_code, Link.original_url, Link.expires_at)
+        .where(
+            Link.last_click >= now - timedelta(days=CACHE_WARMUP_RECENT_DAYS),
+            or_(Link.expires_at.is_(None), Link.expires_at > now),
+        )
+        .order_by(Link.click_count.desc(), Link.last_click.desc())
+        .limit(limit)
+    )
+
+
+async def warm_redis(db, state: WarmupState = warmup_state, limit: int = CACHE_WARMUP_TOP_N,
+                     chunk_size: int = CACHE_WARMUP_CHUNK_SIZE) -> int:
+    state.started_at = time.time()
+    state.total = await db.scalar(select(func.count()).select_from(hot_links_query(limit).subquery()))
+    redis = await get_redis()
+    result = await db.stream(hot_links_query(limit).execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        pipe = redis.pipeline(transaction=False)
+        written = 0
+        for short_code, original_url, expires_at in rows:
+            ttl = link_cache_ttl(expires_at)
+            if ttl <= 0:
+                continue
+            pipe.set(short_code, original_url, ex=jittered_ttl(ttl))
+            written += 1
+        await pipe.execute()
+        state.loaded += written
+    return state.loaded
+
+
+async def warm_local(db, limit: int = CACHE_WARMUP_TOP_N, chunk_size: int = CACHE_WARMUP_CHUNK_SIZE) -> int:
+    # The hottest links come first; filling past the local cache's size would only evict them again.
+    filled = 0
+    result = await db.stream(hot_links_query(min(limit, link_cache.max_size)).execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        for short_code, original_url, expires_at in rows:
+            ttl = link_cache_ttl(expires_at)
+            if ttl <= 0:
+                continue
+            link_cache.set(short_code, original_url, ttl=min(link_cache.ttl, ttl))
+            filled += 1
+    return filled
+
+
+async def warm_redis_from_replica():
+    async with ReadSessionLocal() as db:
+        await warm_redis(db)
+
+
+async def run_cache_warmup():
+    if not CACHE_WARMUP_ENABLED:
+        return
+    try:
+        # Redis is shared: one worker fills it and the others stay unready until it has.
+        await run_once("cache-warmup", warm_redis_from_replica)
+        if CACHE_WARMUP_LOCAL:
+            # The local tier is per process, so every worker fills its own.
+            async with ReadSessionLocal() as db:
+                await warm_local(db)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        warmup_state.error = str(e)
+        print(f"[Warmup] cache warm-up failed: {e}")
+    finally:
+        warmup_state.finished = True
+        warmup_state.finished_at = time.time()
@@ -0,0 +1,241 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, Integer, String, bindparam, case, column, delete, func, insert, update, values
+from sqlalchemy.exc import IntegrityError
+
+from app.db import AsyncSessionLocal
+from app.models.models import ClickFlush, Link
+from app.redis_cache import get_redis, report_redis_error
+from app.settings import get_settings
+
+# Hash fields are "c:<code>" (click delta) and "t:<code>" (last click, epoch seconds);
+# the flushing hash also carries its batch id in BATCH_FIELD.
+PENDING_KEY = "clicks:pending"
+FLUSHING_KEY = "clicks:flushing"
+FLUSH_LOCK_KEY = "clicks:flush-lock"
+FLUSH_LOCK_TIMEOUT = 60
+BATCH_FIELD = "batch"
+
+
+def merge_deltas(target: dict, deltas: dict) -> dict:
+    for code, (count, last) in deltas.items():
+        current = target.get(code)
+        if current is None:
+            target[code] = (count, last)
+        else:
+            target[code] = (current[0] + count, max(current[1], last))
+    return target
+
+
+def parse_hash(data: dict) -> dict:
+    counts, lasts = {}, {}
+    for field, value in data.items():
+        kind, code = field[:2], field[2:]
+        if kind == "c:":
+            counts[code] = int(value)
+        elif kind == "t:":
+            lasts[code] = float(value)
+    return {code: (count, lasts.get(code, time.time())) for code, count in counts.items()}
+
+
+class ClickCounter:
+    def __init__(self):
+        self._pending: dict[str, tuple[int, float]] = {}
+        # A spill is queued for the next loop iteration; clicks recorded meanwhile go out with it.
+        self.spill_queued = False
+        # After a failed spill clicks wait for the periodic spiller instead of retrying on every redirect.
+        self.retry_at = 0.0
+
+    def record(self, short_code: str, ts: float | None = None):
+        ts = time.time() if ts is None else ts
+        current = self._pending.get(short_code)
+        if current is None:
+            self._pending[short_code] = (1, ts)
+        else:
+            self._pending[short_code] = (current[0] + 1, max(current[1], ts))
+
+    def pending(self, short_code: str) -> tuple[int, float | None]:
+        return self._pending.get(short_code, (0, None))
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def drain(self) -> dict:
+        deltas, self._pending = self._pending, {}
+        return deltas
+
+    def restore(self, deltas: dict):
+        merge_deltas(self._pending, deltas)
+
+
+click_counter = ClickCounter()
+# Spills in flight: the redirect doesn't wait for its click to reach Redis.
+spill_tasks: set[asyncio.Task] = set()
+
+
+def count_click(short_code: str):
+    # Every click of one loop iteration goes to Redis in one HINCRBY pipeline right away, so a killed worker
+    # loses only clicks whose round trip hadn't completed; the periodic spiller retries the ones that failed.
+    click_counter.record(short_code)
+    if click_counter.spill_queued or time.monotonic() < click_counter.retry_at:
+        return
+    click_counter.spill_queued = True
+    task = asyncio.ensure_future(spill_to_redis())
+    spill_tasks.add(task)
+    task.add_done_callback(spill_tasks.discard)
+
+
+async def spill_to_redis() -> int:
+    click_counter.spill_queued = False
+    deltas = click_counter.drain()
+    if not deltas:
+        return 0
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        for code, (count, last) in deltas.items():
+            pipe.hincrby(PENDING_KEY, f"c:{code}", count)
+            pipe.hset(PENDING_KEY, f"t:{code}", last)
+        await pipe.execute()
+    except Exception as e:
+        report_redis_error("[Clicks] spill to Redis", e)
+        click_counter.restore(deltas)
+        click_counter.retry_at = time.monotonic() + get_settings().clicks.spill_interval
+        return 0
+    click_counter.retry_at = 0.0
+    return len(deltas)
+
+
+def build_click_update(dialect_name: str, rows: list[tuple]):
+    links = Link.__table__
+    if dialect_name == "postgresql":
+        v = values(
+            column("short_code", String), column("delta", Integer), column("last_click", DateTime), name="v"
+        ).data(rows)
+        code, delta, last = v.c.short_code, v.c.delta, v.c.last_click
+        params = None
+    else:
+        # SQLite has no column aliases for a VALUES derived table; fall back to executemany.
+        code, delta, last = bindparam("b_code"), bindparam("b_delta"), bindparam("b_last", type_=DateTime)
+        params = [{"b_code": c, "b_delta": d, "b_last": t} for c, d, t in rows]
+    stmt = update(links).where(links.c.short_code == code).values(
+        click_count=func.coalesce(links.c.click_count, 0) + delta,
+        last_click=case(
+            (links.c.last_click.is_(None), last),
+            (links.c.last_click < last, last),
+            else_=links.c.last_click,
+        ),
+    )
+    return stmt, params
+
+
+async def apply_deltas(db, deltas: dict, batch_id: str | None = None) -> bool:
+    # With a batch id the marker row commits together with the counts: False if the batch was already applied.
+    if batch_id is not None:
+        try:
+            await db.execute(insert(ClickFlush).values(batch_id=batch_id, flushed_at=datetime.utcnow()))
+        except IntegrityError:
+            await db.rollback()
+            return False
+        cutoff = datetime.utcnow() - timedelta(seconds=get_settings().clicks.flush_marker_retention)
+        await db.execute(delete(ClickFlush).where(ClickFlush.flushed_at < cutoff))
+    items = list(deltas.items())
+    dialect_name = (await db.connection()).dialect.name
+    batch_size = get_settings().clicks.flush_batch_size
+    for start in range(0, len(items), batch_size):
+        rows = [
+            (code, count, datetime.utcfromtimestamp(last))
+            for code, (count, last) in items[start:start + batch_size]
+        ]
+        stmt, params = build_click_update(dialect_name, rows)
+        await db.execute(stmt, params)
+    await db.commit()
+    return True
+
+
+async def flush_redis_to_db(db) -> int:
+    redis = await get_redis()
+    lock = redis.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TIMEOUT, blocking=False)
+    if not await lock.acquire():
+        return 0
+    flushed = 0
+    try:
+        # A leftover flushing key means a previous flusher died before deleting it.
+        if not await redis.exists(FLUSHING_KEY):
+            if not await redis.exists(PENDING_KEY):
+                return 0
+            await redis.rename(PENDING_KEY, FLUSHING_KEY)
+        # The id sticks to the hash, so a retry after the DB commit but before the DELETE is recognised.
+        await redis.hsetnx(FLUSHING_KEY, BATCH_FIELD, uuid.uuid4().hex)
+        data = await redis.hgetall(FLUSHING_KEY)
+        deltas = parse_hash(data)
+        if deltas and await apply_deltas(db, deltas, data[BATCH_FIELD]):
+            flushed = len(deltas)
+        await redis.delete(FLUSHING_KEY)
+    finally:
+        await lock.release()
+    return flushed
+
+
+async def flush_local_to_db(db) -> int:
+    deltas = click_counter.drain()
+    if not deltas:
+        return 0
+    try:
+        await apply_deltas(db, deltas)
+    except Exception:
+        click_counter.restore(deltas)
+        raise
+    return len(deltas)
+
+
+async def flush_clicks(db) -> int:
+    # A spill that fails puts its clicks back; wait for those in flight so none come back after this flush.
+    if spill_tasks:
+        await asyncio.gather(*spill_tasks, return_exceptions=True)
+    await spill_to_redis()
+    if not click_counter.has_pending():
+        try:
+            return await flush_redis_to_db(db)
+        except Exception as e:
+            report_redis_error("[Clicks] flush from Redis", e)
+            return 0
+    # Redis is unreachable, so this worker's deltas go straight to the database.
+    return await flush_local_to_db(db)
+
+
+async def pending_clicks(short_code: str) -> tuple[int, float | None]:
+    count, last = click_counter.pending(short_code)
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        for key in (PENDING_KEY, FLUSHING_KEY):
+            pipe.hmget(key, f"c:{short_code}", f"t:{short_code}")
+        for redis_count, redis_last in await pipe.execute():
+            if redis_count:
+                count += int(redis_count)
+                last = max(last or 0.0, float(redis_last or 0.0)) or None
+    except Exception as e:
+        report_redis_error("[Clicks] pending lookup", e)
+    return count, last
+
+
+async def run_click_spiller():
+    while True:
+        await asyncio.sleep(get_settings().clicks.spill_interval)
+        await spill_to_redis()
+
+
+async def run_click_flusher():
+    while True:
+        await asyncio.sleep(get_settings().clicks.flush_interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await flush_clicks(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Clicks] flush failed: {e}")
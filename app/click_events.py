@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import os
+import socket
+import time
+import uuid
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db import AsyncSessionLocal
+from app.models.models import Click, ClickRollup
+from app.redis_cache import get_blocking_redis, get_redis, report_redis_error
+from app.schemas.schemas import ClickBucket
+from app.settings import get_settings
+
+CLICK_EVENT_GROUP = "click-writers"
+# Per-link, per-day HyperLogLogs of hashed visitor fingerprints; ~12 KB each at most, whatever the traffic.
+VISITOR_HLL_PREFIX = "hll:visitors"
+# Ranges longer than this are PFMERGEd once and the union cached for a few minutes.
+VISITOR_MERGE_MIN_DAYS = 31
+VISITOR_MERGE_TTL = 300
+
+BOT_MARKERS = ("bot", "spider", "crawl", "curl", "wget", "python", "httpclient", "preview")
+MOBILE_MARKERS = ("mobile", "android", "iphone", "ipad")
+
+
+class ClickEventBuffer:
+    # Bounded ring: when the shipper falls behind the oldest events are dropped, never the redirect.
+    def __init__(self, size: int, country_header: str = "cf-ipcountry"):
+        self._events: deque = deque(maxlen=size)
+        self.country_header = country_header.lower().encode()
+        self.dropped = 0
+
+    def configure(self, size: int, country_header: str):
+        # The newest events are kept if the ring shrinks.
+        if size != self._events.maxlen:
+            self._events = deque(self._events, maxlen=size)
+        self.country_header = country_header.lower().encode()
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, short_code: str, headers: list, client: str = ""):
+        # Raw header bytes only; parsing happens off the request path in the shipper.
+        referer = user_agent = country = forwarded = b""
+        for name, value in headers:
+            if name == b"referer":
+                referer = value
+            elif name == b"user-agent":
+                user_agent = value
+            elif name == self.country_header:
+                country = value
+            elif name == b"x-forwarded-for":
+                forwarded = value
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append((short_code, time.time(), referer, user_agent, country, forwarded or client.encode()))
+
+    def drain(self, limit: int | None = None) -> list:
+        count = len(self._events) if limit is None else min(limit, len(self._events))
+        return [self._events.popleft() for _ in range(count)]
+
+    def clear(self):
+        self._events.clear()
+
+
+click_events = ClickEventBuffer(get_settings().clicks.event_buffer_size, get_settings().clicks.country_header)
+
+
+def record_click_event(short_code: str, headers: list, client: str = ""):
+    if get_settings().clicks.events_enabled:
+        click_events.record(short_code, headers, client)
+
+
+def classify_user_agent(user_agent: str) -> str:
+    user_agent = user_agent.lower()
+    if not user_agent:
+        return "unknown"
+    if any(marker in user_agent for marker in BOT_MARKERS):
+        return "bot"
+    if any(marker in user_agent for marker in MOBILE_MARKERS):
+        return "mobile"
+    return "desktop"
+
+
+def referrer_host(referer: str) -> str:
+    try:
+        return (urlsplit(referer).hostname or "")[:255]
+    except ValueError:
+        return ""
+
+
+def visitor_fingerprint(address: bytes, user_agent: bytes) -> str:
+    # Salted, so the stored value can't be mapped back to an IP address.
+    settings = get_settings()
+    salt = (settings.clicks.visitor_salt or settings.auth.secret_key).encode()[:64]
+    client_ip = address.split(b",")[0].strip()
+    return hashlib.blake2b(client_ip + b"|" + user_agent, key=salt, digest_size=8).hexdigest()
+
+
+def compact_event(raw: tuple) -> dict:
+    short_code, ts, referer, user_agent, country, address = raw
+    return {
+        "c": short_code,
+        "t": repr(ts),
+        "r": referrer_host(referer.decode("latin-1")),
+        "u": classify_user_agent(user_agent.decode("latin-1")),
+        "g": country.decode("latin-1")[:2].upper(),
+        "v": visitor_fingerprint(address, user_agent),
+    }
+
+
+def visitor_key(short_code: str, day: date) -> str:
+    # The hash tag keeps all of a link's days in one cluster slot, so multi-key PFCOUNT/PFMERGE work.
+    return f"{VISITOR_HLL_PREFIX}:{{{short_code}}}:{day:%Y%m%d}"
+
+
+def event_row(event_id: str, fields: dict) -> dict:
+    return {
+        "event_id": event_id,
+        "short_code": fields["c"],
+        "clicked_at": datetime.utcfromtimestamp(float(fields["t"])),
+        "referrer_host": fields.get("r") or None,
+        "ua_class": fields.get("u") or None,
+        "country": fields.get("g") or None,
+    }
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def dialect_insert(dialect_name: str, table):
+    return postgresql.insert(table) if dialect_name == "postgresql" else sqlite.insert(table)
+
+
+_known_partitions: set = set()
+
+
+def partition_name(day: datetime) -> str:
+    return f"clicks_{day:%Y%m%d}"
+
+
+async def ensure_partitions(db, days):
+    for day in sorted(set(days) - _known_partitions):
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF clicks "
+            f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+        ))
+        _known_partitions.add(day)
+
+
+async def store_events(db, rows: list[dict]) -> int:
+    # Events whose id is already stored are skipped, and only inserted rows reach the rollups.
+    if not rows:
+        return 0
+    dialect_name = (await db.connection()).dialect.name
+    if dialect_name == "postgresql":
+        await ensure_partitions(db, {row["clicked_at"].replace(hour=0, minute=0, second=0, microsecond=0) for row in rows})
+    clicks, rollups = Click.__table__, ClickRollup.__table__
+    batch_size = get_settings().clicks.event_batch_size
+    inserted = []
+    for start in range(0, len(rows), batch_size):
+        stmt = (
+            dialect_insert(dialect_name, clicks)
+            .values(rows[start:start + batch_size])
+            .on_conflict_do_nothing(index_elements=["clicked_at", "event_id"])
+            .returning(clicks.c.short_code, clicks.c.clicked_at)
+        )
+        inserted.extend((await db.execute(stmt)).all())
+    counts = Counter((short_code, hour_bucket(clicked_at)) for short_code, clicked_at in inserted)
+    if counts:
+        stmt = dialect_insert(dialect_name, rollups).values(
+            [{"short_code": code, "bucket": bucket, "clicks": n} for (code, bucket), n in counts.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["short_code", "bucket"], set_={"clicks": rollups.c.clicks + stmt.excluded.clicks}
+        )
+        await db.execute(stmt)
+    await db.commit()
+    return len(inserted)
+
+
+async def ship_click_events() -> int:
+    settings = get_settings().clicks
+    shipped = 0
+    while len(click_events):
+        batch = [compact_event(raw) for raw in click_events.drain(settings.event_batch_size)]
+        try:
+            redis = await get_redis()
+            pipe = redis.pipeline(transaction=False)
+            visitors: dict[str, set] = {}
+            for fields in batch:
+                pipe.xadd(settings.event_stream, fields, maxlen=settings.event_stream_maxlen, approximate=True)
+                day = datetime.utcfromtimestamp(float(fields["t"])).date()
+                visitors.setdefault(visitor_key(fields["c"], day), set()).add(fields["v"])
+            for key, fingerprints in visitors.items():
+                pipe.pfadd(key, *fingerprints)
+                pipe.expire(key, settings.visitor_hll_retention_days * 86400)
+            await pipe.execute()
+        except Exception as e:
+            print(f"[Clicks] XADD failed, writing events to the database: {e}")
+            try:
+                async with AsyncSessionLocal() as db:
+                    await store_events(db, [event_row(uuid.uuid4().hex, fields) for fields in batch])
+            except Exception as e:
+                print(f"[Clicks] event write failed, {len(batch)} events dropped: {e}")
+                click_events.dropped += len(batch)
+                return shipped
+        shipped += len(batch)
+    return shipped
+
+
+async def store_stream_entries(db, entries: list) -> list[str]:
+    ids = [event_id for event_id, _ in entries]
+    rows = [event_row(event_id, fields) for event_id, fields in entries if fields]
+    await store_events(db, rows)
+    return ids
+
+
+async def maintain_partitions(db):
+    settings = get_settings().clicks
+    today = hour_bucket(datetime.utcnow()).replace(hour=0)
+    cutoff = today - timedelta(days=settings.retention_days)
+    if (await db.connection()).dialect.name != "postgresql":
+        await db.execute(delete(Click).where(Click.clicked_at < cutoff))
+        await db.commit()
+        return
+    await ensure_partitions(db, [today + timedelta(days=i) for i in range(settings.partition_days_ahead + 1)])
+    # Dropping a whole day is far cheaper than deleting its rows.
+    names = (await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'clicks'"
+    ))).scalars()
+    for name in names:
+        if name != "clicks_default" and name < partition_name(cutoff):
+            await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            _known_partitions.discard(datetime.strptime(name[len("clicks_"):], "%Y%m%d"))
+    await db.commit()
+
+
+async def run_click_event_shipper():
+    while True:
+        await asyncio.sleep(get_settings().clicks.event_ship_interval)
+        await ship_click_events()
+
+
+async def run_click_event_consumer(retry_delay: float = 5.0):
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    maintained_at = 0.0
+    while True:
+        settings = get_settings().clicks
+        stream, batch_size, claim_idle_ms = settings.event_stream, settings.event_batch_size, settings.event_claim_idle_ms
+        try:
+            # XREADGROUP blocks longer than the request-path socket timeout allows.
+            redis = await get_blocking_redis()
+            try:
+                await redis.xgroup_create(stream, CLICK_EVENT_GROUP, id="0", mkstream=True)
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            claim_from, claimed_at = "0-0", 0.0
+            while True:
+                if time.monotonic() - maintained_at > settings.maintenance_interval:
+                    async with AsyncSessionLocal() as db:
+                        await maintain_partitions(db)
+                    maintained_at = time.monotonic()
+                entries = []
+                if time.monotonic() - claimed_at > claim_idle_ms / 1000:
+                    # Take over what a crashed consumer read but never acknowledged, one page per loop.
+                    claimed = await redis.xautoclaim(
+                        stream, CLICK_EVENT_GROUP, consumer, claim_idle_ms, start_id=claim_from, count=batch_size,
+                    )
+                    claim_from, entries = claimed[0], claimed[1]
+                    if claim_from == "0-0":
+                        claimed_at = time.monotonic()
+                if not entries:
+                    response = await redis.xreadgroup(
+                        CLICK_EVENT_GROUP, consumer, {stream: ">"}, count=batch_size, block=1000
+                    )
+                    entries = [entry for _, stream_entries in response for entry in stream_entries]
+                if not entries:
+                    continue
+                async with AsyncSessionLocal() as db:
+                    ids = await store_stream_entries(db, entries)
+                await redis.xack(stream, CLICK_EVENT_GROUP, *ids)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Clicks] event consumer failed: {e}")
+        await asyncio.sleep(retry_delay)
+
+
+async def click_histograms(db, short_code: str) -> tuple[list[ClickBucket], list[ClickBucket]]:
+    settings = get_settings().clicks
+    now = hour_bucket(datetime.utcnow())
+    since = now.replace(hour=0) - timedelta(days=settings.stats_days - 1)
+    result = await db.execute(
+        select(ClickRollup.bucket, ClickRollup.clicks)
+        .where(ClickRollup.short_code == short_code, ClickRollup.bucket >= since)
+        .order_by(ClickRollup.bucket)
+    )
+    hourly, daily = [], Counter()
+    hourly_since = now - timedelta(hours=settings.stats_hours - 1)
+    for bucket, clicks in result.all():
+        if bucket >= hourly_since:
+            hourly.append(ClickBucket(bucket=bucket, clicks=clicks))
+        daily[bucket.replace(hour=0)] += clicks
+    return hourly, [ClickBucket(bucket=day, clicks=clicks) for day, clicks in sorted(daily.items())]
+
+
+async def unique_visitors(short_code: str, start: date, end: date) -> int | None:
+    days = (end - start).days + 1
+    keys = [visitor_key(short_code, start + timedelta(days=i)) for i in range(days)]
+    try:
+        redis = await get_redis()
+        if days < VISITOR_MERGE_MIN_DAYS:
+            return await redis.pfcount(*keys)
+        merged = f"{VISITOR_HLL_PREFIX}:{{{short_code}}}:merged:{start:%Y%m%d}-{end:%Y%m%d}"
+        if not await redis.exists(merged):
+            pipe = redis.pipeline(transaction=False)
+            pipe.pfmerge(merged, *keys)
+            pipe.expire(merged, VISITOR_MERGE_TTL)
+            await pipe.execute()
+        return await redis.pfcount(merged)
+    except Exception as e:
+        report_redis_error("[Redis] PFCOUNT", e)
+        return None
@@ -1,44 +1,204 @@
-import random
-import string
+import os
+from datetime import datetime
 
 from fastapi import HTTPException
+from sqlalchemy import insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.bloom import announce_created, announce_lost, link_guard
 from app.models.models import Link, User
+from app.local_cache import invalidate_link, link_cache, INVALIDATION_CHANNEL
+from app.redis_cache import get_redis, link_cache_ttl, jittered_ttl, report_redis_error
+from app.utils.shortener import get_allocator
+from app.utils.urls import normalize_url, url_hash
 
+CREATE_ATTEMPTS = 3
+# Default for LinkCreate.reuse_existing: return the caller's existing link for the same URL instead of a new one.
+LINK_REUSE_EXISTING = os.getenv("LINK_REUSE_EXISTING", "false") == "true"
+LINK_COLUMNS = ("id", "original_url", "short_code", "created_at", "expires_at", "click_count", "last_click", "user_id")
+# Codes the app's own routes would shadow: first path segments win over GET /{short_code}, and the literal
+# /links/... routes over /links/{short_code} (DELETE /links/cleanup would start a cleanup instead).
+RESERVED_ALIASES = frozenset({
+    "auth", "docs", "internal", "links", "metrics", "openapi.json", "redoc",
+    "cleanup", "expired", "search", "shorten",
+})
+RESERVED_ALIAS_ERROR = "Custom alias is reserved"
 
-def generate_short_code(length=6):
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
+async def generate_unique_code(db: AsyncSession):
+    return await get_allocator().allocate(db)
 
-async def generate_unique_code(db: AsyncSession, length=6):
-    for _ in range(5):
-        code = generate_short_code(length)
-        result = await db.execute(select(Link).where(Link.short_code == code))
-        if not result.scalar_one_or_none():
-            return code
-    raise HTTPException(status_code=500, detail="Failed to generate unique short code")
+
+def link_values(link_data, short_code: str, user_id) -> dict:
+    return {
+        "original_url": str(link_data.original_url),
+        "url_hash": url_hash(str(link_data.original_url)),
+        "short_code": short_code,
+        "expires_at": link_data.expires_at,
+        "user_id": user_id,
+    }
+
+
+def custom_alias_of(link_data):
+    return getattr(link_data, "custom_alias", None)
+
+
+def wants_reuse(link_data) -> bool:
+    reuse = getattr(link_data, "reuse_existing", None)
+    return (LINK_REUSE_EXISTING if reuse is None else reuse) and not custom_alias_of(link_data)
+
+
+def reuses(link: Link, link_data) -> bool:
+    return (
+        normalize_url(link.original_url) == normalize_url(str(link_data.original_url))
+        and link.expires_at == link_data.expires_at
+    )
+
+
+async def find_reusable(db: AsyncSession, user_id, items: list) -> list:
+    # One lookup on the (user_id, url_hash) index for all items; the URL itself is compared to rule out hash clashes.
+    hashes = {url_hash(str(link_data.original_url)) for link_data in items}
+    result = await db.execute(
+        select(Link)
+        .where(
+            Link.user_id == user_id,
+            Link.url_hash.in_(hashes),
+            or_(Link.expires_at.is_(None), Link.expires_at > datetime.utcnow()),
+        )
+        .order_by(Link.id)
+    )
+    candidates = result.scalars().all()
+    return [next((link for link in candidates if reuses(link, link_data)), None) for link_data in items]
+
+
+def insert_ignoring_conflicts(dialect_name: str, rows: list[dict]):
+    links = Link.__table__
+    if dialect_name == "postgresql":
+        stmt = postgresql.insert(links).values(rows).on_conflict_do_nothing(index_elements=["short_code"])
+    elif dialect_name == "sqlite":
+        stmt = sqlite.insert(links).values(rows).on_conflict_do_nothing(index_elements=["short_code"])
+    else:
+        stmt = insert(links).values(rows)
+    return stmt.returning(*(links.c[name] for name in LINK_COLUMNS))
 
 
 async def create_link(db: AsyncSession, link_data, user: User):
     custom_alias = getattr(link_data, "custom_alias", None)
+    if custom_alias in RESERVED_ALIASES:
+        raise HTTPException(status_code=400, detail=RESERVED_ALIAS_ERROR)
     if custom_alias:
         existing = await db.execute(select(Link).where(Link.short_code == custom_alias))
         if existing.scalar_one_or_none():
             raise HTTPException(status_code=400, detail="Custom alias already taken")
-        short_code = custom_alias
-    else:
-        short_code = await generate_unique_code(db)
 
-    new_link = Link(
-        original_url=str(link_data.original_url),
-        short_code=short_code,
-        expires_at=link_data.expires_at,
-        user_id=user.id
-    )
+    user_id = user.id
+    if wants_reuse(link_data):
+        existing = (await find_reusable(db, user_id, [link_data]))[0]
+        if existing is not None:
+            return existing
+
+    for attempt in range(CREATE_ATTEMPTS):
+        short_code = custom_alias or await generate_unique_code(db)
+        new_link = Link(**link_values(link_data, short_code, user_id))
+        db.add(new_link)
+        try:
+            await db.commit()
+            break
+        except IntegrityError:
+            await db.rollback()
+            # Generated codes only clash with custom aliases or legacy random codes; take the next id.
+            if custom_alias:
+                raise HTTPException(status_code=400, detail="Custom alias already taken")
+            if attempt == CREATE_ATTEMPTS - 1:
+                raise HTTPException(status_code=500, detail="Failed to generate unique short code")
 
-    db.add(new_link)
-    await db.commit()
     await db.refresh(new_link)
-    return new_link
\ No newline at end of file
+    if custom_alias:
+        # The alias may have been probed before it existed; drop cached 404s everywhere.
+        await invalidate_link(short_code)
+    link_guard.add(short_code)
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        ttl = link_cache_ttl(new_link.expires_at)
+        if ttl > 0:
+            pipe.setex(short_code, jittered_ttl(ttl), new_link.original_url)
+        announce_created(pipe, [short_code])
+        await pipe.execute()
+    except Exception as e:
+        report_redis_error("[Redis] warm-up", e)
+        await announce_lost(db, [short_code])
+    return new_link
+
+
+async def create_links(db: AsyncSession, items: list, user: User) -> list[tuple]:
+    # Returns (index, row, error) per item; row is a mapping of LINK_COLUMNS for created links.
+    user_id = user.id
+    results = {}
+    pending = {}
+    seen_aliases = set()
+    for index, link_data in enumerate(items):
+        alias = custom_alias_of(link_data)
+        if alias in RESERVED_ALIASES:
+            results[index] = (index, None, RESERVED_ALIAS_ERROR)
+            continue
+        if alias and alias in seen_aliases:
+            results[index] = (index, None, "Duplicate custom alias in batch")
+            continue
+        if alias:
+            seen_aliases.add(alias)
+        pending[index] = alias
+
+    reusable = [index for index in pending if wants_reuse(items[index])]
+    if reusable:
+        for index, link in zip(reusable, await find_reusable(db, user_id, [items[i] for i in reusable])):
+            if link is not None:
+                results[index] = (index, {name: getattr(link, name) for name in LINK_COLUMNS}, None)
+                del pending[index]
+
+    dialect_name = (await db.connection()).dialect.name
+    for _ in range(CREATE_ATTEMPTS):
+        if not pending:
+            break
+        generated = iter(await get_allocator().allocate_many(db, sum(1 for alias in pending.values() if not alias)))
+        codes = {index: alias or next(generated) for index, alias in pending.items()}
+        rows = [link_values(items[index], code, user_id) for index, code in codes.items()]
+        inserted = {row.short_code: row._mapping for row in await db.execute(insert_ignoring_conflicts(dialect_name, rows))}
+
+        for index, code in codes.items():
+            if code in inserted:
+                results[index] = (index, inserted[code], None)
+                del pending[index]
+            elif pending[index]:
+                results[index] = (index, None, "Custom alias already taken")
+                del pending[index]
+        # Whatever is left collided on a generated code and gets a fresh one.
+    for index in pending:
+        results[index] = (index, None, "Failed to generate unique short code")
+    await db.commit()
+
+    created = [row for _, row, _ in results.values() if row is not None]
+    aliases = [row["short_code"] for index, row, _ in results.values() if row is not None and custom_alias_of(items[index])]
+    for alias in aliases:
+        link_cache.delete(alias)
+    if created:
+        for row in created:
+            link_guard.add(row["short_code"])
+        try:
+            redis = await get_redis()
+            pipe = redis.pipeline(transaction=False)
+            for row in created:
+                ttl = link_cache_ttl(row["expires_at"])
+                if ttl > 0:
+                    pipe.setex(row["short_code"], jittered_ttl(ttl), row["original_url"])
+            for alias in aliases:
+                pipe.publish(INVALIDATION_CHANNEL, alias)
+            announce_created(pipe, [row["short_code"] for row in created])
+            await pipe.execute()
+        except Exception as e:
+            report_redis_error("[Redis] batch warm-up", e)
+            await announce_lost(db, [row["short_code"] for row in created])
+    return [results[index] for index in sorted(results)]
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, or_, select
+
+from app import background
+from app.db import AsyncSessionLocal
+from app.local_cache import evict_links
+from app.models.models import Link
+from app.redis_cache import get_redis, report_redis_error
+
+CLEANUP_CHUNK_SIZE = int(os.getenv("CLEANUP_CHUNK_SIZE", "1000"))
+# Chunks deleted within the request; anything bigger continues as a background job.
+CLEANUP_INLINE_CHUNKS = int(os.getenv("CLEANUP_INLINE_CHUNKS", "5"))
+CLEANUP_JOB_TTL = int(os.getenv("CLEANUP_JOB_TTL", "3600"))
+CLEANUP_JOB_PREFIX = "cleanup:job:"
+
+
+def cleanup_chunk(user_id: int, cutoff: datetime, after_id: int, limit: int):
+    # Keyset over the (user_id, id) index, so each chunk starts where the previous one stopped.
+    ids = (
+        select(Link.id)
+        .where(
+            Link.user_id == user_id,
+            Link.id > after_id,
+            or_(Link.last_click < cutoff, Link.last_click.is_(None)),
+        )
+        .order_by(Link.id)
+        .limit(limit)
+    )
+    return delete(Link).where(Link.id.in_(ids.scalar_subquery())).returning(Link.id, Link.short_code)
+
+
+async def delete_next_chunk(db, user_id: int, cutoff: datetime, after_id: int, limit: int):
+    rows = (await db.execute(cleanup_chunk(user_id, cutoff, after_id, limit))).all()
+    await db.commit()
+    codes = [row.short_code for row in rows]
+    await evict_links(codes)
+    return max((row.id for row in rows), default=after_id), len(codes)
+
+
+class CleanupJob:
+    def __init__(self, user_id: int, cutoff: datetime):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.cutoff = cutoff
+        self.status = "running"
+        self.deleted = 0
+        self.chunks = 0
+        self.after_id = 0
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "deleted": self.deleted,
+            "chunks": self.chunks,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    async def step(self, db) -> bool:
+        self.after_id, deleted = await delete_next_chunk(
+            db, self.user_id, self.cutoff, self.after_id, CLEANUP_CHUNK_SIZE
+        )
+        self.deleted += deleted
+        self.chunks += 1
+        if deleted < CLEANUP_CHUNK_SIZE:
+            self.finish("done")
+            return False
+        return True
+
+    def finish(self, status: str, error: str | None = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+
+# job id -> job, for jobs started by this worker
+cleanup_jobs: dict[str, CleanupJob] = {}
+
+
+async def publish_progress(job: CleanupJob):
+    # Mirrored to Redis so any worker can answer a status request.
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        key = CLEANUP_JOB_PREFIX + job.id
+        pipe.hset(key, mapping={"user_id": job.user_id, **{k: "" if v is None else v for k, v in job.snapshot().items()}})
+        pipe.expire(key, CLEANUP_JOB_TTL)
+        await pipe.execute()
+    except Exception as e:
+        report_redis_error("[Redis] cleanup progress update", e)
+
+
+async def run_cleanup_job(job: CleanupJob):
+    try:
+        async with AsyncSessionLocal() as db:
+            while await job.step(db):
+                await publish_progress(job)
+    except asyncio.CancelledError:
+        job.finish("cancelled")
+        raise
+    except Exception as e:
+        print(f"[Cleanup] job {job.id} failed: {e}")
+        job.finish("failed", str(e))
+    finally:
+        await publish_progress(job)
+
+
+def prune_jobs():
+    expired_before = time.time() - CLEANUP_JOB_TTL
+    for job_id in [job_id for job_id, job in cleanup_jobs.items() if (job.finished_at or time.time()) < expired_before]:
+        del cleanup_jobs[job_id]
+
+
+async def start_cleanup(db, user_id: int, cutoff: datetime) -> CleanupJob:
+    prune_jobs()
+    job = CleanupJob(user_id, cutoff)
+    for _ in range(CLEANUP_INLINE_CHUNKS):
+        if not await job.step(db):
+            return job
+    cleanup_jobs[job.id] = job
+    await publish_progress(job)
+    background.start(f"cleanup:{job.id}", run_cleanup_job(job))
+    return job
+
+
+async def get_cleanup_job(job_id: str, user_id: int) -> dict | None:
+    job = cleanup_jobs.get(job_id)
+    if job is not None:
+        return job.snapshot() if job.user_id == user_id else None
+    try:
+        redis = await get_redis()
+        data = await redis.hgetall(CLEANUP_JOB_PREFIX + job_id)
+    except Exception as e:
+        report_redis_error("[Redis] cleanup progress lookup", e)
+        return None
+    if not data or int(data.pop("user_id")) != user_id:
+        return None
+    return {k: v or None for k, v in data.items()}
@@ -0,0 +1,96 @@
+import base64
+import csv
+import io
+import os
+from datetime import datetime
+from operator import attrgetter
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+
+from app.db import ReadSessionLocal
+from app.models.models import Link
+
+LINKS_PAGE_SIZE = int(os.getenv("LINKS_PAGE_SIZE", "50"))
+LINKS_PAGE_MAX = int(os.getenv("LINKS_PAGE_MAX", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_COLUMNS = ("short_code", "original_url", "created_at", "expires_at", "click_count", "last_click")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Pages and exports read plain rows: no identity map and no Pydantic validation per link.
+LINK_INFO_FIELDS = ("original_url", "short_code", "created_at", "expires_at", "click_count", "last_click")
+LINK_ROW_COLUMNS = (*(getattr(Link, name) for name in LINK_INFO_FIELDS), Link.id)
+export_fields = attrgetter(*EXPORT_COLUMNS)
+
+
+def link_rows():
+    return select(*LINK_ROW_COLUMNS)
+
+
+def row_to_dict(row) -> dict:
+    # Shaped like LinkInfo; the trailing id only feeds the cursor, and zip drops it.
+    return dict(zip(LINK_INFO_FIELDS, row))
+
+
+def encode_cursor(link) -> str:
+    raw = f"{link.created_at.isoformat()}|{link.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, link_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(link_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset(stmt, cursor: str | None):
+    # Newest first; the cursor is the (created_at, id) of the last row already returned.
+    if cursor:
+        stmt = stmt.where(tuple_(Link.created_at, Link.id) < tuple_(*decode_cursor(cursor)))
+    return stmt.order_by(Link.created_at.desc(), Link.id.desc())
+
+
+async def fetch_page(db, stmt, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    rows = (await db.execute(keyset(stmt, cursor).limit(limit + 1))).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def serialize_ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, export_fields(row)))) + b"\n" for row in rows)
+
+
+def serialize_csv(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([export_value(value) for value in export_fields(row)] for row in rows)
+    return buffer.getvalue()
+
+
+async def export_rows(stmt, cursor: str | None, export_format: str):
+    # Own session: the request's session is closed by the time the body is streamed.
+    async with ReadSessionLocal() as db:
+        result = await db.stream(keyset(stmt, cursor).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if export_format == "csv":
+            yield serialize_csv([], header=True)
+        async for rows in result.partitions():
+            yield serialize_ndjson(rows) if export_format == "ndjson" else serialize_csv(rows)
+
+
+def export_response(stmt, cursor: str | None, export_format: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        export_rows(stmt, cursor, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
@@ -2,7 +2,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.models import User
 from app.schemas.users import UserCreate
-from app.auth.utils import hash_password
+from app.auth.hashing import password_hasher
 from fastapi import HTTPException
 from pydantic import BaseModel, EmailStr
 
@@ -15,7 +15,7 @@ async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
 
     user = User(
         email=user_data.email,
-        hashed_password=hash_password(user_data.password)
+        hashed_password=await password_hasher.hash(user_data.password)
     )
     db.add(user)
     await db.commit()
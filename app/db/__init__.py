@@ -1,21 +1,114 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+from app.db.metrics import InstrumentedQueuePool, instrument_engine
+from app.db.replicas import RoutingSession, replica_set
+from app.settings import Settings, get_settings
+
+# Built by init_engines() in the app's lifespan (or handed to configure_engines()), not at import.
+engine = None
+redirect_engine = None
+# What init_engines() built and dispose_engines() closes; engines handed to configure_engines() stay the caller's.
+owned_engines: list = []
+
+
+def engine_options(url: str, pool_size: int, max_overflow: int, read_only: bool = False,
+                   settings: Settings | None = None) -> dict:
+    settings = settings or get_settings()
+    backend = make_url(url).get_backend_name()
+    options = {"echo": settings.db_echo, "query_cache_size": settings.db_query_cache_size,
+               "pool_pre_ping": settings.db_pool_pre_ping}
+    if backend == "sqlite" and make_url(url).database in (None, "", ":memory:"):
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    if make_url(url).get_driver_name() == "asyncpg":
+        connect_args = {"prepared_statement_cache_size": settings.db_statement_cache_size}
+        if read_only:
+            connect_args["server_settings"] = {"default_transaction_read_only": "on"}
+        options["connect_args"] = connect_args
+    return options
+
+
+def make_engine(url: str, name: str, pool_size: int, max_overflow: int, read_only: bool = False,
+                settings: Settings | None = None):
+    engine = create_async_engine(url, **engine_options(url, pool_size, max_overflow, read_only, settings))
+    instrument_engine(engine, name)
+    return engine
 
-engine = create_async_engine(DATABASE_URL, echo=True)
 
 AsyncSessionLocal = sessionmaker(
-    bind=engine,
     class_=AsyncSession,
+    sync_session_class=RoutingSession,
     expire_on_commit=False
 )
+ReadSessionLocal = sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+    info={"replica": True}
+)
+RedirectSessionLocal = sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+    info={"replica": True}
+)
 
 Base = declarative_base()
 
+
+def configure_engines(primary, redirect=None, replicas=()):
+    global engine, redirect_engine
+    engine = primary
+    redirect_engine = redirect or primary
+    AsyncSessionLocal.configure(bind=primary)
+    ReadSessionLocal.configure(bind=primary)
+    RedirectSessionLocal.configure(bind=redirect or primary)
+    replica_set.configure((f"replica-{i}", replica) for i, replica in enumerate(replicas))
+
+
+def init_engines(settings: Settings | None = None):
+    settings = settings or get_settings()
+    primary = make_engine(settings.database_url, "primary", settings.db_pool_size, settings.db_max_overflow,
+                          settings=settings)
+    redirect = None
+    if settings.db_redirect_pool:
+        redirect = make_engine(settings.database_redirect_url, "redirect", settings.db_redirect_pool_size,
+                               settings.db_redirect_max_overflow, read_only=True, settings=settings)
+    replicas = [
+        make_engine(url, f"replica-{i}", settings.db_replica_pool_size, settings.db_replica_max_overflow,
+                    read_only=True, settings=settings)
+        for i, url in enumerate(settings.database_replica_urls)
+    ]
+    configure_engines(primary, redirect, replicas)
+    owned_engines[:] = [built for built in (primary, redirect, *replicas) if built is not None]
+    return primary
+
+
+async def dispose_engines():
+    global engine, redirect_engine
+    if not owned_engines:
+        return
+    engines = list(owned_engines)
+    owned_engines.clear()
+    engine = redirect_engine = None
+    replica_set.configure(())
+    for disposed in engines:
+        await disposed.dispose()
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def get_read_db():
+    async with ReadSessionLocal() as session:
         yield session
\ No newline at end of file
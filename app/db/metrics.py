@@ -0,0 +1,168 @@
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.db.replicas import current_user_id, request_writers, share_writes
+from app.metrics import db_queries, scope_label
+
+# ASGI scope of the request being served; the router fills in the matched route before any checkout.
+current_scope: ContextVar[dict | None] = ContextVar("db_current_scope", default=None)
+
+def route_label() -> str:
+    scope = current_scope.get()
+    return "background" if scope is None else scope_label(scope)
+
+
+class RouteStats:
+    __slots__ = ("checkouts", "wait_total", "wait_max", "checkout_total", "checkout_max", "hold_total", "hold_max")
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = self.wait_max = 0.0
+        self.checkout_total = self.checkout_max = 0.0
+        self.hold_total = self.hold_max = 0.0
+
+    def snapshot(self) -> dict:
+        n = self.checkouts or 1
+        return {
+            "checkouts": self.checkouts,
+            "wait_avg_ms": self.wait_total / n * 1000,
+            "wait_max_ms": self.wait_max * 1000,
+            "checkout_avg_ms": self.checkout_total / n * 1000,
+            "checkout_max_ms": self.checkout_max * 1000,
+            "hold_avg_ms": self.hold_total / n * 1000,
+            "hold_max_ms": self.hold_max * 1000,
+        }
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.routes: dict[str, RouteStats] = {}
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.pool = None
+
+    def _route(self, label: str) -> RouteStats:
+        stats = self.routes.get(label)
+        if stats is None:
+            stats = self.routes[label] = RouteStats()
+        return stats
+
+    def record_wait(self, record, seconds: float):
+        record.info["checkout_started"] = time.perf_counter() - seconds
+        stats = self._route(route_label())
+        stats.wait_total += seconds
+        stats.wait_max = max(stats.wait_max, seconds)
+
+    def on_checkout(self, dbapi_connection, record, proxy):
+        now = time.perf_counter()
+        label = route_label()
+        stats = self._route(label)
+        latency = now - record.info.pop("checkout_started", now)
+        stats.checkouts += 1
+        stats.checkout_total += latency
+        stats.checkout_max = max(stats.checkout_max, latency)
+        record.info["checked_out_at"] = now
+        record.info["route"] = label
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def on_checkin(self, dbapi_connection, record):
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if checked_out_at is None:
+            return
+        self.in_use -= 1
+        held = time.perf_counter() - checked_out_at
+        stats = self._route(record.info.pop("route", "unknown"))
+        stats.hold_total += held
+        stats.hold_max = max(stats.hold_max, held)
+
+    def snapshot(self) -> dict:
+        pool = {}
+        if self.pool is not None:
+            pool["status"] = self.pool.status()
+            if isinstance(self.pool, AsyncAdaptedQueuePool):
+                pool.update(size=self.pool.size(), checked_in=self.pool.checkedin(), overflow=self.pool.overflow())
+        return {
+            "name": self.name,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            **pool,
+            "routes": {label: stats.snapshot() for label, stats in sorted(self.routes.items())},
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # _do_get is where a checkout blocks for a free slot or opens an overflow connection.
+    def _do_get(self):
+        started = time.perf_counter()
+        record = super()._do_get()
+        metrics = getattr(self, "metrics", None)
+        if metrics is not None:
+            metrics.record_wait(record, time.perf_counter() - started)
+        return record
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = getattr(self, "metrics", None)
+        if pool.metrics is not None:
+            pool.metrics.pool = pool
+        return pool
+
+
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+def instrument_engine(engine, name: str) -> PoolMetrics:
+    metrics = PoolMetrics(name)
+    pool = engine.sync_engine.pool
+    metrics.pool = pool
+    pool.metrics = metrics
+    event.listen(engine.sync_engine, "checkout", metrics.on_checkout)
+    event.listen(engine.sync_engine, "checkin", metrics.on_checkin)
+    instrument_queries(engine, name)
+    pool_metrics[name] = metrics
+    return metrics
+
+
+def instrument_queries(engine, name: str):
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        # SELECT/INSERT/UPDATE/DELETE/WITH...: the leading keyword keeps the label set small.
+        kind = statement.lstrip()[:6].upper()
+        db_queries.observe((name, kind), time.perf_counter() - context._metrics_started)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before)
+    event.listen(engine.sync_engine, "after_cursor_execute", after)
+
+
+class DBRouteMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_scope.set(scope)
+        user_token = current_user_id.set(None)
+        writers = set()
+        writers_token = request_writers.set(writers)
+
+        async def send_after_writes(message):
+            # The client can't follow up on another worker before its write marker is in Redis.
+            if writers and message["type"] == "http.response.start":
+                await share_writes(writers)
+                writers.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_after_writes)
+        finally:
+            request_writers.reset(writers_token)
+            current_user_id.reset(user_token)
+            current_scope.reset(token)
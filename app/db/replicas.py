@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.local_cache import LocalCache
+from app.redis_cache import REDIS_ERRORS, get_redis, report_redis_error
+
+REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("DB_REPLICA_HEALTH_TIMEOUT", "2"))
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+READ_YOUR_WRITES_MAX_USERS = int(os.getenv("DB_READ_YOUR_WRITES_MAX_USERS", "100000"))
+READ_YOUR_WRITES_PREFIX = "ryw:"
+
+PG_LAG_QUERY = text("SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)")
+
+# Id of the authenticated user of the current request, set by get_current_user.
+current_user_id: ContextVar[int | None] = ContextVar("db_current_user_id", default=None)
+
+# Users the current request wrote for; DBRouteMiddleware shares them before the response goes out.
+request_writers: ContextVar[set | None] = ContextVar("db_request_writers", default=None)
+
+# user id -> True for users who wrote within the window; they read from the primary so they never see
+# replication lag on their own data. Filled by this worker's writes and by load_recent_write() for the rest.
+recent_writes = LocalCache(READ_YOUR_WRITES_MAX_USERS, READ_YOUR_WRITES_WINDOW)
+
+
+async def share_writes(user_ids):
+    # The next request may land on another worker: a Redis key per user holds the end of the window.
+    if not replica_set:
+        return
+    until = time.time() + READ_YOUR_WRITES_WINDOW
+    try:
+        redis = await get_redis()
+        await asyncio.gather(*(
+            redis.setex(f"{READ_YOUR_WRITES_PREFIX}{user_id}", math.ceil(READ_YOUR_WRITES_WINDOW), until)
+            for user_id in user_ids
+        ))
+    except REDIS_ERRORS as e:
+        report_redis_error("[DB] read-your-writes marker", e)
+
+
+async def load_recent_write(user_id: int):
+    # Once a request's user is known: a write made through another worker keeps this one on the primary too.
+    if not replica_set or recent_writes.get(user_id) is not None:
+        return
+    try:
+        redis = await get_redis()
+        until = await redis.get(f"{READ_YOUR_WRITES_PREFIX}{user_id}")
+    except REDIS_ERRORS as e:
+        report_redis_error("[DB] read-your-writes lookup", e)
+        # Can't tell whether the user just wrote, so don't risk a stale read.
+        until = time.time() + 1
+    if until is not None and float(until) > time.time():
+        recent_writes.set(user_id, True, ttl=float(until) - time.time())
+
+
+class Replica:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self.last_error = None
+        self.checked_at = None
+
+    def snapshot(self) -> dict:
+        return {"healthy": self.healthy, "lag_seconds": self.lag, "last_error": self.last_error}
+
+
+class ReplicaSet:
+    def __init__(self, engines=()):
+        self.configure(engines)
+
+    def configure(self, engines):
+        self.replicas = [Replica(name, engine) for name, engine in engines]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pick(self):
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy:
+                return replica
+        return None
+
+    async def check(self, replica: Replica):
+        try:
+            async with replica.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = await asyncio.wait_for(conn.scalar(PG_LAG_QUERY), REPLICA_HEALTH_TIMEOUT)
+                else:
+                    await asyncio.wait_for(conn.execute(text("SELECT 1")), REPLICA_HEALTH_TIMEOUT)
+                    lag = 0
+            replica.lag = float(lag or 0)
+            replica.last_error = None if replica.lag <= REPLICA_MAX_LAG else f"lag {replica.lag:.1f}s"
+        except Exception as e:
+            replica.last_error = str(e) or type(e).__name__
+        replica.healthy = replica.last_error is None
+        replica.checked_at = time.time()
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def run_health_checks(self):
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                print(f"[DB] replica health check failed: {e}")
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+
+    def snapshot(self) -> dict:
+        return {replica.name: replica.snapshot() for replica in self.replicas}
+
+
+replica_set = ReplicaSet()
+
+
+class RoutingSession(Session):
+    # Sessions opened with info={"replica": True} send reads to a healthy replica, picked once per session.
+    # Writes, flushes and every read of a user who just wrote go to the session's own bind, the primary.
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            user_id = current_user_id.get()
+            if user_id is not None:
+                recent_writes.set(user_id, True)
+                writers = request_writers.get()
+                if writers is not None:
+                    writers.add(user_id)
+            return super().get_bind(mapper, clause=clause, **kw)
+        if self.info.get("replica") and not recent_writes.get(current_user_id.get()):
+            if "replica_engine" not in self.info:
+                replica = replica_set.pick()
+                self.info["replica_engine"] = replica.engine.sync_engine if replica else None
+            if self.info["replica_engine"] is not None:
+                return self.info["replica_engine"]
+        return super().get_bind(mapper, clause=clause, **kw)
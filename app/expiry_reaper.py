@@ -0,0 +1,75 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from app.db import AsyncSessionLocal
+from app.local_cache import evict_links
+from app.models.models import Link
+from app.redis_cache import get_redis
+
+EXPIRY_REAP_INTERVAL = float(os.getenv("EXPIRY_REAP_INTERVAL", "60"))
+EXPIRY_REAP_BATCH_SIZE = int(os.getenv("EXPIRY_REAP_BATCH_SIZE", "1000"))
+EXPIRY_REAP_MAX_BATCHES = int(os.getenv("EXPIRY_REAP_MAX_BATCHES", "100"))
+# Expired links stay listed in /links/expired for this long before they are deleted.
+EXPIRY_REAP_GRACE = float(os.getenv("EXPIRY_REAP_GRACE", "86400"))
+REAPER_LOCK_KEY = "links:reaper-lock"
+REAPER_LOCK_TIMEOUT = 300
+
+
+def expired_chunk(cutoff: datetime, limit: int):
+    # Matches the partial index on expires_at, oldest first.
+    ids = (
+        select(Link.id)
+        .where(Link.expires_at.is_not(None), Link.expires_at < cutoff)
+        .order_by(Link.expires_at)
+        .limit(limit)
+    )
+    return delete(Link).where(Link.id.in_(ids.scalar_subquery())).returning(Link.short_code)
+
+
+async def reap_expired(db, cutoff: datetime | None = None) -> int:
+    cutoff = cutoff or datetime.utcnow() - timedelta(seconds=EXPIRY_REAP_GRACE)
+    reaped = 0
+    for _ in range(EXPIRY_REAP_MAX_BATCHES):
+        codes = list((await db.execute(expired_chunk(cutoff, EXPIRY_REAP_BATCH_SIZE))).scalars())
+        await db.commit()
+        await evict_links(codes)
+        reaped += len(codes)
+        if len(codes) < EXPIRY_REAP_BATCH_SIZE:
+            break
+    return reaped
+
+
+async def reap_once(db) -> int:
+    # One worker reaps at a time; without Redis every worker reaps, which is safe, just redundant.
+    lock = None
+    try:
+        redis = await get_redis()
+        lock = redis.lock(REAPER_LOCK_KEY, timeout=REAPER_LOCK_TIMEOUT, blocking=False)
+        if not await lock.acquire():
+            return 0
+    except Exception as e:
+        print(f"[Reaper] lock failed: {e}")
+        lock = None
+    try:
+        return await reap_expired(db)
+    finally:
+        if lock is not None:
+            try:
+                await lock.release()
+            except Exception as e:
+                print(f"[Reaper] unlock failed: {e}")
+
+
+async def run_expiry_reaper():
+    while True:
+        await asyncio.sleep(EXPIRY_REAP_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await reap_once(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Reaper] run failed: {e}")
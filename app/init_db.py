@@ -1,5 +1,27 @@
-from app.db import engine, Base
+import asyncio
+
+from app import db
+from app.db import Base
+from app.settings import Settings, get_settings
 
 async def init_models():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all) 
\ No newline at end of file
+    async with db.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def run_migrations(alembic_config: str, database_url: str | None = None):
+    from alembic import command
+    from alembic.config import Config
+
+    # The server has already configured logging; alembic's fileConfig would disable its loggers.
+    config = Config(alembic_config, attributes={"configure_logger": False})
+    if database_url:
+        # The app's own (async) URL, not alembic.ini's; env.py drives async drivers itself.
+        config.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
+    await asyncio.to_thread(command.upgrade, config, "head")
+
+async def prepare_database(settings: Settings | None = None):
+    settings = settings or get_settings()
+    if settings.migrate_on_startup:
+        await run_migrations(settings.alembic_config, settings.database_url)
+    elif settings.init_db_on_startup:
+        await init_models()
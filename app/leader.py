@@ -0,0 +1,62 @@
+import asyncio
+import os
+import time
+import uuid
+
+from app.redis_cache import REDIS_ERRORS, get_redis
+
+# One worker across all processes and containers runs each startup job; the rest wait for it.
+STARTUP_LOCK_TTL = int(os.getenv("STARTUP_LOCK_TTL", "300"))
+# A finished job counts for workers that start within this many seconds, e.g. the rest of a rollout.
+STARTUP_DONE_TTL = int(os.getenv("STARTUP_DONE_TTL", "60"))
+STARTUP_WAIT_TIMEOUT = float(os.getenv("STARTUP_WAIT_TIMEOUT", "120"))
+STARTUP_POLL_INTERVAL = 0.2
+STARTUP_PREFIX = "startup:"
+
+
+async def run_once(name: str, job) -> bool:
+    # True when this worker ran the job. Without Redis every worker runs it, as before.
+    lock_key = f"{STARTUP_PREFIX}{name}:lock"
+    done_key = f"{STARTUP_PREFIX}{name}:done"
+    token = uuid.uuid4().hex
+    try:
+        redis = await get_redis()
+        if await redis.exists(done_key):
+            return False
+        elected = await redis.set(lock_key, token, nx=True, ex=STARTUP_LOCK_TTL)
+    except REDIS_ERRORS as e:
+        print(f"[Startup] {name} election failed, running it here: {e}")
+        await job()
+        return True
+    if not elected:
+        if await wait_for_leader(redis, lock_key, done_key):
+            return False
+        # The leader gave up or died before finishing: take over.
+        return await run_once(name, job)
+    try:
+        await job()
+        await redis.set(done_key, "1", ex=STARTUP_DONE_TTL)
+    finally:
+        try:
+            if await redis.get(lock_key) == token:
+                await redis.delete(lock_key)
+        except REDIS_ERRORS as e:
+            print(f"[Startup] releasing {name} failed: {e}")
+    return True
+
+
+async def wait_for_leader(redis, lock_key: str, done_key: str) -> bool:
+    # True once the leader finished; False if its lock went away without a result.
+    deadline = time.monotonic() + STARTUP_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(STARTUP_POLL_INTERVAL)
+        try:
+            if await redis.exists(done_key):
+                return True
+            if not await redis.exists(lock_key):
+                return False
+        except REDIS_ERRORS as e:
+            print(f"[Startup] waiting for leader failed: {e}")
+            return True
+    print(f"[Startup] leader did not finish {done_key} within {STARTUP_WAIT_TIMEOUT}s, continuing")
+    return True
@@ -0,0 +1,169 @@
+import asyncio
+import math
+import os
+import random
+import time
+from collections import OrderedDict
+
+from app.redis_cache import get_blocking_redis, get_redis, report_redis_error
+from app.settings import get_settings
+
+INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "links:invalidate")
+
+
+class LocalCache:
+    def __init__(self, max_size: int, ttl: float, xfetch_beta: float = 1.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.xfetch_beta = xfetch_beta
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at, stale_until, _ = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            if stale_until <= now:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def lookup(self, key):
+        # (value, refresh): the value may be stale, and refresh tells this caller to reload it in the background.
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        value, expires_at, stale_until, delta = entry
+        now = time.monotonic()
+        if stale_until <= now:
+            del self._data[key]
+            self.misses += 1
+            return None, False
+        self._data.move_to_end(key)
+        if expires_at <= now:
+            self.stale_hits += 1
+            return value, True
+        self.hits += 1
+        # XFetch: the closer to expiry and the slower the reload, the likelier an early refresh.
+        return value, delta > 0 and now - delta * self.xfetch_beta * math.log(1.0 - random.random()) >= expires_at
+
+    def set(self, key, value, ttl: float | None = None, stale: float = 0.0, delta: float = 0.0):
+        # stale: how long past expiry lookup() may still serve the value; delta: how long a reload took.
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at, expires_at + stale, delta)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def configure(self, max_size: int, ttl: float, xfetch_beta: float = 1.0):
+        # Entries already cached keep the expiry they were set with.
+        self.max_size = max_size
+        self.ttl = ttl
+        self.xfetch_beta = xfetch_beta
+        while len(self._data) > max(max_size, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        for key in [key for key, entry in self._data.items() if predicate(entry[0])]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# short_code -> original_url, or the HTTP status (404/410) of a negative lookup
+link_cache = LocalCache(get_settings().cache.local_max_size, get_settings().cache.local_ttl, get_settings().cache.xfetch_beta)
+
+# True while this worker is subscribed, i.e. while it can trust that no message is being missed.
+listener_connected = False
+
+# channel -> (on_message, on_reset); on_reset runs when messages may have been missed
+invalidation_handlers = {INVALIDATION_CHANNEL: (link_cache.delete, link_cache.clear)}
+
+
+def register_invalidation_handler(channel: str, on_message, on_reset):
+    invalidation_handlers[channel] = (on_message, on_reset)
+
+
+async def invalidate_link(short_code: str):
+    link_cache.delete(short_code)
+    try:
+        redis = await get_redis()
+        await redis.publish(INVALIDATION_CHANNEL, short_code)
+    except Exception as e:
+        report_redis_error("[Cache] PUBLISH invalidation", e)
+
+
+async def evict_links(short_codes: list[str]):
+    # Drops Redis entries and tells every worker to forget the codes, all in one round trip.
+    for short_code in short_codes:
+        link_cache.delete(short_code)
+    if not short_codes:
+        return
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        pipe.unlink(*short_codes)
+        for short_code in short_codes:
+            pipe.publish(INVALIDATION_CHANNEL, short_code)
+        await pipe.execute()
+    except Exception as e:
+        report_redis_error("[Cache] UNLINK eviction", e)
+
+
+async def listen_for_invalidations(retry_delay: float = 5.0):
+    global listener_connected
+    while True:
+        try:
+            redis = await get_blocking_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(*invalidation_handlers)
+            listener_connected = True
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        invalidation_handlers[message["channel"]][0](message["data"])
+            finally:
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Cache] invalidation listener failed: {e}")
+        listener_connected = False
+        # Messages published while we were disconnected are lost, so start over cold.
+        for _, on_reset in invalidation_handlers.values():
+            on_reset()
+        await asyncio.sleep(retry_delay)
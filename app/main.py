@@ -1,15 +1,112 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.api.main import router as link_router
+from app.api.main import router as link_router, redirect_router
 from app.auth.auth import router as auth_router
-import os
-from app.init_db import init_models
+from app.api.internal import router as internal_router, metrics_router
+from app.api.responses import FastJSONResponse
+from app import background
+from app.init_db import prepare_database
+from app.leader import run_once
+from app.local_cache import link_cache, listen_for_invalidations
+from app.click_counter import run_click_spiller, run_click_flusher, flush_clicks
+from app.expiry_reaper import run_expiry_reaper
+from app.bloom import link_guard, run_bloom_rebuilder
+from app.cache_warmup import run_cache_warmup
+from app.click_events import click_events, run_click_event_shipper, run_click_event_consumer, ship_click_events
+from app import db
+from app.db import AsyncSessionLocal, dispose_engines, init_engines, replica_set
+from app.db.metrics import DBRouteMiddleware
+from app.metrics import RequestMetricsMiddleware, run_loop_lag_monitor
+from app.rate_limit import RateLimitMiddleware, rate_limiter
+from app.auth.hashing import password_hasher
+from app.auth.utils import principal_cache
+from app.redis_cache import close_redis
+from app.profiling import StartupProfile, print_report
+from app.settings import Settings, acquire_settings, get_settings, release_settings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Raises if another app in this process is already running on different settings.
+    settings = acquire_settings(app.state.settings)
+    try:
+        await startup(settings)
+        try:
+            yield
+        finally:
+            await shutdown()
+    finally:
+        release_settings()
+
+
+def apply_settings(settings: Settings):
+    # The caches and the limiter were sized from the environment at import; the running app's settings win.
+    link_cache.configure(settings.cache.local_max_size, settings.cache.local_ttl, settings.cache.xfetch_beta)
+    principal_cache.configure(settings.auth.cache_max_size, settings.auth.cache_ttl)
+    click_events.configure(settings.clicks.event_buffer_size, settings.clicks.country_header)
+    link_guard.configure(settings.bloom.capacity, settings.bloom.error_rate)
+    rate_limiter.configure(settings.rate_limit)
+
+
+async def startup(settings: Settings):
+    profile = StartupProfile()
+    apply_settings(settings)
+    with profile.step("engines"):
+        # Tests and benchmarks bind their own engines before the app starts.
+        if db.engine is None:
+            init_engines(settings)
+    if settings.migrate_on_startup or settings.init_db_on_startup:
+        with profile.step("database"):
+            # Schema changes must land before any worker serves, but only one worker applies them.
+            await run_once("database", lambda: prepare_database(settings))
+    with profile.step("background tasks"):
+        background.start("cache-warmup", run_cache_warmup())
+        background.start("cache-invalidation", listen_for_invalidations())
+        background.start("click-spiller", run_click_spiller())
+        background.start("click-flusher", run_click_flusher())
+        background.start("expiry-reaper", run_expiry_reaper())
+        background.start("click-event-shipper", run_click_event_shipper())
+        background.start("click-event-consumer", run_click_event_consumer())
+        background.start("bloom-rebuild", run_bloom_rebuilder())
+        background.start("loop-lag", run_loop_lag_monitor())
+        if replica_set:
+            background.start("replica-health", replica_set.run_health_checks())
+    if settings.profile_startup:
+        print_report(profile)
+
+
+async def shutdown():
+    # Runs after the server has stopped accepting and in-flight requests finished (or timed out).
+    await background.stop_all()
+    # Hand this worker's buffered clicks and click events to Redis (or the DB when Redis is down) before exiting.
+    try:
+        async with AsyncSessionLocal() as session:
+            await flush_clicks(session)
+    except Exception as e:
+        print(f"[Clicks] final flush failed: {e}")
+    await ship_click_events()
+    await close_redis()
+    await dispose_engines()
+    password_hasher.shutdown()
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    # Only builds the app: its settings become the process' own when its lifespan starts.
+    settings = settings or get_settings()
+    # Routes with a response_model keep FastAPI's Pydantic-to-bytes path; plain dict bodies go through orjson.
+    app = FastAPI(title=settings.title, default_response_class=FastJSONResponse, lifespan=lifespan)
+    app.state.settings = settings
+    app.add_middleware(DBRouteMiddleware)
+    # Inside the metrics middleware so throttled requests still show up as 429s.
+    app.add_middleware(RateLimitMiddleware, routers=(link_router, auth_router, internal_router, metrics_router))
+    app.add_middleware(RequestMetricsMiddleware)
 
-app = FastAPI(title="URL Shortener")
+    app.include_router(link_router)
+    app.include_router(auth_router)
+    app.include_router(internal_router)
+    app.include_router(metrics_router)
+    app.include_router(redirect_router)
+    return app
 
-app.include_router(link_router)
-app.include_router(auth_router)
 
-@app.on_event("startup")
-async def on_startup():
-    if os.getenv("INIT_DB_ON_STARTUP") == "true":
-        await init_models()
\ No newline at end of file
+app = create_app()
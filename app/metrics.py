@@ -0,0 +1,177 @@
+import asyncio
+import os
+from bisect import bisect_left
+from time import perf_counter
+
+# Prometheus text exposition without the client library: the hot path only bumps ints in dicts keyed by label tuples.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    # collect, when given, is merged in at scrape time for counts some object already keeps.
+    def __init__(self, name: str, help: str, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels=(), amount: float = 1):
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        values = {**self.values, **self.collect()} if self.collect is not None else self.values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{format_labels(self.labelnames, labels)} {value}" for labels, value in sorted(values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, labels, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}")
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    # Read at scrape time from state the application already keeps, so it costs nothing per request.
+    def __init__(self, name: str, help: str, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.values: dict[tuple, float] = {}
+
+    def set(self, labels, value: float):
+        self.values[labels] = value
+
+    def render(self) -> list[str]:
+        values = self.collect() if self.collect is not None else self.values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{format_labels(self.labelnames, labels)} {value}" for labels, value in sorted(values.items())]
+        return lines
+
+
+registry: dict = {}
+
+
+def register(metric):
+    registry[metric.name] = metric
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in registry.values():
+        try:
+            lines += metric.render()
+        except Exception as e:
+            print(f"[Metrics] collecting {metric.name} failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+request_latency = register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status.", ("route", "method", "status"),
+))
+cache_lookups = register(Counter("cache_lookups_total", "Redirect cache lookups by tier and result.", ("tier", "result")))
+db_queries = register(Histogram("db_query_duration_seconds", "Statement execution time by engine and kind.", ("engine", "kind")))
+redis_commands = register(Histogram("redis_command_duration_seconds", "Redis round-trip time by command.", ("command",)))
+password_hashing = register(Histogram(
+    "password_hash_duration_seconds", "Password hash and verify time, queueing for a worker included.", ("operation",),
+))
+loop_lag = register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task.", (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+))
+
+
+# Plain Starlette routes only leave scope["endpoint"] behind, so they register their template here.
+endpoint_labels: dict = {}
+
+
+def label_route(route):
+    endpoint_labels[route.endpoint] = route.path
+    return route
+
+
+def scope_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return endpoint_labels.get(endpoint) or getattr(endpoint, "__name__", "unknown")
+    # Never label by the raw path: that would create one series per short code.
+    return "unmatched"
+
+
+class StatusRecorder:
+    # A plain callable returning send()'s awaitable: no extra coroutine frame per ASGI message.
+    __slots__ = ("send", "status")
+
+    def __init__(self, send):
+        self.send = send
+        self.status = 500
+
+    def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        return self.send(message)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        recorder = StatusRecorder(send)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, recorder)
+        finally:
+            request_latency.observe((scope_label(scope), scope["method"], recorder.status), perf_counter() - started)
+
+
+async def run_loop_lag_monitor(interval: float = LOOP_LAG_INTERVAL):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe((), max(0.0, loop.time() - started - interval))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Sequence, Index, text
 from sqlalchemy.orm import relationship
 from app.db import Base
 import datetime
@@ -18,6 +18,8 @@ class Link(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     original_url = Column(String, nullable=False)
+    # utils.urls.url_hash(original_url), for indexed reverse lookups
+    url_hash = Column(BigInteger, nullable=True)
     short_code = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)
@@ -25,4 +27,60 @@ class Link(Base):
     last_click = Column(DateTime, nullable=True)
     
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    owner = relationship("User", back_populates="links")
\ No newline at end of file
+    owner = relationship("User", back_populates="links")
+
+    __table_args__ = (
+        # Keyset walks over one user's links by id (cleanup chunks).
+        Index("ix_links_user_id_id", "user_id", "id"),
+        # Keyset pages of one user's links, newest first (GET /links).
+        Index("ix_links_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Search by original URL and reuse of an already shortened URL.
+        Index("ix_links_user_id_url_hash", "user_id", "url_hash"),
+        # Only links that can expire; used by /links/expired and the expiry reaper.
+        Index(
+            "ix_links_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+            sqlite_where=text("expires_at IS NOT NULL"),
+        ),
+    )
+
+
+# Source of ids for generated short codes. Dialects without sequences (SQLite) use CodeCounter instead.
+short_code_seq = Sequence("short_code_seq", start=1, metadata=Base.metadata)
+
+
+class CodeCounter(Base):
+    __tablename__ = "code_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+class ClickFlush(Base):
+    __tablename__ = "click_flushes"
+
+    # Redis batch whose deltas are already in links.click_count; a retried flush of it is skipped.
+    batch_id = Column(String, primary_key=True)
+    flushed_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class Click(Base):
+    __tablename__ = "clicks"
+    # One partition per day on PostgreSQL, created ahead of time by app.click_events.
+    __table_args__ = {"postgresql_partition_by": "RANGE (clicked_at)"}
+
+    clicked_at = Column(DateTime, primary_key=True)
+    # Redis Stream entry id, so a redelivered event is inserted only once.
+    event_id = Column(String, primary_key=True)
+    short_code = Column(String, nullable=False)
+    referrer_host = Column(String, nullable=True)
+    ua_class = Column(String(16), nullable=True)
+    country = Column(String(2), nullable=True)
+
+
+class ClickRollup(Base):
+    __tablename__ = "click_rollups"
+
+    short_code = Column(String, primary_key=True)
+    # Start of the hour, UTC
+    bucket = Column(DateTime, primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
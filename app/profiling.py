@@ -0,0 +1,146 @@
+# Startup profiling: import time per module and time per startup step.
+#
+#     python -m app.profiling                     # import app.main, build the app, run startup and shutdown
+#     PROFILE_STARTUP=true python -m app.server   # every worker prints its own tables once it is up
+#
+# Modules are timed from the moment the app package is imported, so FastAPI, SQLAlchemy, Redis and
+# our own modules are covered, uvicorn and the standard library it loaded first are not.
+import asyncio
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILE_TOP = int(os.getenv("PROFILE_STARTUP_TOP", "25"))
+
+
+class TimedLoader:
+    # Wraps a module's loader so exec_module (running the module body) is timed; everything else passes through.
+    def __init__(self, loader, timer: "ImportTimer", name: str):
+        self._loader = loader
+        self._timer = timer
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # The real loader is what the module should see from now on.
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timer.enter()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.leave(self._name, time.perf_counter() - started)
+
+
+class ImportTimer:
+    def __init__(self):
+        # module -> (self seconds, cumulative seconds)
+        self.modules: dict[str, tuple[float, float]] = {}
+        self._children: list[float] = []
+        self._finding = False
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    def enter(self):
+        self._children.append(0.0)
+
+    def leave(self, name: str, elapsed: float):
+        nested = self._children.pop()
+        self.modules[name] = (elapsed - nested, elapsed)
+        if self._children:
+            self._children[-1] += elapsed
+
+    def report(self, top: int = PROFILE_TOP) -> list[str]:
+        total = sum(own for own, _ in self.modules.values())
+        packages: dict[str, float] = {}
+        for name, (own, _) in self.modules.items():
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0.0) + own
+        lines = [f"imports: {len(self.modules)} modules, {total * 1000:.1f} ms",
+                 f"{'package':<40} {'self ms':>9}"]
+        lines += [f"{name:<40} {own * 1000:>9.1f}"
+                  for name, own in sorted(packages.items(), key=lambda item: -item[1])[:top]]
+        lines.append(f"{'module':<40} {'self ms':>9} {'total ms':>9}")
+        lines += [f"{name:<40} {own * 1000:>9.1f} {cumulative * 1000:>9.1f}"
+                  for name, (own, cumulative) in sorted(self.modules.items(), key=lambda item: -item[1][1])[:top]]
+        return lines
+
+
+class StartupProfile:
+    def __init__(self):
+        self.steps: list[tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def report(self) -> list[str]:
+        lines = [f"{'startup step':<40} {'ms':>9}"]
+        lines += [f"{name:<40} {elapsed * 1000:>9.1f}" for name, elapsed in self.steps]
+        lines.append(f"{'total':<40} {sum(elapsed for _, elapsed in self.steps) * 1000:>9.1f}")
+        return lines
+
+
+import_timer = ImportTimer()
+
+
+def print_report(profile: StartupProfile):
+    for line in import_timer.report() + profile.report():
+        print(f"[Startup] {line}")
+
+
+async def profile_app():
+    started = time.perf_counter()
+    from app.main import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    print(f"[Startup] import app.main {(imported - started) * 1000:.1f} ms, create_app {(created - imported) * 1000:.1f} ms")
+    # The lifespan prints the per-module and per-step tables once startup is done.
+    async with app.router.lifespan_context(app):
+        pass
+
+
+if __name__ == "__main__":
+    os.environ["PROFILE_STARTUP"] = "true"
+    # This file runs as __main__; the app reports through the importable copy.
+    from app import profiling
+    profiling.import_timer.install()
+    asyncio.run(profiling.profile_app())
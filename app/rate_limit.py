@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import math
+import re
+import time
+
+from redis.exceptions import NoScriptError
+
+from app.auth.utils import ALGORITHM
+from app.local_cache import LocalCache
+from app.metrics import Counter, register
+from app.redis_cache import REDIS_ERRORS, get_redis
+from app.settings import RateLimitSettings, get_settings
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+# /internal/* is limited like any route, so guesses at INTERNAL_TOKEN are throttled too.
+EXEMPT_PREFIXES = ("/metrics", "/docs", "/redoc", "/openapi.json")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# First matching route wins and "*" catches the rest; a tier without its own entry uses "default".
+# A templated route never matches a path the app serves literally: "GET /{short_code}" is the redirect, not GET /links.
+DEFAULT_RULES = {
+    "POST /auth/login": {"default": "10/minute:5"},
+    "POST /auth/register": {"default": "5/minute:5"},
+    "POST /links/shorten": {"anonymous": "10/minute:5", "default": "60/minute:20", "premium": "600/minute:100"},
+    "POST /links/shorten/batch": {"default": "10/minute:5", "premium": "60/minute:20"},
+    "GET /{short_code}": {"default": "50/second:100"},
+    "*": {"anonymous": "20/second:40", "default": "50/second:100"},
+}
+
+# GCRA over a whole lease: grants up to ARGV[3] tokens, or none with the milliseconds until one is free.
+# Redis' own clock keeps every worker on the same timeline.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local available = math.floor((now + tolerance - tat) / interval)
+if available < 1 then
+    return {0, math.ceil(tat + interval - tolerance - now)}
+end
+local granted = math.min(wanted, available)
+tat = tat + granted * interval
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now))
+return {granted, 0}
+"""
+GCRA_SHA = hashlib.sha1(GCRA_SCRIPT.encode()).hexdigest()
+
+throttled_requests = register(Counter("rate_limit_throttled_total", "Requests answered 429 by rule and tier.", ("rule", "tier")))
+
+
+class Limit:
+    __slots__ = ("count", "period", "burst", "interval", "tolerance")
+
+    def __init__(self, count: int, period: float, burst: int | None = None):
+        self.count = count
+        self.period = period
+        self.burst = burst or count
+        # Milliseconds between tokens, and how far ahead of schedule a burst may run.
+        self.interval = period * 1000 / count
+        self.tolerance = self.interval * self.burst
+
+    def __repr__(self):
+        return f"Limit({self.count}/{self.period}s, burst={self.burst})"
+
+
+def parse_limit(spec: str) -> Limit:
+    rate, _, burst = spec.partition(":")
+    count, _, period = rate.partition("/")
+    seconds = PERIODS.get(period)
+    if seconds is None:
+        seconds = float(period)
+    return Limit(int(count), seconds, int(burst) if burst else None)
+
+
+class Rule:
+    __slots__ = ("name", "method", "pattern", "templated", "limits")
+
+    def __init__(self, name: str, limits: dict):
+        self.name = name
+        self.templated = "{" in name
+        if name == "*":
+            self.method, self.pattern = None, None
+        else:
+            self.method, _, path = name.partition(" ")
+            self.pattern = re.compile("^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(path)) + "$")
+        self.limits = {tier: parse_limit(spec) for tier, spec in limits.items()}
+
+    def matches(self, method: str, path: str) -> bool:
+        return self.pattern is None or (self.method == method and self.pattern.match(path) is not None)
+
+    def limit_for(self, tier: str) -> Limit | None:
+        return self.limits.get(tier) or self.limits.get("default")
+
+
+def load_rules(overrides: str = "") -> list[Rule]:
+    custom = json.loads(overrides) if overrides else {}
+    # Routes the defaults don't know are tried first, so the catch-all stays last.
+    rules = {name: limits for name, limits in custom.items() if name not in DEFAULT_RULES}
+    rules.update({name: custom.get(name, limits) for name, limits in DEFAULT_RULES.items()})
+    return [Rule(name, limits) for name, limits in rules.items()]
+
+
+def parse_user_tiers(spec: str = "") -> dict:
+    tiers = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        user_id, _, tier = item.partition(":")
+        tiers[user_id] = tier
+    return tiers
+
+
+class RateLimiter:
+    # Each worker leases tokens from the shared GCRA bucket in Redis and spends them locally,
+    # so most allowed requests never leave the process.
+    def __init__(self, rules: list[Rule], user_tiers: dict, settings: RateLimitSettings | None = None):
+        self.configure(settings or get_settings().rate_limit, rules, user_tiers)
+
+    @classmethod
+    def from_settings(cls, settings: RateLimitSettings) -> "RateLimiter":
+        return cls(load_rules(settings.rules), parse_user_tiers(settings.user_tiers), settings)
+
+    def configure(self, settings: RateLimitSettings, rules: list[Rule] | None = None, user_tiers: dict | None = None):
+        # Also what an app's startup calls with its own settings; leases and counters start over.
+        self.enabled = settings.enabled
+        self.rules = load_rules(settings.rules) if rules is None else rules
+        self.user_tiers = parse_user_tiers(settings.user_tiers) if user_tiers is None else user_tiers
+        self.lease = settings.lease
+        # Without trusted proxies every request behind a load balancer would share its one anonymous bucket;
+        # clients reaching the app from elsewhere can't pick their own bucket with a forged header.
+        self.trust_forwarded = settings.trust_forwarded
+        self.trusted_networks = tuple(ipaddress.ip_network(network) for network in settings.trusted_proxies)
+        # peer address -> whether it is one of our proxies
+        self.trusted_peers: dict[str, bool] = {}
+        # key -> [tokens left]
+        self.leases = LocalCache(settings.max_keys, settings.lease_ttl)
+        # key -> [tat ms] while Redis is unreachable: the same GCRA, per worker.
+        self.fallback = LocalCache(settings.max_keys, 3600)
+        # raw token -> (identity, tier); unverifiable tokens count against the client address.
+        self.identities = LocalCache(settings.max_keys, 300)
+        # key -> lease in flight for a key whose first request was granted without waiting on it.
+        self.refills: dict[str, asyncio.Task] = {}
+        self.local_grants = 0
+        self.early_grants = 0
+        self.redis_calls = 0
+        self.fallback_calls = 0
+        self.throttled = 0
+
+    def is_trusted_proxy(self, address: str) -> bool:
+        if self.trust_forwarded:
+            return True
+        trusted = self.trusted_peers.get(address)
+        if trusted is None:
+            try:
+                ip = ipaddress.ip_address(address)
+            except ValueError:
+                ip = None
+            trusted = ip is not None and any(ip in network for network in self.trusted_networks)
+            if len(self.trusted_peers) >= 4096:
+                self.trusted_peers.clear()
+            self.trusted_peers[address] = trusted
+        return trusted
+
+    def forwarded_client(self, forwarded: str) -> str:
+        # The nearest hop that isn't one of our proxies; anything left of it is the client's to forge.
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self.is_trusted_proxy(hop):
+                return hop
+        return hops[0] if hops else ""
+
+    def match(self, method: str, path: str, literal: bool = False) -> Rule | None:
+        # literal: the app has a route for exactly this path, so templated rules don't apply to it.
+        for rule in self.rules:
+            if rule.matches(method, path) and not (literal and rule.templated):
+                return rule
+        return None
+
+    def identify(self, scope) -> tuple[str, str]:
+        authorization = None
+        forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value
+            elif name == b"x-forwarded-for":
+                forwarded = value
+        if authorization is not None and authorization[:7].lower() == b"bearer ":
+            token = authorization[7:].decode("latin-1")
+            identity = self.identities.get(token)
+            if identity is None:
+                identity = self._verify(token)
+                self.identities.set(token, identity)
+            if identity[0] is not None:
+                return identity
+        client = scope.get("client")
+        address = client[0] if client else "unknown"
+        if forwarded is not None and self.is_trusted_proxy(address):
+            address = self.forwarded_client(forwarded.decode("latin-1")) or address
+        return "ip:" + address, "anonymous"
+
+    def _verify(self, token: str) -> tuple:
+        from jose import JWTError, jwt
+
+        try:
+            sub = jwt.decode(token, get_settings().auth.secret_key, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            return None, "anonymous"
+        if sub is None:
+            return None, "anonymous"
+        return "user:" + str(sub), self.user_tiers.get(str(sub), "user")
+
+    async def check(self, rule: Rule, limit: Limit, identity: str) -> float:
+        # 0 when the request may proceed, otherwise seconds until it would be allowed.
+        key = RATE_LIMIT_PREFIX + rule.name + ":" + identity
+        lease = self.leases.get(key)
+        if lease is not None and lease[0] > 0:
+            lease[0] -= 1
+            self.local_grants += 1
+            return 0.0
+        wanted = max(1, min(self.lease, limit.burst // 4))
+        if lease is None and key not in self.refills:
+            # A key's first request doesn't wait on Redis: this worker's own bucket admits it and the lease
+            # taken in the background pays for it, so no worker ever runs ahead of the limit by itself.
+            granted, retry_ms = self._take_local(key, limit)
+            if granted < 1:
+                return retry_ms / 1000
+            self.early_grants += 1
+            self.refills[key] = asyncio.create_task(self._refill(key, limit, wanted))
+            return 0.0
+        try:
+            granted, retry_ms = await self._take_redis(key, limit, wanted)
+        except REDIS_ERRORS:
+            self.fallback_calls += 1
+            granted, retry_ms = self._take_local(key, limit)
+        if granted < 1:
+            return retry_ms / 1000
+        if granted > 1:
+            self.leases.set(key, [granted - 1])
+        return 0.0
+
+    async def _take_redis(self, key: str, limit: Limit, wanted: int) -> tuple[int, float]:
+        redis = await get_redis()
+        self.redis_calls += 1
+        args = (1, key, limit.interval, limit.tolerance, wanted)
+        try:
+            granted, retry_ms = await redis.evalsha(GCRA_SHA, *args)
+        except NoScriptError:
+            # First use since Redis started: EVAL loads the script for the EVALSHAs after it.
+            granted, retry_ms = await redis.eval(GCRA_SCRIPT, *args)
+        return int(granted), float(retry_ms)
+
+    async def _refill(self, key: str, limit: Limit, wanted: int):
+        try:
+            granted, retry_ms = await self._take_redis(key, limit, wanted)
+        except REDIS_ERRORS:
+            return
+        finally:
+            self.refills.pop(key, None)
+        if granted < 1:
+            # The shared budget is spent: until it refills, this key's requests go to Redis and get their 429.
+            self.leases.set(key, [0], ttl=retry_ms / 1000)
+            return
+        # One of the granted tokens paid for the request already let through.
+        lease = self.leases.get(key)
+        if lease is not None:
+            lease[0] += granted - 1
+        elif granted > 1:
+            self.leases.set(key, [granted - 1])
+
+    def _take_local(self, key: str, limit: Limit) -> tuple[int, float]:
+        # Also where limits fail open to when Redis is down: they loosen by the worker count instead of vanishing.
+        now = time.monotonic() * 1000
+        state = self.fallback.get(key)
+        tat = max(state[0], now) if state is not None else now
+        if tat + limit.interval - limit.tolerance > now:
+            return 0, tat + limit.interval - limit.tolerance - now
+        self.fallback.set(key, [tat + limit.interval], ttl=(tat + limit.interval - now) / 1000 + 1)
+        return 1, 0.0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rules": {rule.name: {tier: repr(limit) for tier, limit in rule.limits.items()} for rule in self.rules},
+            "local_grants": self.local_grants,
+            "early_grants": self.early_grants,
+            "redis_calls": self.redis_calls,
+            "fallback_calls": self.fallback_calls,
+            "throttled": self.throttled,
+            "tracked_keys": len(self.leases),
+        }
+
+
+rate_limiter = RateLimiter.from_settings(get_settings().rate_limit)
+
+
+def literal_routes(routers) -> set:
+    # (method, path) of every route without path parameters in the routers the app includes.
+    routes = set()
+    for router in routers:
+        for route in router.routes:
+            path = getattr(route, "path", "")
+            if "{" not in path:
+                routes.update((method, path) for method in getattr(route, "methods", None) or ())
+    return routes
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = rate_limiter, routers=()):
+        self.app = app
+        self.limiter = limiter
+        self.literal_routes = literal_routes(routers)
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter
+        if scope["type"] != "http" or not limiter.enabled or scope["path"].startswith(EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+        method, path = scope["method"], scope["path"]
+        rule = limiter.match(method, path, (method, path) in self.literal_routes)
+        if rule is not None:
+            identity, tier = limiter.identify(scope)
+            limit = rule.limit_for(tier)
+            if limit is not None:
+                retry_after = await limiter.check(rule, limit, identity)
+                if retry_after > 0:
+                    limiter.throttled += 1
+                    throttled_requests.inc((rule.name, tier))
+                    return await self.reject(send, limit, retry_after)
+        await self.app(scope, receive, send)
+
+    async def reject(self, send, limit: Limit, retry_after: float):
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                (b"ratelimit-policy", f"{limit.burst};w={int(limit.period)}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,15 +1,284 @@
-import os
+import asyncio
+import random
+import time
+from datetime import datetime
 from redis import asyncio as aioredis
-from dotenv import load_dotenv
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisError
 
-load_dotenv()
+from app.metrics import redis_commands
+from app.settings import get_settings
+
+LINK_CACHE_TTL = 3600
+
+REDIS_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+
+
+class RedisUnavailable(RedisError):
+    pass
+
+
+def report_redis_error(what: str, e: Exception):
+    # While the breaker is open every call fails fast; it already logged opening and counts the skipped calls.
+    if not isinstance(e, RedisUnavailable):
+        print(f"{what} failed: {e}")
+
+
+class CircuitBreaker:
+    # closed -> open after `failures` errors in a row -> half-open after `cooldown`, where one probe decides.
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            print("[Redis] circuit closed, Redis is reachable again")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failures:
+            if self.state != "open":
+                # Once per opening, not per call: while open, callers fail fast without printing.
+                self.opened += 1
+                print(f"[Redis] circuit open after {self.consecutive_failures} failures, skipping Redis for {self.cooldown}s")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class AutoPipeline:
+    # Commands queued during one loop iteration share a round trip.
+    def __init__(self, layer: "RedisLayer", max_size: int):
+        self.layer = layer
+        self.max_size = max_size
+        self._pending: list = []
+        self._tasks: set = set()
+        self.batches = 0
+        self.commands = 0
+        self.largest = 0
+
+    def submit(self, name: str, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((name, args, future))
+        if len(self._pending) == 1:
+            asyncio.get_running_loop().call_soon(self._flush)
+        elif len(self._pending) >= self.max_size:
+            self._flush()
+        return future
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._execute(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, batch):
+        self.batches += 1
+        self.commands += len(batch)
+        self.largest = max(self.largest, len(batch))
+        try:
+            if len(batch) == 1:
+                name, args, _ = batch[0]
+                results = [await self.layer._guarded(getattr(self.layer.client, name)(*args), name)]
+            else:
+                pipe = self.layer.client.pipeline(transaction=False)
+                for name, args, _ in batch:
+                    getattr(pipe, name)(*args)
+                results = await self.layer._guarded(pipe.execute(raise_on_error=False), "auto_pipeline")
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self):
+        # Commands queued or in flight when the worker stops still reach Redis.
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "commands": self.commands,
+            "largest": self.largest,
+            "average": self.commands / self.batches if self.batches else 0.0,
+        }
+
+
+class GuardedPipeline:
+    def __init__(self, layer: "RedisLayer", pipe):
+        self._layer = layer
+        self._pipe = pipe
+
+    def __getattr__(self, name):
+        return getattr(self._pipe, name)
+
+    async def execute(self, *args, **kwargs):
+        return await self._layer._guarded(self._pipe.execute(*args, **kwargs), "pipeline")
+
+
+class RedisLayer:
+    # What get_redis() hands out: the pooled client behind the breaker, with GET/PTTL/SETEX/DELETE auto-pipelined.
+    def __init__(self, client):
+        self.client = client
+        settings = get_settings().redis
+        self.breaker = CircuitBreaker(settings.breaker_failures, settings.breaker_cooldown)
+        self.auto_pipeline = AutoPipeline(self, settings.auto_pipeline_max)
+
+    async def _guarded(self, awaitable, command: str):
+        if not self.breaker.allow():
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise RedisUnavailable("circuit open")
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except REDIS_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or misused: says nothing about Redis, but must not leave a half-open probe pending.
+            self.breaker.probing = False
+            raise
+        finally:
+            redis_commands.observe((command,), time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self._guarded(result, name) if asyncio.iscoroutine(result) else result
+
+        return call
+
+    def get(self, key):
+        return self.auto_pipeline.submit("get", key)
+
+    def pttl(self, key):
+        return self.auto_pipeline.submit("pttl", key)
+
+    def setex(self, key, ttl, value):
+        return self.auto_pipeline.submit("setex", key, ttl, value)
+
+    def delete(self, *keys):
+        return self.auto_pipeline.submit("delete", *keys)
+
+    def pipeline(self, transaction: bool = True):
+        return GuardedPipeline(self, self.client.pipeline(transaction=transaction))
+
+    def stats(self) -> dict:
+        pool = self.client.connection_pool
+        return {
+            "breaker": self.breaker.snapshot(),
+            "auto_pipeline": self.auto_pipeline.stats(),
+            "pool": {
+                "max_connections": pool.max_connections,
+                "in_use": len(getattr(pool, "_in_use_connections", ())),
+            },
+        }
+
+
+def make_client(socket_timeout: float | None, max_connections: int):
+    # Retries are left to the breaker; redis-py's own would multiply every timeout during an outage.
+    settings = get_settings()
+    pool = aioredis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=max_connections,
+        timeout=settings.redis.pool_timeout,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=settings.redis.connect_timeout,
+        retry=Retry(NoBackoff(), 0),
+        decode_responses=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
 redis = None
+blocking_redis = None
 
 async def get_redis():
     global redis
     if redis is None:
-        redis = aioredis.from_url(REDIS_URL, decode_responses=True)
-    return redis
\ No newline at end of file
+        settings = get_settings().redis
+        redis = RedisLayer(make_client(settings.socket_timeout, settings.max_connections))
+    return redis
+
+
+async def get_blocking_redis():
+    # Pub/sub and blocking stream reads sit idle on a socket longer than the Redis socket timeout allows.
+    global blocking_redis
+    if blocking_redis is None:
+        blocking_redis = make_client(None, 4)
+    return blocking_redis
+
+
+def redis_stats() -> dict:
+    return redis.stats() if redis is not None else {}
+
+
+async def close_redis():
+    global redis, blocking_redis
+    if redis is not None:
+        await redis.auto_pipeline.drain()
+    clients = [client for client in (redis.client if redis is not None else None, blocking_redis) if client is not None]
+    redis = blocking_redis = None
+    for client in clients:
+        await client.aclose()
+
+
+async def get_with_ttl(redis, key) -> tuple:
+    # (value, seconds the key has left or None if it never expires); both commands share one round trip.
+    value, pttl = await asyncio.gather(redis.get(key), redis.pttl(key))
+    return value, (None if pttl == -1 else max(0, pttl) / 1000)
+
+
+def link_cache_ttl(expires_at: datetime | None) -> int:
+    # Cached copies must not outlive the link; <= 0 means it should not be cached at all.
+    if expires_at is None:
+        return LINK_CACHE_TTL
+    return min(LINK_CACHE_TTL, int((expires_at - datetime.utcnow()).total_seconds()))
+
+
+def jittered_ttl(ttl: int) -> int:
+    # Keys written together (warm-up, batches) would otherwise all expire and miss together.
+    return ttl - int(random.random() * ttl * get_settings().cache.link_ttl_jitter)
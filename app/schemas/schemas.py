@@ -1,6 +1,6 @@
 from pydantic import BaseModel, HttpUrl
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import BaseModel, HttpUrl, field_validator
 from typing import Optional
 from datetime import datetime
@@ -10,6 +10,7 @@ class LinkCreate(BaseModel):
     short_code: Optional[str] = None
     custom_alias: Optional[str] = None
     expires_at: Optional[datetime] = None
+    reuse_existing: Optional[bool] = None
 
     class Config:
         from_attributes = True
@@ -25,6 +26,38 @@ class LinkInfo(BaseModel):
     class Config:
         from_attributes = True
 
+class ClickBucket(BaseModel):
+    bucket: datetime
+    clicks: int
+
+class LinkStats(LinkInfo):
+    # Hourly for the last CLICK_STATS_HOURS hours, daily for the last CLICK_STATS_DAYS days, UTC.
+    hourly: list[ClickBucket] = []
+    daily: list[ClickBucket] = []
+    # Approximate (HyperLogLog, ~0.8% error); None when Redis is unavailable.
+    unique_visitors: Optional[int] = None
+    visitors_from: Optional[date] = None
+    visitors_to: Optional[date] = None
+
+class LinkBatchItemResult(BaseModel):
+    index: int
+    link: Optional[LinkInfo] = None
+    error: Optional[str] = None
+
+class LinkBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: list[LinkBatchItemResult]
+
+class CleanupJobStatus(BaseModel):
+    job_id: str
+    status: str
+    deleted: int
+    chunks: int
+    started_at: float
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
 class LinkUpdate(BaseModel):
     original_url: HttpUrl
     last_click: Optional[datetime] = None
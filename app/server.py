@@ -0,0 +1,39 @@
+import os
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# One process by default: /metrics and /internal/* report in-process counters, so with several workers
+# each scrape would see whichever one answered. Scale by running more containers, each scraped on its own.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# How long SIGTERM waits for in-flight requests before shutdown flushes buffers; keep it under
+# the orchestrator's kill timeout (Docker's default is 10 s).
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "8"))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "5"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+# Recycle workers after this many requests (0 = never), jittered so they don't restart together.
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+ACCESS_LOG = os.getenv("ACCESS_LOG", "false") == "true"
+
+
+def main():
+    uvicorn.run(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        backlog=BACKLOG,
+        limit_max_requests=MAX_REQUESTS or None,
+        limit_max_requests_jitter=MAX_REQUESTS // 10,
+        access_log=ACCESS_LOG,
+    )
+
+
+if __name__ == "__main__":
+    main()
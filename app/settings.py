@@ -0,0 +1,312 @@
+import os
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+# The only place .env is read; app/__init__ imports this module first, so module-level tuning
+# constants elsewhere (CACHE_*, RATE_LIMIT_*, ...) see it too.
+load_dotenv()
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default) == "true"
+
+
+def env_list(name: str) -> tuple[str, ...]:
+    return tuple(item.strip() for item in os.getenv(name, "").split(",") if item.strip())
+
+
+def env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+def env_int(name: str, default: str) -> int:
+    return int(os.getenv(name, default))
+
+
+@dataclass(frozen=True)
+class AuthSettings:
+    secret_key: str = "supersecretkey"
+    # sha256(token) -> Principal cache; entries never outlive the token itself.
+    cache_max_size: int = 10000
+    cache_ttl: float = 300
+    revocation_enabled: bool = True
+
+    @classmethod
+    def from_env(cls) -> "AuthSettings":
+        return cls(
+            secret_key=os.getenv("SECRET_KEY", "supersecretkey"),
+            cache_max_size=env_int("AUTH_CACHE_MAX_SIZE", "10000"),
+            cache_ttl=env_float("AUTH_CACHE_TTL", "300"),
+            revocation_enabled=env_flag("AUTH_REVOCATION_ENABLED", "true"),
+        )
+
+
+@dataclass(frozen=True)
+class RedisSettings:
+    max_connections: int = 50
+    # How long a command waits for a free pooled connection before failing.
+    pool_timeout: float = 0.5
+    socket_timeout: float = 0.5
+    connect_timeout: float = 0.5
+    # Consecutive failures that open the breaker, and how long it then skips Redis.
+    breaker_failures: int = 5
+    breaker_cooldown: float = 10
+    # GET/PTTL/SETEX/DELETE issued in the same event-loop tick go out as one pipeline of at most this many commands.
+    auto_pipeline_max: int = 128
+
+    @classmethod
+    def from_env(cls) -> "RedisSettings":
+        return cls(
+            max_connections=env_int("REDIS_MAX_CONNECTIONS", "50"),
+            pool_timeout=env_float("REDIS_POOL_TIMEOUT", "0.5"),
+            socket_timeout=env_float("REDIS_SOCKET_TIMEOUT", "0.5"),
+            connect_timeout=env_float("REDIS_CONNECT_TIMEOUT", "0.5"),
+            breaker_failures=env_int("REDIS_BREAKER_FAILURES", "5"),
+            breaker_cooldown=env_float("REDIS_BREAKER_COOLDOWN", "10"),
+            auto_pipeline_max=env_int("REDIS_AUTO_PIPELINE_MAX", "128"),
+        )
+
+
+@dataclass(frozen=True)
+class CacheSettings:
+    local_max_size: int = 10000
+    local_ttl: float = 30
+    local_negative_ttl: float = 5
+    # Redirects keep serving an expired entry this long while one task reloads it.
+    local_stale_ttl: float = 30
+    xfetch_beta: float = 1.0
+    # Redis link TTLs are shortened by a random fraction up to this, so keys filled together don't expire together.
+    link_ttl_jitter: float = 0.1
+    stampede_lock_timeout: float = 2
+    # How long a worker that lost the fill lock waits for the winner's Redis write before loading itself.
+    stampede_wait: float = 0.2
+
+    @classmethod
+    def from_env(cls) -> "CacheSettings":
+        return cls(
+            local_max_size=env_int("LOCAL_CACHE_MAX_SIZE", "10000"),
+            local_ttl=env_float("LOCAL_CACHE_TTL", "30"),
+            local_negative_ttl=env_float("LOCAL_CACHE_NEGATIVE_TTL", "5"),
+            local_stale_ttl=env_float("LOCAL_CACHE_STALE_TTL", "30"),
+            xfetch_beta=env_float("LOCAL_CACHE_XFETCH_BETA", "1.0"),
+            link_ttl_jitter=env_float("LINK_CACHE_TTL_JITTER", "0.1"),
+            stampede_lock_timeout=env_float("STAMPEDE_LOCK_TIMEOUT", "2"),
+            stampede_wait=env_float("STAMPEDE_WAIT", "0.2"),
+        )
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    enabled: bool = True
+    # JSON {"METHOD /path/{param}": {"tier": "count/period[:burst]"}} merged over DEFAULT_RULES, route by route.
+    rules: str = ""
+    # "user_id:tier,..." for accounts on something other than the "user" tier.
+    user_tiers: str = ""
+    # Tokens a worker takes from the shared Redis budget per round trip; the rest are spent locally.
+    lease: int = 10
+    # Unspent leased tokens are dropped after this long, so an idle worker can't sit on another's budget.
+    lease_ttl: float = 1
+    max_keys: int = 100000
+    # Peers whose X-Forwarded-For names the client: the private ranges a load balancer or nginx sits in.
+    trusted_proxies: tuple[str, ...] = ("127.0.0.0/8", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "::1/128", "fc00::/7")
+    # Trust X-Forwarded-For from any peer: only when a proxy that overwrites it is the sole way in.
+    trust_forwarded: bool = False
+
+    @classmethod
+    def from_env(cls) -> "RateLimitSettings":
+        proxies = env_list("RATE_LIMIT_TRUSTED_PROXIES")
+        return cls(
+            enabled=env_flag("RATE_LIMIT_ENABLED", "true"),
+            rules=os.getenv("RATE_LIMIT_RULES", ""),
+            user_tiers=os.getenv("RATE_LIMIT_USER_TIERS", ""),
+            lease=env_int("RATE_LIMIT_LEASE", "10"),
+            lease_ttl=env_float("RATE_LIMIT_LEASE_TTL", "1"),
+            max_keys=env_int("RATE_LIMIT_MAX_KEYS", "100000"),
+            trusted_proxies=proxies if "RATE_LIMIT_TRUSTED_PROXIES" in os.environ else cls.trusted_proxies,
+            trust_forwarded=env_flag("RATE_LIMIT_TRUST_FORWARDED"),
+        )
+
+
+@dataclass(frozen=True)
+class ClickSettings:
+    # Each redirect's click is sent to Redis (HINCRBY) on the next loop iteration; while Redis is unreachable clicks
+    # stay in process memory and are retried every spill_interval. Everything in Redis is counted exactly once.
+    spill_interval: float = 1
+    flush_interval: float = 10
+    flush_batch_size: int = 5000
+    # How long applied batch ids are kept; a batch left in FLUSHING_KEY is retried well within this.
+    flush_marker_retention: int = 86400
+    # Per-click events: worker ring buffer -> Redis stream -> clicks/click_rollups.
+    events_enabled: bool = True
+    event_buffer_size: int = 100000
+    event_ship_interval: float = 1
+    event_batch_size: int = 1000
+    event_stream: str = "clicks:events"
+    event_stream_maxlen: int = 1000000
+    # Entries a dead consumer read but never acknowledged are taken over after this long.
+    event_claim_idle_ms: int = 60000
+    country_header: str = "cf-ipcountry"
+    retention_days: int = 90
+    partition_days_ahead: int = 3
+    maintenance_interval: float = 3600
+    stats_hours: int = 48
+    stats_days: int = 30
+    visitor_hll_retention_days: int = 400
+    # Empty: the auth secret key.
+    visitor_salt: str = ""
+
+    @classmethod
+    def from_env(cls) -> "ClickSettings":
+        return cls(
+            spill_interval=env_float("CLICK_SPILL_INTERVAL", "1"),
+            flush_interval=env_float("CLICK_FLUSH_INTERVAL", "10"),
+            flush_batch_size=env_int("CLICK_FLUSH_BATCH_SIZE", "5000"),
+            flush_marker_retention=env_int("CLICK_FLUSH_MARKER_RETENTION", "86400"),
+            events_enabled=env_flag("CLICK_EVENTS_ENABLED", "true"),
+            event_buffer_size=env_int("CLICK_EVENT_BUFFER_SIZE", "100000"),
+            event_ship_interval=env_float("CLICK_EVENT_SHIP_INTERVAL", "1"),
+            event_batch_size=env_int("CLICK_EVENT_BATCH_SIZE", "1000"),
+            event_stream=os.getenv("CLICK_EVENT_STREAM", "clicks:events"),
+            event_stream_maxlen=env_int("CLICK_EVENT_STREAM_MAXLEN", "1000000"),
+            event_claim_idle_ms=env_int("CLICK_EVENT_CLAIM_IDLE_MS", "60000"),
+            country_header=os.getenv("CLICK_COUNTRY_HEADER", "cf-ipcountry"),
+            retention_days=env_int("CLICK_RETENTION_DAYS", "90"),
+            partition_days_ahead=env_int("CLICK_PARTITION_DAYS_AHEAD", "3"),
+            maintenance_interval=env_float("CLICK_MAINTENANCE_INTERVAL", "3600"),
+            stats_hours=env_int("CLICK_STATS_HOURS", "48"),
+            stats_days=env_int("CLICK_STATS_DAYS", "30"),
+            visitor_hll_retention_days=env_int("VISITOR_HLL_RETENTION_DAYS", "400"),
+            visitor_salt=os.getenv("VISITOR_SALT", ""),
+        )
+
+
+@dataclass(frozen=True)
+class BloomSettings:
+    enabled: bool = True
+    capacity: int = 1000000
+    error_rate: float = 0.001
+    # Deleted codes can't be removed from a Bloom filter; a periodic rebuild drops them.
+    rebuild_interval: float = 3600
+    # Rebuilds triggered by resets or epoch bumps are spaced at least this far apart; the guard stays off meanwhile.
+    rebuild_min_interval: float = 30
+    # How often workers read the announcement epoch; bounds how long a lost announcement can cause a wrong 404.
+    epoch_poll_interval: float = 1
+
+    @classmethod
+    def from_env(cls) -> "BloomSettings":
+        return cls(
+            enabled=env_flag("BLOOM_ENABLED", "true"),
+            capacity=env_int("BLOOM_CAPACITY", "1000000"),
+            error_rate=env_float("BLOOM_ERROR_RATE", "0.001"),
+            rebuild_interval=env_float("BLOOM_REBUILD_INTERVAL", "3600"),
+            rebuild_min_interval=env_float("BLOOM_REBUILD_MIN_INTERVAL", "30"),
+            epoch_poll_interval=env_float("BLOOM_EPOCH_POLL_INTERVAL", "1"),
+        )
+
+
+@dataclass(frozen=True)
+class Settings:
+    # What create_app() and its lifespan need: connections, startup, and the knobs of the hot paths, read
+    # through get_settings() when used. Background-job tuning (cleanup, expiry reaper, warm-up, replicas,
+    # short code allocation, password hashing, server) is still module-level constants read at import.
+    title: str = "URL Shortener"
+    database_url: str | None = None
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 10
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    # SQLAlchemy's compiled-statement cache and asyncpg's per-connection prepared statement cache.
+    db_query_cache_size: int = 500
+    db_statement_cache_size: int = 256
+    # Optional dedicated pool for redirect lookups so write traffic can't exhaust it.
+    db_redirect_pool: bool = False
+    database_redirect_url: str | None = None
+    db_redirect_pool_size: int = 10
+    db_redirect_max_overflow: int = 10
+    # Read replicas for redirect misses, stats, expired and search.
+    database_replica_urls: tuple[str, ...] = ()
+    db_replica_pool_size: int = 10
+    db_replica_max_overflow: int = 10
+    redis_url: str = "redis://localhost:6379"
+    init_db_on_startup: bool = False
+    migrate_on_startup: bool = False
+    alembic_config: str = "alembic.ini"
+    # Print how long each startup step took once the worker is up.
+    profile_startup: bool = False
+    auth: AuthSettings = field(default_factory=AuthSettings)
+    redis: RedisSettings = field(default_factory=RedisSettings)
+    cache: CacheSettings = field(default_factory=CacheSettings)
+    rate_limit: RateLimitSettings = field(default_factory=RateLimitSettings)
+    clicks: ClickSettings = field(default_factory=ClickSettings)
+    bloom: BloomSettings = field(default_factory=BloomSettings)
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        database_url = os.getenv("DATABASE_URL")
+        return cls(
+            database_url=database_url,
+            db_echo=env_flag("DB_ECHO"),
+            db_pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            db_pool_pre_ping=env_flag("DB_POOL_PRE_PING", "true"),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            db_query_cache_size=int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+            db_statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256")),
+            db_redirect_pool=env_flag("DB_REDIRECT_POOL"),
+            database_redirect_url=os.getenv("DATABASE_REDIRECT_URL") or database_url,
+            db_redirect_pool_size=int(os.getenv("DB_REDIRECT_POOL_SIZE", "10")),
+            db_redirect_max_overflow=int(os.getenv("DB_REDIRECT_MAX_OVERFLOW", "10")),
+            database_replica_urls=env_list("DATABASE_REPLICA_URLS"),
+            db_replica_pool_size=int(os.getenv("DB_REPLICA_POOL_SIZE", "10")),
+            db_replica_max_overflow=int(os.getenv("DB_REPLICA_MAX_OVERFLOW", "10")),
+            redis_url=os.getenv("REDIS_URL", "redis://localhost:6379"),
+            init_db_on_startup=env_flag("INIT_DB_ON_STARTUP"),
+            migrate_on_startup=env_flag("MIGRATE_ON_STARTUP"),
+            alembic_config=os.getenv("ALEMBIC_CONFIG", "alembic.ini"),
+            profile_startup=env_flag("PROFILE_STARTUP"),
+            auth=AuthSettings.from_env(),
+            redis=RedisSettings.from_env(),
+            cache=CacheSettings.from_env(),
+            rate_limit=RateLimitSettings.from_env(),
+            clicks=ClickSettings.from_env(),
+            bloom=BloomSettings.from_env(),
+        )
+
+
+current_settings: Settings | None = None
+# Apps whose lifespan is running on current_settings; while there are any, no other settings may replace them.
+settings_users = 0
+
+
+def get_settings() -> Settings:
+    global current_settings
+    if current_settings is None:
+        current_settings = Settings.from_env()
+    return current_settings
+
+
+def configure_settings(settings: Settings) -> Settings:
+    # The engines, the Redis pool and every cache are process-wide, so a process serves one Settings at a time:
+    # a second app with other settings would run on the first one's connections.
+    global current_settings
+    if settings_users and settings != current_settings:
+        raise RuntimeError("A running app already uses different settings; run one app per process")
+    current_settings = settings
+    return settings
+
+
+def acquire_settings(settings: Settings) -> Settings:
+    # An app's lifespan makes its settings the ones lazily built clients (engines, Redis) read until it stops.
+    global settings_users
+    configure_settings(settings)
+    settings_users += 1
+    return settings
+
+
+def release_settings():
+    global settings_users
+    settings_users = max(0, settings_users - 1)
@@ -0,0 +1,76 @@
+import asyncio
+
+from app.redis_cache import get_with_ttl, report_redis_error
+from app.settings import get_settings
+
+STAMPEDE_POLL_INTERVAL = 0.02
+FILL_LOCK_PREFIX = "links:fill-lock:"
+
+
+class SingleFlight:
+    # Concurrent loads of one key within a worker share a single task.
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def start(self, key: str, factory) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        self.started += 1
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    async def do(self, key: str, factory):
+        # Shielded so a disconnecting client doesn't cancel the load for everyone waiting on it.
+        return await asyncio.shield(self.start(key, factory))
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
+
+
+# Redirect cache misses, keyed by short code.
+link_loads = SingleFlight()
+
+
+async def acquire_fill_lock(redis, key: str):
+    # The held lock, False when another worker is already filling the key, None when Redis can't lock.
+    try:
+        lock = redis.lock(f"{FILL_LOCK_PREFIX}{key}", timeout=get_settings().cache.stampede_lock_timeout, blocking=False)
+        return lock if await lock.acquire() else False
+    except Exception as e:
+        report_redis_error("[Redis] fill lock", e)
+        return None
+
+
+async def release_fill_lock(lock):
+    try:
+        await lock.release()
+    except Exception as e:
+        report_redis_error("[Redis] fill unlock", e)
+
+
+async def wait_for_fill(redis, key: str) -> tuple:
+    # (value, seconds left on the key) once another worker has filled it, (None, None) on timeout or error.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + get_settings().cache.stampede_wait
+    while loop.time() < deadline:
+        await asyncio.sleep(STAMPEDE_POLL_INTERVAL)
+        try:
+            value, ttl = await get_with_ttl(redis, key)
+        except Exception as e:
+            report_redis_error("[Redis] GET", e)
+            return None, None
+        if value:
+            return value, ttl
+    return None, None
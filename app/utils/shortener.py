@@ -1,6 +1,243 @@
+import asyncio
+import hashlib
+import os
 import string
-import random
+from abc import ABC, abstractmethod
 
-def generate_short_code(length: int = 6) -> str:
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choices(characters, k=length))
\ No newline at end of file
+from fastapi import HTTPException
+from redis.exceptions import NoScriptError
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models.models import CodeCounter, Link, short_code_seq
+from app.redis_cache import get_redis, report_redis_error
+
+SHORT_CODE_LENGTH = int(os.getenv("SHORT_CODE_LENGTH", "6"))
+SHORT_CODE_STRATEGY = os.getenv("SHORT_CODE_STRATEGY", "sequence")
+SHORT_CODE_ENCODING = os.getenv("SHORT_CODE_ENCODING", "feistel")
+SHORT_CODE_SECRET = os.getenv("SHORT_CODE_SECRET", os.getenv("SECRET_KEY", "supersecretkey"))
+SHORT_CODE_BLOCK_SIZE = int(os.getenv("SHORT_CODE_BLOCK_SIZE", "1000"))
+SHORT_CODE_COUNTER_KEY = "short_code:counter"
+# A counter lost to a flush or failover restarts from ARGV[2], the highest id the database knows was issued.
+SEEDED_INCRBY_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[2])
+end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+SEEDED_INCRBY_SHA = hashlib.sha1(SEEDED_INCRBY_SCRIPT.encode()).hexdigest()
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+_INDEX = {char: i for i, char in enumerate(ALPHABET)}
+
+
+def encode_base62(number: int, length: int) -> str:
+    chars = []
+    while number:
+        number, rem = divmod(number, BASE)
+        chars.append(ALPHABET[rem])
+    return "".join(reversed(chars)).rjust(length, ALPHABET[0])
+
+
+def decode_base62(code: str) -> int:
+    number = 0
+    for char in code:
+        number = number * BASE + _INDEX[char]
+    return number
+
+
+class FeistelPermutation:
+    # Balanced Feistel network over [0, 2**bits), narrowed to [0, domain) by cycle walking.
+    def __init__(self, domain: int, secret: str, rounds: int = 4):
+        self.domain = domain
+        bits = max(2, (domain - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.round_keys = [
+            hashlib.blake2b(f"{secret}:{i}".encode(), digest_size=16).digest() for i in range(rounds)
+        ]
+
+    def _round(self, value: int, key: bytes) -> int:
+        digest = hashlib.blake2b(value.to_bytes(8, "big"), key=key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") & self.half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for key in self.round_keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half_bits) | right
+
+    def _decrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for key in reversed(self.round_keys):
+            left, right = right ^ self._round(left, key), left
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        value = self._encrypt(value)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+    def invert(self, value: int) -> int:
+        value = self._decrypt(value)
+        while value >= self.domain:
+            value = self._decrypt(value)
+        return value
+
+
+class Base62Codec:
+    def __init__(self, length: int):
+        self.length = length
+        self.capacity = BASE ** length
+
+    def encode(self, number: int) -> str:
+        if not 0 <= number < self.capacity:
+            raise HTTPException(status_code=500, detail="Short code space exhausted")
+        return encode_base62(number, self.length)
+
+    def decode(self, code: str) -> int:
+        return decode_base62(code)
+
+
+class FeistelCodec(Base62Codec):
+    def __init__(self, length: int, secret: str):
+        super().__init__(length)
+        self.permutation = FeistelPermutation(self.capacity, secret)
+
+    def encode(self, number: int) -> str:
+        if not 0 <= number < self.capacity:
+            raise HTTPException(status_code=500, detail="Short code space exhausted")
+        return encode_base62(self.permutation.permute(number), self.length)
+
+    def decode(self, code: str) -> int:
+        return self.permutation.invert(decode_base62(code))
+
+
+class BlockIdSource(ABC):
+    # Hands out ids from locally held blocks, leasing a new block only when the current one runs out.
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._next = 1
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    @abstractmethod
+    async def lease(self, db, size: int) -> int:
+        # Reserves `size` ids and returns the last one.
+        ...
+
+    async def next_ids(self, db, count: int) -> list[int]:
+        ids = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next > self._end:
+                    size = max(self.block_size, count - len(ids))
+                    end = await self.lease(db, size)
+                    self._next, self._end = end - size + 1, end
+                take = min(count - len(ids), self._end - self._next + 1)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+
+def upsert_counter(conn, name: str, value: int, set_value):
+    dialect_insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    return dialect_insert(CodeCounter.__table__).values(name=name, value=value).on_conflict_do_update(
+        index_elements=["name"], set_={"value": set_value}
+    )
+
+
+class RedisBlockIdSource(BlockIdSource):
+    # Every leased block's end is also kept in code_counters, so the Redis counter can be re-seeded above it.
+    high_water_name = "redis-high-water"
+
+    async def lease(self, db, size: int) -> int:
+        engine = (await db.connection()).engine
+        seed = await self.high_water(engine)
+        try:
+            redis = await get_redis()
+            args = (1, SHORT_CODE_COUNTER_KEY, size, seed)
+            try:
+                end = int(await redis.evalsha(SEEDED_INCRBY_SHA, *args))
+            except NoScriptError:
+                end = int(await redis.eval(SEEDED_INCRBY_SCRIPT, *args))
+        except Exception as e:
+            report_redis_error("[Redis] INCRBY short code block", e)
+            raise HTTPException(status_code=503, detail="Short code allocation unavailable")
+        async with engine.begin() as conn:
+            value = CodeCounter.__table__.c.value
+            await conn.execute(upsert_counter(conn, self.high_water_name, end, case((value < end, end), else_=value)))
+        return end
+
+    async def high_water(self, engine) -> int:
+        # links.id only covers links created before the mark existed: a floor, not a guarantee.
+        async with engine.connect() as conn:
+            mark = await conn.scalar(select(CodeCounter.value).where(CodeCounter.name == self.high_water_name))
+            last_link = await conn.scalar(select(func.max(Link.id)))
+        return max(mark or 0, last_link or 0)
+
+
+class TableBlockIdSource(BlockIdSource):
+    name = "links"
+
+    async def lease(self, db, size: int) -> int:
+        # Leased in its own transaction so a rolled back insert never hands the same ids out twice.
+        # An upsert, so workers leasing the very first block at once don't both try to create the row.
+        value = CodeCounter.__table__.c.value
+        engine = (await db.connection()).engine
+        async with engine.begin() as conn:
+            return await conn.scalar(upsert_counter(conn, self.name, size, value + size).returning(value))
+
+
+class SequenceIdSource:
+    def __init__(self, block_size: int):
+        self.fallback = TableBlockIdSource(block_size)
+
+    async def next_ids(self, db, count: int) -> list[int]:
+        conn = await db.connection()
+        if not conn.dialect.supports_sequences:
+            return await self.fallback.next_ids(db, count)
+        stmt = select(short_code_seq.next_value())
+        if count > 1:
+            stmt = stmt.select_from(func.generate_series(1, count))
+        return list((await conn.execute(stmt)).scalars())
+
+
+class ShortCodeAllocator:
+    def __init__(self, source, codec):
+        self.source = source
+        self.codec = codec
+
+    async def allocate(self, db) -> str:
+        return (await self.allocate_many(db, 1))[0]
+
+    async def allocate_many(self, db, count: int) -> list[str]:
+        if count <= 0:
+            return []
+        return [self.codec.encode(i) for i in await self.source.next_ids(db, count)]
+
+    def decode(self, code: str) -> int:
+        return self.codec.decode(code)
+
+
+SOURCES = {"sequence": SequenceIdSource, "redis": RedisBlockIdSource}
+
+_allocator = None
+
+
+def build_allocator(strategy: str = SHORT_CODE_STRATEGY, encoding: str = SHORT_CODE_ENCODING,
+                    length: int = SHORT_CODE_LENGTH, secret: str = SHORT_CODE_SECRET,
+                    block_size: int = SHORT_CODE_BLOCK_SIZE) -> ShortCodeAllocator:
+    if strategy not in SOURCES:
+        raise ValueError(f"Unknown short code strategy: {strategy}")
+    codec = FeistelCodec(length, secret) if encoding == "feistel" else Base62Codec(length)
+    return ShortCodeAllocator(SOURCES[strategy](block_size), codec)
+
+
+def get_allocator() -> ShortCodeAllocator:
+    global _allocator
+    if _allocator is None:
+        _allocator = build_allocator()
+    return _allocator
@@ -0,0 +1,31 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    # Same spelling HttpUrl produces: lower-case scheme and host, no default port, "/" for an empty path.
+    url = str(url).strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        # Unparseable (e.g. "http://[abc" or a bad port): left as is, so it can only match itself.
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username + (f":{parts.password}" if parts.password is not None else "")
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, parts.fragment))
+
+
+def url_hash(url: str) -> int:
+    # First 8 bytes of SHA-256 as a signed BIGINT.
+    digest = hashlib.sha256(normalize_url(url).encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
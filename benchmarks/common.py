@@ -0,0 +1,158 @@
+"""Shared pieces for the in-process benchmarks: an in-memory Redis, ASGI calls and a seeded corpus."""
+import bisect
+import importlib
+import itertools
+import random
+import statistics
+
+from app import db
+from app.db import Base
+from app.models.models import Link
+
+
+class MemoryLock:
+    async def acquire(self):
+        return True
+
+    async def release(self):
+        pass
+
+
+class MemoryPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error=True):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class MemoryRedis:
+    # Enough of the redis-py surface for the request paths; TTLs are accepted and ignored.
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def pttl(self, key):
+        return -1 if key in self.data else -2
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def unlink(self, *keys):
+        return await self.delete(*keys)
+
+    async def exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    async def hincrby(self, key, field, amount):
+        values = self.data.setdefault(key, {})
+        values[field] = int(values.get(field, 0)) + amount
+        return values[field]
+
+    async def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+        return 1
+
+    async def incrby(self, key, amount):
+        self.data[key] = int(self.data.get(key, 0)) + amount
+        return self.data[key]
+
+    async def evalsha(self, sha, numkeys, *keys_and_args):
+        # Only the rate limiter runs scripts here: grant the whole lease it asks for.
+        return [int(keys_and_args[-1]), 0]
+
+    async def publish(self, channel, message):
+        return 0
+
+    def lock(self, name, timeout=None, blocking=True):
+        return MemoryLock()
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+
+REDIS_MODULES = ("app.api.main", "app.crud", "app.auth.utils", "app.utils.shortener", "app.local_cache", "app.click_events",
+                 "app.click_counter", "app.rate_limit")
+
+
+def use_memory_redis(redis: MemoryRedis | None = None) -> MemoryRedis:
+    redis = redis or MemoryRedis()
+
+    async def get_redis():
+        return redis
+
+    for name in REDIS_MODULES:
+        importlib.import_module(name).get_redis = get_redis
+    return redis
+
+
+async def call(asgi_app, path: str, method: str = "GET", headers=(), body: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), *headers], "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await asgi_app(scope, receive, send)
+    return status
+
+
+async def seed(count: int) -> list[str]:
+    async with db.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(Link.__table__.insert(), [
+            {"original_url": f"https://bench.example.com/{i}", "short_code": f"b{i:06d}", "click_count": 0}
+            for i in range(count)
+        ])
+    return [f"b{i:06d}" for i in range(count)]
+
+
+class ZipfSampler:
+    # Rank r is picked with probability proportional to 1 / r**s, like real link popularity.
+    def __init__(self, items: list, s: float = 1.1, seed: int | None = None):
+        self.items = items
+        self.cum_weights = list(itertools.accumulate(1 / (rank ** s) for rank in range(1, len(items) + 1)))
+        self.random = random.Random(seed)
+
+    def __call__(self):
+        point = self.random.random() * self.cum_weights[-1]
+        return self.items[min(bisect.bisect(self.cum_weights, point), len(self.items) - 1)]
+
+
+def summarize(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        "rounds": len(timings),
+        "min_us": timings[0] * 1e6,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[max(0, int(len(timings) * 0.99) - 1)] * 1e6,
+    }
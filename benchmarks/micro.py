@@ -0,0 +1,171 @@
+"""Micro-benchmarks for the hot paths, checked against a p99 baseline.
+
+    python -m benchmarks.micro                  # run and print
+    python -m benchmarks.micro --save           # record benchmarks/baseline.json
+    python -m benchmarks.micro --check          # exit 1 if any p99 regressed beyond --tolerance
+
+Everything runs in-process against SQLite and an in-memory Redis, like
+benchmarks.redirect. Redirect traffic picks codes from a Zipf distribution over
+the seeded corpus, so the local cache sees the skew production traffic has.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+
+from app.auth.utils import create_access_token, get_current_user, principal_cache  # noqa: E402
+from app.click_counter import click_counter  # noqa: E402
+from app.click_events import click_events  # noqa: E402
+from app.crud import create_link, generate_unique_code  # noqa: E402
+from app.db import AsyncSessionLocal, dispose_engines, init_engines  # noqa: E402
+from app.local_cache import link_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.models import User  # noqa: E402
+from app.rate_limit import rate_limiter  # noqa: E402
+from app.schemas.schemas import LinkCreate  # noqa: E402
+from benchmarks.common import ZipfSampler, call, seed, summarize, use_memory_redis  # noqa: E402
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+async def run_case(body, rounds: int, warmup: int, before=None) -> dict:
+    timings = []
+    for i in range(warmup + rounds):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        await body()
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+    return summarize(timings)
+
+
+async def run_all(links: int, rounds: int, zipf_s: float) -> dict:
+    init_engines().echo = False
+    codes = await seed(links)
+    redis = use_memory_redis()
+    redis.data = {code: f"https://bench.example.com/{code}" for code in codes}
+    pick = ZipfSampler(codes, s=zipf_s, seed=42)
+    warmup = max(10, rounds // 10)
+    results = {}
+    # The request cases measure the handlers; the limiter gets its own case below.
+    rate_limiter.enabled = False
+
+    async def redirect():
+        assert await call(app, f"/{pick()}") == 307
+
+    async def redirect_hot():
+        assert await call(app, f"/{codes[0]}") == 307
+
+    link_cache.clear()
+    results["redirect_zipf"] = await run_case(redirect, rounds, warmup)
+    results["redirect_local_hit"] = await run_case(redirect_hot, rounds, warmup)
+    results["redirect_redis_hit"] = await run_case(redirect, rounds, warmup, before=link_cache.clear)
+
+    def cold():
+        link_cache.clear()
+        redis.data.clear()
+
+    results["redirect_db"] = await run_case(redirect, rounds, warmup, before=cold)
+
+    async with AsyncSessionLocal() as db:
+        user = User(email="bench@example.com", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        principal = SimpleNamespace(id=user.id)
+        token = create_access_token({"sub": str(user.id)})
+        counter = iter(range(10 ** 9))
+
+        async def create():
+            await create_link(db, LinkCreate(original_url=f"https://bench.example.com/new/{next(counter)}"), principal)
+
+        async def allocate():
+            await generate_unique_code(db)
+
+        async def authenticate():
+            await get_current_user(token, db)
+
+        results["create_link"] = await run_case(create, rounds, warmup)
+        results["generate_unique_code"] = await run_case(allocate, rounds, warmup)
+        results["get_current_user_cached"] = await run_case(authenticate, rounds, warmup)
+        results["get_current_user_uncached"] = await run_case(authenticate, rounds, warmup, before=principal_cache.clear)
+
+    rule = rate_limiter.match("GET", f"/{codes[0]}")
+    limit = rule.limit_for("anonymous")
+    addresses = iter(range(10 ** 9))
+
+    async def rate_limit_hot_key():
+        assert await rate_limiter.check(rule, limit, "ip:bench") == 0
+
+    async def rate_limit_new_key():
+        assert await rate_limiter.check(rule, limit, f"ip:{next(addresses)}") == 0
+
+    # A hot key takes a Redis lease once every RATE_LIMIT_LEASE calls; a new key is admitted locally and leases in the background.
+    results["rate_limit_hot_key"] = await run_case(rate_limit_hot_key, rounds, warmup)
+    results["rate_limit_new_key"] = await run_case(rate_limit_new_key, rounds, warmup)
+
+    click_counter.drain()
+    click_events.clear()
+    await dispose_engines()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, reference in baseline["results"].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        limit = reference["p99_us"] * (1 + tolerance)
+        if current["p99_us"] > limit:
+            regressions.append(f"{name}: p99 {current['p99_us']:.1f}us > {limit:.1f}us "
+                               f"(baseline {reference['p99_us']:.1f}us + {tolerance:.0%})")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--output", type=Path, help="write this run's results as JSON")
+    parser.add_argument("--save", action="store_true", help=f"record this run as {BASELINE_PATH.name}")
+    parser.add_argument("--check", action="store_true", help="fail on p99 regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    results = await run_all(args.links, args.rounds, args.zipf_s)
+    print(f"{'benchmark':<28} {'min us':>9} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+    for name, stats in results.items():
+        print(f"{name:<28} {stats['min_us']:>9.1f} {stats['mean_us']:>9.1f} {stats['p50_us']:>9.1f} {stats['p99_us']:>9.1f}")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "links": args.links,
+        "rounds": args.rounds,
+        "zipf_s": args.zipf_s,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.save:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2) + "\n")
+    if args.check:
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
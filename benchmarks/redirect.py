@@ -0,0 +1,109 @@
+"""Compare the redirect fast path with the previous Depends(get_db) + ORM handler.
+
+    python -m benchmarks.redirect --links 2000 --requests 20000
+
+Requests are driven straight through the ASGI interface against SQLite and an
+in-memory Redis stand-in, so the numbers reflect handler cost rather than the
+network stack.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+
+from fastapi import Depends, FastAPI, HTTPException  # noqa: E402
+from fastapi.responses import RedirectResponse  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.future import select  # noqa: E402
+
+from app.api import main as api  # noqa: E402
+from app.click_counter import click_counter  # noqa: E402
+from app.db import dispose_engines, get_db, init_engines  # noqa: E402
+from app.local_cache import link_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.models import Link  # noqa: E402
+from app.rate_limit import rate_limiter  # noqa: E402
+from benchmarks.common import MemoryRedis, call, seed, use_memory_redis  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+
+legacy_app = FastAPI()
+
+
+@legacy_app.get("/{short_code}")
+async def legacy_redirect_link(short_code: str, db: AsyncSession = Depends(get_db)):
+    cached = link_cache.get(short_code)
+    if isinstance(cached, int):
+        raise HTTPException(status_code=cached, detail=api.NEGATIVE_DETAILS[cached])
+    if cached:
+        click_counter.record(short_code)
+        return RedirectResponse(cached)
+    redis = await api.get_redis()
+    cached_url = await redis.get(short_code)
+    if cached_url:
+        link_cache.set(short_code, cached_url)
+        click_counter.record(short_code)
+        return RedirectResponse(cached_url)
+    result = await db.execute(select(Link).where(Link.short_code == short_code))
+    link = result.scalar_one_or_none()
+    if not link:
+        raise HTTPException(status_code=404, detail=api.NEGATIVE_DETAILS[404])
+    if link.expires_at and link.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail=api.NEGATIVE_DETAILS[410])
+    click_counter.record(short_code)
+    await redis.setex(short_code, 3600, link.original_url)
+    link_cache.set(short_code, link.original_url)
+    return RedirectResponse(link.original_url)
+
+
+async def measure(asgi_app, codes: list[str], requests: int, scenario: str) -> dict:
+    redis = use_memory_redis(MemoryRedis())
+    # Every benchmark request comes from one address; the limiter would throttle it.
+    rate_limiter.enabled = False
+    link_cache.clear()
+    if scenario == "redis":
+        redis.data = {code: f"https://bench.example.com/{code}" for code in codes}
+    for code in codes:
+        await call(asgi_app, f"/{code}")
+    timings = []
+    started = time.perf_counter()
+    for i in range(requests):
+        if scenario != "local":
+            link_cache.clear()
+        if scenario == "db":
+            redis.data.clear()
+        t0 = time.perf_counter()
+        status = await call(asgi_app, f"/{codes[i % len(codes)]}")
+        timings.append(time.perf_counter() - t0)
+        assert status == 307, status
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    click_counter.drain()
+    return {
+        "rps": requests / elapsed,
+        "p50_us": statistics.median(timings) * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99) - 1] * 1e6,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    init_engines().echo = False
+    codes = await seed(args.links)
+    print(f"{'scenario':<8} {'handler':<8} {'req/s':>10} {'p50 us':>10} {'p99 us':>10}")
+    for scenario in ("local", "redis", "db"):
+        for name, asgi_app in (("legacy", legacy_app), ("fast", app)):
+            result = await measure(asgi_app, codes, args.requests, scenario)
+            print(f"{scenario:<8} {name:<8} {result['rps']:>10.0f} {result['p50_us']:>10.1f} {result['p99_us']:>10.1f}")
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""CPU per list response: ORM objects through Pydantic versus Core rows through orjson.
+
+    python -m benchmarks.serialization --items 10000 --repeat 20
+
+"legacy" is what the list endpoints did before: select(Link), then FastAPI
+validating list[LinkInfo] from attributes and dumping it to JSON bytes. "rows" is
+the current path: link_rows() and row_to_dict() into FastJSONResponse. The ndjson
+lines compare the export serializer the same way. Times are process CPU time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy.future import select  # noqa: E402
+
+from app.api.responses import FastJSONResponse  # noqa: E402
+from app.crud.listing import EXPORT_COLUMNS, export_value, link_rows, row_to_dict, serialize_ndjson  # noqa: E402
+from app.db import AsyncSessionLocal, dispose_engines, init_engines  # noqa: E402
+from app.models.models import Link  # noqa: E402
+from app.schemas.schemas import LinkInfo  # noqa: E402
+from benchmarks.common import seed  # noqa: E402
+
+link_list = TypeAdapter(list[LinkInfo])
+
+
+def legacy_ndjson(links) -> str:
+    return "".join(
+        json.dumps({name: export_value(getattr(link, name)) for name in EXPORT_COLUMNS}) + "\n" for link in links
+    )
+
+
+async def cpu(body, repeat: int) -> tuple[float, float]:
+    # (fetch ms, serialize ms) per response, averaged over `repeat` runs.
+    fetch = serialize = 0.0
+    for _ in range(repeat):
+        async with AsyncSessionLocal() as db:
+            started = time.process_time()
+            items = await body.fetch(db)
+            fetched = time.process_time()
+            body.serialize(items)
+            serialize += time.process_time() - fetched
+            fetch += fetched - started
+    return fetch / repeat * 1000, serialize / repeat * 1000
+
+
+class Legacy:
+    def __init__(self, items: int):
+        self.stmt = select(Link).limit(items)
+
+    async def fetch(self, db):
+        return list((await db.execute(self.stmt)).scalars())
+
+    def serialize(self, links):
+        return link_list.dump_json(link_list.validate_python(links, from_attributes=True))
+
+
+class Rows:
+    def __init__(self, items: int):
+        self.stmt = link_rows().limit(items)
+
+    async def fetch(self, db):
+        return (await db.execute(self.stmt)).all()
+
+    def serialize(self, rows):
+        return FastJSONResponse([row_to_dict(row) for row in rows]).body
+
+
+class LegacyExport(Legacy):
+    def serialize(self, links):
+        return legacy_ndjson(links)
+
+
+class RowsExport(Rows):
+    def serialize(self, rows):
+        return serialize_ndjson(rows)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    init_engines().echo = False
+    await seed(args.items)
+    print(f"CPU per {args.items}-item response")
+    print(f"{'body':<8} {'path':<8} {'fetch ms':>10} {'serialize ms':>13} {'total ms':>10}")
+    for body, cases in (("json", (("legacy", Legacy), ("rows", Rows))),
+                        ("ndjson", (("legacy", LegacyExport), ("rows", RowsExport)))):
+        for name, case in cases:
+            fetch, serialize = await cpu(case(args.items), args.repeat)
+            print(f"{body:<8} {name:<8} {fetch:>10.1f} {serialize:>13.1f} {fetch + serialize:>10.1f}")
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
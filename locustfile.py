@@ -1,37 +1,115 @@
-from locust import HttpUser, task, between
+import bisect
+import itertools
+import os
 import random
 import string
 
+import requests
+from locust import HttpUser, task, between, constant_throughput, events
+from locust.runners import MasterRunner
+
 BASE_EMAIL = "loadtest@example.com"
 PASSWORD = "password123"
 
+# Redirects are ~99% of production traffic and follow a Zipf-like popularity curve.
+CORPUS_SIZE = int(os.getenv("LOCUST_CORPUS_SIZE", "10000"))
+ZIPF_S = float(os.getenv("LOCUST_ZIPF_S", "1.1"))
+# Per-user request rate, so total throughput is users x this.
+REDIRECT_USER_RPS = float(os.getenv("LOCUST_REDIRECT_USER_RPS", "20"))
+# The run exits non-zero when redirects miss these targets.
+REDIRECT_P99_MS = float(os.getenv("LOCUST_REDIRECT_P99_MS", "50"))
+MAX_FAILURE_RATIO = float(os.getenv("LOCUST_MAX_FAILURE_RATIO", "0.01"))
+REDIRECT_NAME = "/{short_code}"
+
+corpus: list[str] = []
+cum_weights: list[float] = []
+
+
+def random_string(length=6):
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+def register_and_login(post) -> dict:
+    email = f"{random_string(10)}_{BASE_EMAIL}"
+    post("/auth/register", json={"email": email, "password": PASSWORD})
+    login_resp = post("/auth/login", data={"username": email, "password": PASSWORD})
+    token = login_resp.json().get("access_token")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def zipf_code() -> str:
+    point = random.random() * cum_weights[-1]
+    return corpus[min(bisect.bisect(cum_weights, point), len(corpus) - 1)]
+
+
+@events.test_start.add_listener
+def seed_corpus(environment, **kwargs):
+    # Every load-generating process seeds its own corpus through the batch endpoint before users start.
+    if isinstance(environment.runner, MasterRunner):
+        return
+    session = requests.Session()
+    session.headers.update(register_and_login(lambda path, **kwargs: session.post(f"{environment.host}{path}", **kwargs)))
+    codes = []
+    while len(codes) < CORPUS_SIZE:
+        batch = [{"original_url": f"https://zipf.example.com/{len(codes) + i}/{random_string()}"}
+                 for i in range(min(1000, CORPUS_SIZE - len(codes)))]
+        resp = session.post(f"{environment.host}/links/shorten/batch", json=batch)
+        resp.raise_for_status()
+        codes.extend(item["link"]["short_code"] for item in resp.json()["results"] if item["link"])
+    random.shuffle(codes)
+    corpus[:] = codes
+    cum_weights[:] = itertools.accumulate(1 / (rank ** ZIPF_S) for rank in range(1, len(codes) + 1))
+
+
+@events.quitting.add_listener
+def enforce_targets(environment, **kwargs):
+    stats = environment.stats.get(REDIRECT_NAME, "GET")
+    if not stats.num_requests:
+        return
+    p99 = stats.get_response_time_percentile(0.99)
+    if p99 > REDIRECT_P99_MS or stats.fail_ratio > MAX_FAILURE_RATIO:
+        print(f"Redirect targets missed: p99 {p99:.0f} ms (target {REDIRECT_P99_MS:.0f}), "
+              f"failures {stats.fail_ratio:.2%} (max {MAX_FAILURE_RATIO:.2%})")
+        environment.process_exit_code = 1
+
+
+class RedirectUser(HttpUser):
+    weight = 19
+    wait_time = constant_throughput(REDIRECT_USER_RPS)
+
+    @task
+    def redirect(self):
+        with self.client.get(f"/{zipf_code()}", name=REDIRECT_NAME, allow_redirects=False, catch_response=True) as resp:
+            if resp.status_code != 307:
+                resp.failure(f"expected 307, got {resp.status_code}")
+
+
 class ShortenerUser(HttpUser):
+    # Mixed profile: account holders creating links and reading their stats alongside some redirects.
+    weight = 1
     wait_time = between(1, 2)
 
     def on_start(self):
-        self.register_and_login()
-
-    def register_and_login(self):
-        email = f"{random.randint(1000, 9999)}_{BASE_EMAIL}"
-        self.client.post("/auth/register", json={
-            "email": email,
-            "password": PASSWORD
-        })
-        login_resp = self.client.post("/auth/login", data={
-            "username": email,
-            "password": PASSWORD
-        })
-        token = login_resp.json().get("access_token")
-        self.headers = {"Authorization": f"Bearer {token}"}
+        self.headers = register_and_login(self.client.post)
+        self.own_codes = []
 
     @task(3)
     def create_link(self):
-        url = f"https://example.com/{self.random_string()}"
-        self.client.post("/links/shorten", json={"original_url": url}, headers=self.headers)
+        url = f"https://example.com/{random_string()}"
+        resp = self.client.post("/links/shorten", json={"original_url": url}, headers=self.headers)
+        if resp.ok:
+            self.own_codes.append(resp.json()["short_code"])
+
+    @task(3)
+    def redirect(self):
+        self.client.get(f"/{zipf_code()}", name=REDIRECT_NAME, allow_redirects=False)
+
+    @task(2)
+    def stats(self):
+        if self.own_codes:
+            self.client.get(f"/links/{random.choice(self.own_codes)}/stats", name="/links/{short_code}/stats",
+                            headers=self.headers)
 
     @task(1)
     def get_expired(self):
         self.client.get("/links/expired", headers=self.headers)
-
-    def random_string(self, length=6):
-        return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
\ No newline at end of file
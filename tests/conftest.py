@@ -1,3 +1,4 @@
+import dataclasses
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
@@ -5,7 +6,14 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.db import Base, get_db
+from app.db import Base, get_db, configure_engines
+from app.db.metrics import instrument_engine
+from app.local_cache import link_cache
+from app.click_counter import click_counter
+from app.click_events import click_events
+from app.auth.utils import principal_cache
+from app.rate_limit import rate_limiter
+import app.settings as settings_module
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 engine_test = create_async_engine(TEST_DATABASE_URL, echo=False)
@@ -16,6 +24,12 @@ async def override_get_db():
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+# The redirect fast path opens its own sessions instead of going through get_db.
+# Engines are normally built in the app's lifespan, which ASGITransport doesn't run.
+instrument_engine(engine_test, "primary")
+configure_engines(engine_test)
+# The suite registers and logs in from one client address far faster than any real user would.
+rate_limiter.enabled = False
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def prepare_database():
@@ -26,12 +40,56 @@ async def prepare_database():
     async with engine_test.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
 
+@pytest.fixture(autouse=True)
+def clear_link_cache():
+    link_cache.clear()
+    principal_cache.clear()
+    click_counter.drain()
+    click_events.clear()
+    yield
+    link_cache.clear()
+    principal_cache.clear()
+    click_counter.drain()
+    click_events.clear()
+
 @pytest_asyncio.fixture
 async def async_client():
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://testserver") as client:
         yield client
 
+@pytest.fixture
+def auth_headers(async_client):
+    # Registers (if needed) and logs in `email`, returning its bearer headers.
+    async def make(email):
+        await async_client.post("/auth/register", json={"email": email, "password": "secure123"})
+        login = await async_client.post("/auth/login", data={"username": email, "password": "secure123"})
+        return {"Authorization": f"Bearer {login.json()['access_token']}"}
+    return make
+
+@pytest.fixture
+def internal_headers(monkeypatch):
+    monkeypatch.setattr("app.api.internal.INTERNAL_TOKEN", "test-internal-token")
+    return {"Authorization": "Bearer test-internal-token"}
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    # override_settings(auth={"secret_key": ...}) swaps fields of the process' settings for one test.
+    def override(**sections):
+        settings = settings_module.get_settings()
+        changes = {name: dataclasses.replace(getattr(settings, name), **fields) for name, fields in sections.items()}
+        monkeypatch.setattr(settings_module, "current_settings", dataclasses.replace(settings, **changes))
+    return override
+
+@pytest.fixture
+def create_links(async_client):
+    # Creates `count` links to https://<prefix>.com/<i> in one batch and returns their short codes.
+    async def make(headers, prefix, count):
+        items = [{"original_url": f"https://{prefix}.com/{i}"} for i in range(count)]
+        resp = await async_client.post("/links/shorten/batch", json=items, headers=headers)
+        return [r["link"]["short_code"] for r in resp.json()["results"]]
+    return make
+
 @pytest_asyncio.fixture
 async def async_session():
     async with TestSessionLocal() as session:
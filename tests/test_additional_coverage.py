@@ -22,9 +22,9 @@ def test_verify_password():
     assert not verify_password("wrongpass", hashed)
 
 @pytest.mark.asyncio
-async def test_get_current_user_invalid_payload(monkeypatch):
+async def test_get_current_user_invalid_payload(monkeypatch, override_settings):
     token = jwt.encode({}, "testsecret", algorithm="HS256")
-    monkeypatch.setattr("app.auth.utils.SECRET_KEY", "testsecret")
+    override_settings(auth={"secret_key": "testsecret"})
     monkeypatch.setattr("app.auth.utils.ALGORITHM", "HS256")
 
     class FakeDB:
@@ -93,6 +93,7 @@ async def test_redirect_with_redis_failure(monkeypatch, async_client):
 
     class FakeRedis:
         async def get(self, key): raise Exception("Redis GET fail")
+        async def pttl(self, key): raise Exception("Redis PTTL fail")
         async def setex(self, *args, **kwargs): raise Exception("Redis SET fail")
     monkeypatch.setattr("app.api.main.get_redis", lambda: FakeRedis())
 
@@ -101,23 +102,24 @@ async def test_redirect_with_redis_failure(monkeypatch, async_client):
     assert resp.headers["location"].startswith("https://redis-fail.com")
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("existing_in_db, expected_exception, expected_msg", [(True, HTTPException, None), (False, Exception, "Failed to generate unique short code"),])
-async def test_generate_unique_code_collision(monkeypatch, async_session: AsyncSession, existing_in_db, expected_exception, expected_msg):
-    monkeypatch.setattr("app.crud.generate_short_code", lambda length=6: "fixedcode")
-    if not existing_in_db:
-        link = Link(original_url="https://existing.com", short_code="fixedcode", user_id=1)
-        async_session.add(link)
-        await async_session.commit()
-    class DummyDB:
-        async def execute(self, stmt):
-            class DummyResult:
-                def scalar_one_or_none(self): return True
-            return DummyResult()
-    db = DummyDB() if existing_in_db else async_session
-    with pytest.raises(expected_exception) as exc:
-        await generate_unique_code(db, length=6)
-    if expected_msg:
-        assert expected_msg in str(exc.value)
+async def test_create_link_skips_colliding_generated_code(monkeypatch, async_session: AsyncSession):
+    link = Link(original_url="https://existing.com", short_code="fixedcode", user_id=1)
+    async_session.add(link)
+    await async_session.commit()
+    codes = iter(["fixedcode", "freshcode"])
+
+    async def fake_generate_unique_code(db):
+        return next(codes)
+
+    monkeypatch.setattr("app.crud.generate_unique_code", fake_generate_unique_code)
+    result = await create_link(async_session, LinkCreate(original_url="https://collide.com"), SimpleNamespace(id=1))
+    assert result.short_code == "freshcode"
+
+
+@pytest.mark.asyncio
+async def test_generate_unique_code_is_unique(async_session: AsyncSession):
+    codes = {await generate_unique_code(async_session) for _ in range(20)}
+    assert len(codes) == 20
 
 
 @pytest.mark.asyncio
@@ -234,7 +236,7 @@ async def test_search_by_original_url_success(async_client):
 
     resp = await async_client.get("/links/search", params={"original_url": url}, headers=headers)
     assert resp.status_code == 200
-    assert resp.json()["original_url"].rstrip("/") == url.rstrip("/")
+    assert resp.json()[0]["original_url"].rstrip("/") == url.rstrip("/")
 
 
 @pytest.mark.asyncio
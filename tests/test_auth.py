@@ -113,4 +113,91 @@ async def test_login_invalid_credentials(async_client):
         "password": "wrongpass"
     })
     assert resp.status_code == 401
-    assert resp.json()["detail"] == "Incorrect email or pwd"
\ No newline at end of file
+    assert resp.json()["detail"] == "Incorrect email or pwd"
+
+class _Row:
+    id = 7
+    email = "cached@example.com"
+
+
+class _CountingDB:
+    def __init__(self):
+        self.calls = 0
+
+    async def execute(self, *args, **kwargs):
+        self.calls += 1
+
+        class Result:
+            def first(self): return _Row()
+        return Result()
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_caches_principal():
+    from app.auth.utils import create_access_token, get_current_user, Principal
+
+    token = create_access_token(data={"sub": "7"})
+    db = _CountingDB()
+    first = await get_current_user(token=token, db=db)
+    second = await get_current_user(token=token, db=db)
+    assert first == second == Principal(id=7, email="cached@example.com")
+    assert db.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_principal_cache_capped_at_token_expiry(monkeypatch):
+    from datetime import timedelta
+    from app.auth.utils import create_access_token, get_current_user, principal_cache, token_key
+
+    now = [1000.0]
+    monkeypatch.setattr("app.local_cache.time.monotonic", lambda: now[0])
+    token = create_access_token(data={"sub": "7"}, expires_delta=timedelta(seconds=30))
+    await get_current_user(token=token, db=_CountingDB())
+    now[0] += 29
+    assert principal_cache.get(token_key(token)) is not None
+    now[0] += 2
+    assert principal_cache.get(token_key(token)) is None
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_rejected_without_db(monkeypatch):
+    from fastapi import HTTPException
+    from app.auth.utils import create_access_token, get_current_user, revoke_token, revoke_user, principal_cache
+
+    class FakeRedis:
+        def __init__(self): self.keys = set()
+        def pipeline(self, transaction=True): return self
+        def set(self, key, value, ex=None): self.keys.add(key)
+        def publish(self, channel, message): pass
+        async def execute(self): pass
+        async def exists(self, *keys): return sum(key in self.keys for key in keys)
+
+    redis = FakeRedis()
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr("app.auth.utils.get_redis", fake_get_redis)
+    token = create_access_token(data={"sub": "7"})
+    db = _CountingDB()
+    await get_current_user(token=token, db=db)
+    await revoke_token(token)
+    with pytest.raises(HTTPException):
+        await get_current_user(token=token, db=db)
+    assert db.calls == 1
+
+    other = create_access_token(data={"sub": "7", "n": 2})
+    await get_current_user(token=other, db=db)
+    await revoke_user(7)
+    assert len(principal_cache) == 0
+    with pytest.raises(HTTPException):
+        await get_current_user(token=other, db=db)
+
+
+@pytest.mark.asyncio
+async def test_logout_endpoint(async_client):
+    await async_client.post("/auth/register", json={"email": "logout@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "logout@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    resp = await async_client.post("/auth/logout", headers=headers)
+    assert resp.status_code == 204
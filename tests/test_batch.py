@@ -0,0 +1,77 @@
+import json
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_batch_create_json_array(async_client, auth_headers):
+    headers = await auth_headers("batch@example.com")
+    items = [{"original_url": f"https://batch.com/{i}"} for i in range(5)]
+    resp = await async_client.post("/links/shorten/batch", json=items, headers=headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["created"] == 5
+    assert data["failed"] == 0
+    assert [r["index"] for r in data["results"]] == list(range(5))
+    codes = {r["link"]["short_code"] for r in data["results"]}
+    assert len(codes) == 5
+
+    first = data["results"][0]["link"]
+    redirect = await async_client.get(f"/{first['short_code']}", follow_redirects=False)
+    assert redirect.status_code == 307
+    assert redirect.headers["location"] == "https://batch.com/0"
+
+
+@pytest.mark.asyncio
+async def test_batch_create_ndjson_stream(async_client, auth_headers):
+    headers = await auth_headers("batchndjson@example.com")
+    body = "\n".join(json.dumps({"original_url": f"https://ndjson.com/{i}"}) for i in range(3)) + "\n"
+    resp = await async_client.post(
+        "/links/shorten/batch",
+        content=body,
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["created"] == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_per_item_errors(async_client, auth_headers):
+    headers = await auth_headers("batcherrors@example.com")
+    await async_client.post("/links/shorten", json={"original_url": "https://taken.com", "custom_alias": "batchtaken"}, headers=headers)
+    items = [
+        {"original_url": "https://ok.com"},
+        {"original_url": "https://dup.com", "custom_alias": "batchtaken"},
+        {"original_url": "not-a-url"},
+        {"original_url": "https://alias.com", "custom_alias": "batchfresh"},
+        {"original_url": "https://alias2.com", "custom_alias": "batchfresh"},
+    ]
+    resp = await async_client.post("/links/shorten/batch", json=items, headers=headers)
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert results[0]["link"] is not None
+    assert results[1]["error"] == "Custom alias already taken"
+    assert results[2]["error"].startswith("original_url")
+    assert results[3]["link"]["short_code"] == "batchfresh"
+    assert results[4]["error"] == "Duplicate custom alias in batch"
+    assert resp.json()["created"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_limits(async_client, monkeypatch, auth_headers):
+    headers = await auth_headers("batchlimit@example.com")
+    monkeypatch.setattr("app.api.main.BATCH_MAX_ITEMS", 2)
+    items = [{"original_url": f"https://limit.com/{i}"} for i in range(3)]
+    resp = await async_client.post("/links/shorten/batch", json=items, headers=headers)
+    assert resp.status_code == 413
+
+    resp = await async_client.post("/links/shorten/batch", content="{bad", headers={**headers, "Content-Type": "application/json"})
+    assert resp.status_code == 400
+
+    resp = await async_client.post("/links/shorten/batch", json={"original_url": "https://x.com"}, headers=headers)
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_batch_requires_auth(async_client):
+    resp = await async_client.post("/links/shorten/batch", json=[{"original_url": "https://noauth.com"}])
+    assert resp.status_code == 401
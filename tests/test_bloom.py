@@ -0,0 +1,88 @@
+import pytest
+from redis.exceptions import ConnectionError
+
+from app import local_cache
+from app.bloom import BloomFilter, ShortCodeGuard, link_guard, read_epoch
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"in-{i}")
+    assert all(f"in-{i}" in bloom for i in range(10000))
+    false_positives = sum(f"out-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+    assert bloom.stats()["estimated_error_rate"] < 0.02
+
+
+@pytest.mark.asyncio
+async def test_guard_needs_filter_and_listener(async_session, monkeypatch):
+    guard = ShortCodeGuard(1000, 0.01)
+    assert not guard.definitely_absent("nope")
+
+    await guard.rebuild(async_session)
+    monkeypatch.setattr(local_cache, "listener_connected", False)
+    assert not guard.definitely_absent("nope")
+    monkeypatch.setattr(local_cache, "listener_connected", True)
+    assert guard.definitely_absent("nope")
+
+    guard.add("nope")
+    assert not guard.definitely_absent("nope")
+    guard.invalidate()
+    assert not guard.active
+    assert guard.rebuild_requested.is_set()
+
+
+@pytest.mark.asyncio
+async def test_redirect_rejects_unknown_code_without_database(async_client, async_session, monkeypatch):
+    await async_client.post("/auth/register", json={"email": "bloom@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "bloom@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    monkeypatch.setattr(link_guard, "filter", None)
+    await link_guard.rebuild(async_session)
+    monkeypatch.setattr(local_cache, "listener_connected", True)
+    # Created after the rebuild: the filter learns it from create_link itself.
+    code = (await async_client.post("/links/shorten", json={"original_url": "https://bloom.com"}, headers=headers)).json()["short_code"]
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("guarded miss reached the database")
+
+    monkeypatch.setattr("app.api.main.RedirectSessionLocal", no_database)
+    rejected = link_guard.rejected
+    resp = await async_client.get("/definitely-missing-code", follow_redirects=False)
+    assert resp.status_code == 404
+    assert link_guard.rejected == rejected + 1
+    assert local_cache.link_cache.get("definitely-missing-code") is None
+
+    monkeypatch.undo()
+    monkeypatch.setattr(local_cache, "listener_connected", True)
+    resp = await async_client.get(f"/{code}", follow_redirects=False)
+    assert resp.status_code == 307
+
+
+@pytest.mark.asyncio
+async def test_lost_announcement_turns_other_workers_guards_off(async_client, async_session, monkeypatch, auth_headers):
+    headers = await auth_headers("bloom-lost@example.com")
+    monkeypatch.setattr(local_cache, "listener_connected", True)
+    # Another worker's guard, built before the link exists and only ever told about creates over pub/sub.
+    peer = ShortCodeGuard(1000, 0.01)
+    await peer.rebuild(async_session)
+    epoch = peer.epoch
+
+    async def redis_down():
+        raise ConnectionError("publish timed out")
+
+    monkeypatch.setattr("app.crud.get_redis", redis_down)
+    monkeypatch.setattr("app.bloom.get_redis", redis_down)
+    code = (await async_client.post("/links/shorten", json={"original_url": "https://bloom-lost.com"}, headers=headers)).json()["short_code"]
+    assert peer.definitely_absent(code)
+
+    await async_session.rollback()
+    assert await read_epoch(async_session) == epoch + 1
+    await peer.check_epoch(async_session)
+    assert not peer.active
+    assert not peer.definitely_absent(code)
+    await peer.rebuild(async_session)
+    assert peer.active and peer.epoch == epoch + 1
+    assert not peer.definitely_absent(code)
@@ -0,0 +1,101 @@
+import pytest
+from datetime import datetime, timedelta
+
+import app.cache_warmup as cache_warmup
+from app.cache_warmup import WarmupState, run_cache_warmup, warm_local, warm_redis
+from app.local_cache import link_cache
+from app.models.models import Link
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.executes = 0
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = {}
+
+    def set(self, key, value, ex=None):
+        self.queued[key] = (value, ex)
+
+    async def execute(self):
+        self.redis.data.update(self.queued)
+        self.redis.executes += 1
+
+
+@pytest.mark.asyncio
+async def test_warm_caches_loads_hottest_links_in_chunks(async_session, monkeypatch):
+    now = datetime.utcnow()
+    edge = datetime(2100, 1, 1)
+    async_session.add_all([
+        Link(short_code=f"warm{i}", original_url=f"https://warm.com/{i}", click_count=i, last_click=now)
+        for i in range(5)
+    ] + [
+        Link(short_code="warmstale", original_url="https://warm.com/stale", click_count=100, last_click=now - timedelta(days=30)),
+        Link(short_code="warmgone", original_url="https://warm.com/gone", click_count=100, last_click=now,
+             expires_at=now - timedelta(minutes=1)),
+        # Expires between the query and the write: not cached, and not counted as loaded.
+        Link(short_code="warmedge", original_url="https://warm.com/edge", click_count=50, last_click=now, expires_at=edge),
+    ])
+    await async_session.commit()
+
+    fake = FakeRedis()
+
+    async def fake_get_redis():
+        return fake
+
+    monkeypatch.setattr("app.cache_warmup.get_redis", fake_get_redis)
+    monkeypatch.setattr("app.cache_warmup.link_cache_ttl", lambda expires_at: 0 if expires_at == edge else 3600)
+    state = WarmupState()
+    assert await warm_redis(async_session, state, limit=5, chunk_size=2) == 4
+    assert state.total == 5
+
+    assert set(fake.data) == {"warm4", "warm3", "warm2", "warm1"}
+    assert fake.executes == 3
+    url, ttl = fake.data["warm4"]
+    assert url == "https://warm.com/4" and 3240 <= ttl <= 3600
+
+    monkeypatch.setattr(link_cache, "max_size", 3)
+    assert await warm_local(async_session, limit=5, chunk_size=2) == 2
+    assert link_cache.get("warm4") == "https://warm.com/4"
+    assert link_cache.get("warm3") == "https://warm.com/3"
+    assert link_cache.get("warmedge") is None
+    assert link_cache.get("warm2") is None
+
+
+@pytest.mark.asyncio
+async def test_followers_fill_their_own_local_cache(async_session, monkeypatch):
+    async_session.add(Link(short_code="warmfollow", original_url="https://warm.com/follow", click_count=10**6,
+                           last_click=datetime.utcnow()))
+    await async_session.commit()
+
+    async def another_worker_led(name, job):
+        return False
+
+    state = WarmupState()
+    monkeypatch.setattr(cache_warmup, "run_once", another_worker_led)
+    monkeypatch.setattr(cache_warmup, "warmup_state", state)
+    monkeypatch.setattr(cache_warmup, "CACHE_WARMUP_LOCAL", True)
+    await run_cache_warmup()
+    assert state.finished and state.error is None
+    assert link_cache.get("warmfollow") == "https://warm.com/follow"
+
+
+@pytest.mark.asyncio
+async def test_readiness_waits_for_warmup(async_client, monkeypatch):
+    state = WarmupState()
+    monkeypatch.setattr("app.api.internal.warmup_state", state)
+    state.total, state.loaded = 10, 5
+    # Probes don't carry INTERNAL_TOKEN, and it is unset by default.
+    resp = await async_client.get("/internal/ready")
+    assert resp.status_code == 503
+    assert resp.json()["percent"] == 50.0
+
+    state.loaded = 9
+    assert (await async_client.get("/internal/ready")).status_code == 200
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_cleanup_deletes_only_own_links_inline(async_client, auth_headers, create_links):
+    headers = await auth_headers("cleanup-inline@example.com")
+    other = await auth_headers("cleanup-other@example.com")
+    codes = await create_links(headers, "cleanup-inline", 3)
+    kept = await create_links(other, "cleanup-other", 1)
+
+    resp = await async_client.delete("/links/cleanup", params={"days": 1}, headers=headers)
+    assert resp.status_code == 204
+
+    for code in codes:
+        assert (await async_client.get(f"/{code}", follow_redirects=False)).status_code == 404
+    assert (await async_client.get(f"/{kept[0]}", follow_redirects=False)).status_code == 307
+
+
+@pytest.mark.asyncio
+async def test_cleanup_continues_as_background_job(async_client, monkeypatch, auth_headers, create_links):
+    monkeypatch.setattr("app.crud.cleanup.CLEANUP_CHUNK_SIZE", 2)
+    monkeypatch.setattr("app.crud.cleanup.CLEANUP_INLINE_CHUNKS", 1)
+    headers = await auth_headers("cleanup-job@example.com")
+    codes = await create_links(headers, "cleanup-job", 5)
+
+    resp = await async_client.delete("/links/cleanup", params={"days": 1}, headers=headers)
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["status"] == "running"
+    assert job["deleted"] == 2
+    assert resp.headers["location"] == f"/links/cleanup/{job['job_id']}"
+
+    for _ in range(100):
+        status = (await async_client.get(resp.headers["location"], headers=headers)).json()
+        if status["status"] != "running":
+            break
+        await asyncio.sleep(0.01)
+    assert status["status"] == "done"
+    assert status["deleted"] == 5
+    assert status["chunks"] == 3
+    for code in codes:
+        assert (await async_client.get(f"/{code}", follow_redirects=False)).status_code == 404
+
+    other = await auth_headers("cleanup-job-other@example.com")
+    assert (await async_client.get(resp.headers["location"], headers=other)).status_code == 404
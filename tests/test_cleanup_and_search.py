@@ -35,7 +35,7 @@ async def test_search_and_expired_and_cleanup(async_client):
 
     search_resp = await async_client.get("/links/search", params={"original_url": created_url}, headers=headers)
     assert search_resp.status_code == 200
-    assert search_resp.json()["original_url"] == created_url
+    assert search_resp.json()[0]["original_url"] == created_url
 
 
 @pytest.mark.asyncio
@@ -58,7 +58,7 @@ async def test_search_success(async_client):
 
     search = await async_client.get("/links/search", params={"original_url": created_url}, headers=headers)
     assert search.status_code == 200
-    assert search.json()["original_url"] == created_url
+    assert search.json()[0]["original_url"] == created_url
 
 
 @pytest.mark.asyncio
@@ -86,4 +86,54 @@ async def test_search_without_auth(async_client):
     resp = await async_client.get("/links/search", params={
         "original_url": "https://noauth.com"
     })
-    assert resp.status_code == 401
\ No newline at end of file
+    assert resp.status_code == 401
+
+@pytest.mark.asyncio
+async def test_search_returns_every_match_paginated(async_client):
+    await async_client.post("/auth/register", json={"email": "searchmany@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "searchmany@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    for _ in range(3):
+        await async_client.post("/links/shorten", json={"original_url": "https://twice.com/page"}, headers=headers)
+
+    first = await async_client.get("/links/search", params={"original_url": "HTTPS://Twice.com:443/page", "limit": 2}, headers=headers)
+    assert first.status_code == 200
+    assert len(first.json()) == 2
+    rest = await async_client.get(
+        "/links/search",
+        params={"original_url": "https://twice.com/page", "cursor": first.headers["x-next-cursor"]},
+        headers=headers,
+    )
+    codes = {link["short_code"] for link in first.json() + rest.json()}
+    assert len(codes) == 3
+
+
+@pytest.mark.asyncio
+async def test_create_reuses_existing_link_when_asked(async_client):
+    await async_client.post("/auth/register", json={"email": "reuse@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "reuse@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    first = await async_client.post("/links/shorten", json={"original_url": "https://reuse.com"}, headers=headers)
+    again = await async_client.post(
+        "/links/shorten", json={"original_url": "https://REUSE.com/", "reuse_existing": True}, headers=headers
+    )
+    fresh = await async_client.post("/links/shorten", json={"original_url": "https://reuse.com"}, headers=headers)
+    assert again.json()["short_code"] == first.json()["short_code"]
+    assert fresh.json()["short_code"] != first.json()["short_code"]
+
+    batch = await async_client.post(
+        "/links/shorten/batch",
+        json=[{"original_url": "https://reuse.com", "reuse_existing": True}, {"original_url": "https://reuse-new.com", "reuse_existing": True}],
+        headers=headers,
+    )
+    results = batch.json()["results"]
+    assert results[0]["link"]["short_code"] == first.json()["short_code"]
+    assert results[1]["link"]["original_url"] == "https://reuse-new.com/"
+
+
+@pytest.mark.asyncio
+async def test_search_with_unparseable_url_is_not_found(async_client, auth_headers):
+    headers = await auth_headers("search-malformed@example.com")
+    response = await async_client.get("/links/search", params={"original_url": "http://[abc"}, headers=headers)
+    assert response.status_code == 404
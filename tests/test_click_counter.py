@@ -0,0 +1,209 @@
+import asyncio
+import pytest
+from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app.click_counter import (
+    ClickCounter,
+    FLUSHING_KEY,
+    PENDING_KEY,
+    apply_deltas,
+    build_click_update,
+    click_counter,
+    count_click,
+    flush_clicks,
+    flush_redis_to_db,
+    spill_tasks,
+    spill_to_redis,
+)
+from app.models.models import Link
+
+
+class FakeLock:
+    async def acquire(self): return True
+    async def release(self): pass
+
+
+class FakeRedis:
+    def __init__(self, hashes=None):
+        self.hashes = hashes or {}
+
+    def lock(self, *args, **kwargs): return FakeLock()
+    async def exists(self, key): return int(key in self.hashes)
+    async def rename(self, src, dst): self.hashes[dst] = self.hashes.pop(src)
+    async def hgetall(self, key): return dict(self.hashes.get(key, {}))
+    def pipeline(self, transaction=True): return FakePipeline(self)
+    async def delete(self, key): self.hashes.pop(key, None)
+
+    async def hsetnx(self, key, field, value):
+        if field in self.hashes[key]:
+            return 0
+        self.hashes[key][field] = value
+        return 1
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hincrby(self, key, field, amount): self.commands.append((key, field, amount, True))
+    def hset(self, key, field, value): self.commands.append((key, field, value, False))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        for key, field, value, add in self.commands:
+            values = self.redis.hashes.setdefault(key, {})
+            values[field] = int(values.get(field, 0)) + value if add else value
+
+
+def test_click_counter_aggregates_per_code():
+    counter = ClickCounter()
+    counter.record("abc", ts=10.0)
+    counter.record("abc", ts=5.0)
+    counter.record("xyz", ts=7.0)
+    assert counter.pending("abc") == (2, 10.0)
+    deltas = counter.drain()
+    assert deltas == {"abc": (2, 10.0), "xyz": (1, 7.0)}
+    assert not counter.has_pending()
+    counter.restore(deltas)
+    assert counter.pending("xyz") == (1, 7.0)
+
+
+def test_postgres_flush_is_single_update_from_values():
+    stmt, params = build_click_update("postgresql", [("a", 3, None), ("b", 1, None)])
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert params is None
+    assert "FROM (VALUES" in sql
+    assert sql.startswith("UPDATE links SET")
+
+
+async def _make_link(session, code, clicks=0):
+    link = Link(original_url=f"https://{code}.com", short_code=code, click_count=clicks)
+    session.add(link)
+    await session.commit()
+    return link
+
+
+@pytest.mark.asyncio
+async def test_apply_deltas_updates_counts(async_session):
+    await _make_link(async_session, "delta1", clicks=2)
+    await _make_link(async_session, "delta2")
+    await apply_deltas(async_session, {"delta1": (3, 1700000000.0), "delta2": (1, 1700000100.0)})
+
+    rows = await async_session.execute(
+        select(Link.short_code, Link.click_count, Link.last_click).where(Link.short_code.in_(["delta1", "delta2"]))
+    )
+    result = {code: (count, last) for code, count, last in rows}
+    assert result["delta1"][0] == 5
+    assert result["delta2"][0] == 1
+    assert result["delta1"][1] == datetime.utcfromtimestamp(1700000000.0)
+
+
+@pytest.mark.asyncio
+async def test_flush_recovers_orphaned_batch_first(async_session, monkeypatch):
+    await _make_link(async_session, "orphan1")
+    redis = FakeRedis({
+        FLUSHING_KEY: {"c:orphan1": "4", "t:orphan1": "1700000000.0"},
+        PENDING_KEY: {"c:orphan1": "1", "t:orphan1": "1700000001.0"},
+    })
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr("app.click_counter.get_redis", fake_get_redis)
+
+    assert await flush_redis_to_db(async_session) == 1
+    assert FLUSHING_KEY not in redis.hashes
+    assert PENDING_KEY in redis.hashes
+    assert await flush_redis_to_db(async_session) == 1
+    assert redis.hashes == {}
+
+    count = await async_session.scalar(select(Link.click_count).where(Link.short_code == "orphan1"))
+    assert count == 5
+
+
+@pytest.mark.asyncio
+async def test_flush_retried_after_commit_is_not_counted_twice(async_session, monkeypatch):
+    await _make_link(async_session, "retry1", clicks=1)
+    redis = FakeRedis({PENDING_KEY: {"c:retry1": "3", "t:retry1": "1700000000.0"}})
+
+    async def fake_get_redis():
+        return redis
+
+    async def crash_before_delete(key):
+        raise ConnectionError("flusher died")
+
+    monkeypatch.setattr("app.click_counter.get_redis", fake_get_redis)
+    redis.delete = crash_before_delete
+    with pytest.raises(ConnectionError):
+        await flush_redis_to_db(async_session)
+    assert FLUSHING_KEY in redis.hashes
+
+    del redis.delete
+    assert await flush_redis_to_db(async_session) == 0
+    assert redis.hashes == {}
+    count = await async_session.scalar(select(Link.click_count).where(Link.short_code == "retry1"))
+    assert count == 4
+
+
+@pytest.mark.asyncio
+async def test_flush_falls_back_to_db_without_redis(async_session, monkeypatch):
+    async def broken_get_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.click_counter.get_redis", broken_get_redis)
+    await _make_link(async_session, "fallback1", clicks=1)
+    click_counter.record("fallback1")
+    click_counter.record("fallback1")
+
+    assert await spill_to_redis() == 0
+    assert click_counter.pending("fallback1")[0] == 2
+    assert await flush_clicks(async_session) == 1
+    assert not click_counter.has_pending()
+
+    link = (await async_session.execute(select(Link).where(Link.short_code == "fallback1"))).scalar_one()
+    await async_session.refresh(link)
+    assert link.click_count == 3
+    assert link.last_click is not None
+
+
+@pytest.mark.asyncio
+async def test_clicks_reach_redis_on_the_next_loop_iteration(monkeypatch):
+    redis = FakeRedis()
+    redis.round_trips = 0
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr("app.click_counter.get_redis", fake_get_redis)
+    monkeypatch.setattr(click_counter, "retry_at", 0.0)
+    for _ in range(3):
+        count_click("durable1")
+    count_click("durable2")
+    await asyncio.gather(*spill_tasks)
+    # One pipeline for the whole iteration, nothing left for the periodic spiller.
+    assert redis.round_trips == 1
+    assert redis.hashes[PENDING_KEY]["c:durable1"] == 3
+    assert redis.hashes[PENDING_KEY]["c:durable2"] == 1
+    assert not click_counter.has_pending()
+
+
+@pytest.mark.asyncio
+async def test_failed_click_spill_waits_for_the_spiller(monkeypatch):
+    calls = 0
+
+    async def broken_get_redis():
+        nonlocal calls
+        calls += 1
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.click_counter.get_redis", broken_get_redis)
+    monkeypatch.setattr(click_counter, "retry_at", 0.0)
+    count_click("retrylater1")
+    await asyncio.gather(*spill_tasks)
+    count_click("retrylater1")
+    assert not spill_tasks
+    assert calls == 1
+    assert click_counter.pending("retrylater1")[0] == 2
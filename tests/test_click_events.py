@@ -0,0 +1,131 @@
+import time
+import pytest
+from datetime import datetime
+from sqlalchemy import select
+
+from app.click_events import (
+    ClickEventBuffer, click_events, compact_event, event_row, ship_click_events, store_events, store_stream_entries,
+)
+from app.models.models import ClickRollup
+
+
+def test_buffer_keeps_raw_headers_and_drops_oldest():
+    buffer = ClickEventBuffer(2)
+    headers = [(b"referer", b"https://news.example.com/post"), (b"user-agent", b"Mozilla/5.0 (iPhone)"),
+               (b"cf-ipcountry", b"de")]
+    buffer.record("a", headers)
+    buffer.record("b", [])
+    buffer.record("c", [])
+    assert buffer.dropped == 1
+
+    first, *_ = buffer.drain()
+    assert first[0] == "b"
+    fields = compact_event(("a", 1.5, *(value for _, value in headers), b"10.0.0.1"))
+    assert {k: v for k, v in fields.items() if k != "v"} == {"c": "a", "t": "1.5", "r": "news.example.com", "u": "mobile", "g": "DE"}
+    assert compact_event(("a", 1.5, b"", b"Googlebot/2.1", b"", b""))["u"] == "bot"
+
+
+@pytest.mark.asyncio
+async def test_store_events_skips_redelivered_entries(async_session):
+    ts = time.time()
+    entries = [
+        (f"{int(ts * 1000)}-{i}", {"c": "evcode", "t": repr(ts + i), "r": "", "u": "desktop", "g": ""})
+        for i in range(3)
+    ]
+    assert await store_stream_entries(async_session, entries) == [event_id for event_id, _ in entries]
+    assert await store_events(async_session, [event_row(event_id, fields) for event_id, fields in entries]) == 0
+
+    total = (await async_session.execute(
+        select(ClickRollup.clicks).where(ClickRollup.short_code == "evcode")
+    )).scalars().all()
+    assert sum(total) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.filterwarnings("error:Pydantic serializer warnings")
+async def test_redirect_events_reach_stats_histograms(async_client, monkeypatch):
+    await async_client.post("/auth/register", json={"email": "events@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "events@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    code = (await async_client.post("/links/shorten", json={"original_url": "https://events.com"}, headers=headers)).json()["short_code"]
+
+    for _ in range(2):
+        resp = await async_client.get(f"/{code}", headers={"User-Agent": "curl/8.0"}, follow_redirects=False)
+        assert resp.status_code == 307
+    assert len(click_events) == 2
+
+    async def broken_get_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.click_events.get_redis", broken_get_redis)
+    assert await ship_click_events() == 2
+    assert len(click_events) == 0
+
+    stats = (await async_client.get(f"/links/{code}/stats", headers=headers)).json()
+    assert sum(bucket["clicks"] for bucket in stats["hourly"]) == 2
+    assert sum(bucket["clicks"] for bucket in stats["daily"]) == 2
+    assert all(datetime.fromisoformat(bucket["bucket"]).minute == 0 for bucket in stats["hourly"])
+    assert all(datetime.fromisoformat(bucket["bucket"]).hour == 0 for bucket in stats["daily"])
+
+
+class FakeHLLRedis:
+    # Exact sets stand in for HyperLogLogs.
+    def __init__(self):
+        self.sets = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def pfcount(self, *keys):
+        return len(set().union(*(self.sets.get(key, set()) for key in keys)))
+
+    async def exists(self, key):
+        return int(key in self.sets)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def xadd(self, *args, **kwargs): pass
+    def expire(self, *args): pass
+
+    def pfadd(self, key, *values):
+        self.redis.sets.setdefault(key, set()).update(values)
+
+    def pfmerge(self, dest, *keys):
+        self.redis.sets[dest] = set().union(*(self.redis.sets.get(key, set()) for key in keys))
+
+    async def execute(self): pass
+
+
+@pytest.mark.asyncio
+async def test_unique_visitors_from_daily_hyperloglogs(async_client, monkeypatch):
+    from app.click_events import visitor_key
+
+    await async_client.post("/auth/register", json={"email": "visitors@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "visitors@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    code = (await async_client.post("/links/shorten", json={"original_url": "https://visitors.com"}, headers=headers)).json()["short_code"]
+
+    fake = FakeHLLRedis()
+
+    async def fake_get_redis():
+        return fake
+
+    monkeypatch.setattr("app.click_events.get_redis", fake_get_redis)
+    for ip, agent in [("1.1.1.1", "a"), ("1.1.1.1", "a"), ("2.2.2.2", "a"), ("1.1.1.1", "b")]:
+        await async_client.get(f"/{code}", headers={"User-Agent": agent, "X-Forwarded-For": ip}, follow_redirects=False)
+    await ship_click_events()
+
+    today = datetime.utcnow().date()
+    assert len(fake.sets[visitor_key(code, today)]) == 3
+    stats = (await async_client.get(f"/links/{code}/stats", headers=headers)).json()
+    assert stats["unique_visitors"] == 3
+    assert stats["visitors_to"] == today.isoformat()
+
+    long_range = {"visitors_from": "2020-01-01", "visitors_to": "2020-03-01"}
+    stats = (await async_client.get(f"/links/{code}/stats", params=long_range, headers=headers)).json()
+    assert stats["unique_visitors"] == 0
+    bad = await async_client.get(f"/links/{code}/stats", params={"visitors_from": "2021-01-02", "visitors_to": "2021-01-01"}, headers=headers)
+    assert bad.status_code == 400
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from sqlalchemy import event, text
+
+from app.db import engine_options, make_engine
+from app.settings import Settings
+from app.db.metrics import InstrumentedQueuePool, current_scope, instrument_engine, pool_metrics
+from tests.conftest import engine_test
+
+
+def test_engine_options_from_settings():
+    settings = Settings(db_echo=False, db_statement_cache_size=64)
+    options = engine_options("postgresql+asyncpg://u:p@db/x", pool_size=7, max_overflow=3, read_only=True,
+                             settings=settings)
+    assert options["echo"] is False
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 7
+    assert options["max_overflow"] == 3
+    assert options["connect_args"]["server_settings"] == {"default_transaction_read_only": "on"}
+    assert options["connect_args"]["prepared_statement_cache_size"] == 64
+
+    memory = engine_options("sqlite+aiosqlite://", pool_size=7, max_overflow=3)
+    assert "pool_size" not in memory
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_per_route(tmp_path):
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db", "test-pool", pool_size=1, max_overflow=0)
+    token = current_scope.set({"path": "/x", "route": type("Route", (), {"path": "/links/{short_code}"})()})
+    try:
+        async def query():
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(query(), query())
+    finally:
+        current_scope.reset(token)
+        await engine.dispose()
+
+    snapshot = pool_metrics.pop("test-pool").snapshot()
+    route = snapshot["routes"]["/links/{short_code}"]
+    assert route["checkouts"] == 2
+    assert route["wait_max_ms"] > 0
+    assert route["hold_max_ms"] >= 10
+    assert snapshot["in_use"] == 0
+    assert snapshot["peak_in_use"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_endpoint(async_client, internal_headers):
+    resp = await async_client.get("/internal/db/pool", headers=internal_headers)
+    assert resp.status_code == 200
+    assert "primary" in resp.json()
+    assert "routes" in resp.json()["primary"]
+
+
+@pytest.mark.asyncio
+async def test_internal_endpoints_need_the_token(async_client, monkeypatch):
+    # Off unless INTERNAL_TOKEN is set.
+    assert (await async_client.get("/internal/db/pool")).status_code == 404
+    monkeypatch.setattr("app.api.internal.INTERNAL_TOKEN", "s3cret")
+    assert (await async_client.get("/internal/db/pool")).status_code == 401
+    wrong = {"Authorization": "Bearer guess"}
+    assert (await async_client.get("/internal/cache", headers=wrong)).status_code == 401
+    right = {"Authorization": "Bearer s3cret"}
+    assert (await async_client.get("/internal/db/pool", headers=right)).status_code == 200
+
+
+
+@pytest.mark.asyncio
+async def test_redirect_checkouts_use_route_template(async_client):
+    metrics = instrument_engine(engine_test, "test-redirect")
+    try:
+        await async_client.get("/nosuchcode")
+    finally:
+        event.remove(engine_test.sync_engine, "checkout", metrics.on_checkout)
+        event.remove(engine_test.sync_engine, "checkin", metrics.on_checkin)
+        pool_metrics.pop("test-redirect")
+    assert "/{short_code}" in metrics.routes
+    assert "/nosuchcode" not in metrics.routes
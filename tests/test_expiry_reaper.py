@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+from app.expiry_reaper import reap_expired
+from app.models.models import Link
+from app.redis_cache import LINK_CACHE_TTL, link_cache_ttl
+
+
+def test_link_cache_ttl_is_capped_by_expiry():
+    assert link_cache_ttl(None) == LINK_CACHE_TTL
+    assert link_cache_ttl(datetime.utcnow() + timedelta(days=1)) == LINK_CACHE_TTL
+    assert 0 < link_cache_ttl(datetime.utcnow() + timedelta(seconds=100)) <= 100
+    assert link_cache_ttl(datetime.utcnow() - timedelta(seconds=5)) <= 0
+
+
+@pytest.mark.asyncio
+async def test_reaper_deletes_only_links_past_grace(async_session, monkeypatch):
+    monkeypatch.setattr("app.expiry_reaper.EXPIRY_REAP_BATCH_SIZE", 2)
+    now = datetime.utcnow()
+    expiries = {
+        "reap-old1": now - timedelta(days=3),
+        "reap-old2": now - timedelta(days=2),
+        "reap-old3": now - timedelta(days=2, hours=1),
+        "reap-recent": now - timedelta(minutes=1),
+        "reap-future": now + timedelta(days=1),
+        "reap-never": None,
+    }
+    for code, expires_at in expiries.items():
+        async_session.add(Link(original_url=f"https://{code}.com", short_code=code, expires_at=expires_at))
+    await async_session.commit()
+
+    assert await reap_expired(async_session) == 3
+
+    left = set((await async_session.execute(select(Link.short_code).where(Link.short_code.like("reap-%")))).scalars())
+    assert left == {"reap-recent", "reap-future", "reap-never"}
+
+
+@pytest.mark.asyncio
+async def test_redirect_redis_ttl_stops_at_expiry(async_client, async_session, monkeypatch):
+    async_session.add(Link(
+        original_url="https://soon-expiring.com",
+        short_code="soonexp",
+        expires_at=datetime.utcnow() + timedelta(seconds=120),
+    ))
+    await async_session.commit()
+    calls = []
+
+    class FakeRedis:
+        async def get(self, key): return None
+        async def pttl(self, key): return -2
+        async def setex(self, *args): calls.append(args)
+
+    async def fake_get_redis():
+        return FakeRedis()
+
+    monkeypatch.setattr("app.api.main.get_redis", fake_get_redis)
+    resp = await async_client.get("/soonexp", follow_redirects=False)
+    assert resp.status_code == 307
+    assert calls and calls[0][0] == "soonexp"
+    assert 0 < calls[0][1] <= 120
+
+
+@pytest.mark.asyncio
+async def test_redis_hit_is_cached_locally_no_longer_than_its_ttl(async_client, monkeypatch):
+    from app.local_cache import link_cache
+
+    class FakeRedis:
+        async def get(self, key): return "https://redis-soon-expiring.com"
+        async def pttl(self, key): return 2500
+        async def setex(self, *args): pass
+
+    async def fake_get_redis():
+        return FakeRedis()
+
+    monkeypatch.setattr("app.api.main.get_redis", fake_get_redis)
+    link_cache.delete("redisexp")
+    resp = await async_client.get("/redisexp", follow_redirects=False)
+    assert resp.status_code == 307
+    # Two and a half seconds left in Redis: neither the fresh nor the stale window may reach past that.
+    _, expires_at, stale_until, _ = link_cache._data["redisexp"]
+    assert expires_at <= stale_until <= time.monotonic() + 2.5
+    link_cache.delete("redisexp")
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy.future import select
+
+from app.auth.hashing import BCRYPT_ROUNDS, PasswordHasher, needs_rehash, verify_password
+from app.models.models import User
+
+
+def _slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.mark.asyncio
+async def test_hasher_limits_concurrency_and_queue():
+    hasher = PasswordHasher(kind="thread", workers=1, max_pending=1)
+    results = await asyncio.gather(
+        hasher.run(_slow, 0.05), hasher.run(_slow, 0.05), hasher.run(_slow, 0.05), return_exceptions=True
+    )
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == 503
+    stats = hasher.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["max_wait_seconds"] > 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_hashes_off_the_event_loop():
+    hasher = PasswordHasher(kind="process", workers=1)
+    hashed = await hasher.hash("secret123")
+    assert await hasher.verify("secret123", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_when_cost_changes(async_client, async_session):
+    cheap = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secure123")
+    assert needs_rehash(cheap)
+    async_session.add(User(email="rehash@example.com", hashed_password=cheap))
+    await async_session.commit()
+
+    resp = await async_client.post("/auth/login", data={"username": "rehash@example.com", "password": "secure123"})
+    assert resp.status_code == 200
+
+    async_session.expire_all()
+    stored = await async_session.scalar(select(User.hashed_password).where(User.email == "rehash@example.com"))
+    assert stored.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert not needs_rehash(stored)
+    assert verify_password("secure123", stored)
+
+
+@pytest.mark.asyncio
+async def test_hasher_stats_reach_internal_stats_and_metrics(async_client, auth_headers, internal_headers):
+    await auth_headers("hashstats@example.com")
+    stats = (await async_client.get("/internal/stats", headers=internal_headers)).json()
+    assert stats["password_hasher"]["completed"] >= 2
+    assert stats["password_hasher"]["queue_depth"] == 0
+    assert {"cache", "redis", "bloom", "rate_limit"} <= stats.keys()
+
+    metrics = (await async_client.get("/metrics")).text
+    assert "password_hash_queue_depth 0" in metrics
+    assert 'password_hash_duration_seconds_count{operation="hash"}' in metrics
+    assert 'password_hash_duration_seconds_count{operation="verify"}' in metrics
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from redis.exceptions import ConnectionError
+
+import app.leader as leader
+import app.main as main
+from app.leader import run_once
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+
+    async def get_redis():
+        return redis
+
+    monkeypatch.setattr(leader, "get_redis", get_redis)
+    monkeypatch.setattr(leader, "STARTUP_POLL_INTERVAL", 0.01)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_runs_the_job(fake_redis):
+    runs = []
+
+    async def job():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+
+    results = await asyncio.gather(*(run_once("warmup", job) for _ in range(3)))
+    assert runs == [1]
+    assert sorted(results) == [False, False, True]
+    assert "startup:warmup:done" in fake_redis.data
+    assert "startup:warmup:lock" not in fake_redis.data
+    # Workers starting later skip it while the result is fresh.
+    assert await run_once("warmup", job) is False
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_leader_fails(fake_redis):
+    attempts = []
+
+    async def job():
+        attempts.append(1)
+        await asyncio.sleep(0.02)
+        if len(attempts) == 1:
+            raise RuntimeError("migration failed")
+
+    results = await asyncio.gather(run_once("database", job), run_once("database", job), return_exceptions=True)
+    assert len(attempts) == 2
+    assert isinstance(results[0], RuntimeError)
+    assert results[1] is True
+
+
+@pytest.mark.asyncio
+async def test_runs_locally_without_redis(monkeypatch):
+    async def get_redis():
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(leader, "get_redis", get_redis)
+    runs = []
+
+    async def job():
+        runs.append(1)
+
+    assert await run_once("database", job) is True
+    assert runs == [1]
+
+
+@pytest.mark.asyncio
+async def test_lifespan_runs_startup_and_shutdown(monkeypatch):
+    calls = []
+
+    async def startup(settings):
+        calls.append("startup")
+
+    async def shutdown():
+        calls.append("shutdown")
+
+    monkeypatch.setattr(main, "startup", startup)
+    monkeypatch.setattr(main, "shutdown", shutdown)
+    async with main.lifespan(main.app):
+        assert calls == ["startup"]
+    assert calls == ["startup", "shutdown"]
@@ -110,4 +110,37 @@ async def test_update_and_delete_link(async_client: AsyncClient):
     assert update_resp.json()["original_url"].rstrip("/") == new_url.rstrip("/")
 
     delete_resp = await async_client.delete(f"/links/{short_code}", headers=headers)
-    assert delete_resp.status_code == 204
\ No newline at end of file
+    assert delete_resp.status_code == 204
+
+@pytest.mark.asyncio
+async def test_reserved_aliases_are_rejected(async_client, auth_headers):
+    headers = await auth_headers("reserved@example.com")
+    for alias in ("docs", "metrics", "links", "cleanup"):
+        resp = await async_client.post("/links/shorten", json={"original_url": "https://reserved.com", "custom_alias": alias}, headers=headers)
+        assert resp.status_code == 400
+    batch = await async_client.post("/links/shorten/batch", json=[
+        {"original_url": "https://reserved.com", "custom_alias": "search"},
+        {"original_url": "https://reserved.com", "custom_alias": "notreserved1"},
+    ], headers=headers)
+    assert [result["error"] for result in batch.json()["results"]] == ["Custom alias is reserved", None]
+    resp = await async_client.put("/links/metrics", json={"original_url": "https://reserved.com"}, headers=headers)
+    assert resp.status_code == 400
+
+
+def test_reserved_aliases_cover_literal_routes():
+    from app.api.internal import metrics_router, router as internal_router
+    from app.api.main import router as link_router
+    from app.auth.auth import router as auth_router
+    from app.crud import RESERVED_ALIASES
+    from app.main import app
+
+    paths = [route.path for router in (link_router, auth_router, internal_router, metrics_router) for route in router.routes]
+    paths += [app.docs_url, app.redoc_url, app.openapi_url]
+    for path in paths:
+        if path == "/":
+            continue
+        segments = path.strip("/").split("/")
+        # What GET /{short_code} and /links/{short_code}[/stats] would lose to.
+        assert segments[0] in RESERVED_ALIASES, path
+        if segments[0] == "links" and len(segments) > 1 and not segments[1].startswith("{"):
+            assert segments[1] in RESERVED_ALIASES, path
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timedelta
+
+
+@pytest.mark.asyncio
+async def test_list_links_keyset_pages(async_client, auth_headers, create_links):
+    headers = await auth_headers("listing@example.com")
+    other = await auth_headers("listing-other@example.com")
+    await create_links(headers, "listing", 5)
+    await create_links(other, "listing-other", 2)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = await async_client.get("/links", params=params, headers=headers)
+        assert resp.status_code == 200
+        seen.extend(link["original_url"] for link in resp.json())
+        pages += 1
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        assert 'rel="next"' in resp.headers["link"]
+
+    assert pages == 3
+    assert set(resp.json()[0]) == {"original_url", "short_code", "created_at", "expires_at", "click_count", "last_click"}
+    assert seen == [f"https://listing.com/{i}" for i in reversed(range(5))]
+
+
+@pytest.mark.asyncio
+async def test_list_links_rejects_bad_cursor_and_limit(async_client, auth_headers):
+    headers = await auth_headers("listing-bad@example.com")
+    assert (await async_client.get("/links", params={"cursor": "not-a-cursor"}, headers=headers)).status_code == 400
+    assert (await async_client.get("/links", params={"limit": 100000}, headers=headers)).status_code == 422
+    assert (await async_client.get("/links")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_and_csv(async_client, auth_headers, create_links):
+    headers = await auth_headers("listing-export@example.com")
+    await create_links(headers, "listing-export", 3)
+
+    resp = await async_client.get("/links", params={"export": "ndjson"}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [row["original_url"] for row in rows] == [f"https://listing-export.com/{i}" for i in (2, 1, 0)]
+
+    resp = await async_client.get("/links", params={"export": "csv"}, headers=headers)
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert len(rows) == 3
+    assert rows[0]["original_url"] == "https://listing-export.com/2"
+
+
+@pytest.mark.asyncio
+async def test_expired_links_paginated(async_client, auth_headers):
+    headers = await auth_headers("listing-expired@example.com")
+    expired = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+    for i in range(3):
+        await async_client.post(
+            "/links/shorten", json={"original_url": f"https://listing-expired.com/{i}", "expires_at": expired}, headers=headers
+        )
+
+    resp = await async_client.get("/links/expired", params={"limit": 1})
+    assert resp.status_code == 200
+    assert len(resp.json()) == 1
+    assert resp.headers["x-next-cursor"]
+
+    export = await async_client.get("/links/expired", params={"export": "ndjson"})
+    urls = {json.loads(line)["original_url"] for line in export.text.splitlines()}
+    assert {f"https://listing-expired.com/{i}" for i in range(3)} <= urls
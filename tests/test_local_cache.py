@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+
+from app.local_cache import LocalCache, link_cache, listen_for_invalidations
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.local_cache.time.monotonic", lambda: now[0])
+    cache = LocalCache(max_size=10, ttl=5)
+    cache.set("a", "https://a.com")
+    cache.set("b", 404, ttl=1)
+    now[0] += 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "https://a.com"
+    now[0] += 5
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_local_cache_stats():
+    cache = LocalCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_redirect_caches_negative_lookup(async_client):
+    resp = await async_client.get("/neverexisted", follow_redirects=False)
+    assert resp.status_code == 404
+    assert link_cache.get("neverexisted") == 404
+
+    resp = await async_client.get("/neverexisted", follow_redirects=False)
+    assert resp.status_code == 404
+    assert resp.json()["detail"] == "Short link not found"
+
+
+@pytest.mark.asyncio
+async def test_redirect_served_from_local_tier(async_client, monkeypatch):
+    async def failing_get_redis():
+        raise AssertionError("Redis must not be touched on a local hit")
+
+    link_cache.set("hotcode", "https://hot.example.com")
+    monkeypatch.setattr("app.api.main.get_redis", failing_get_redis)
+    resp = await async_client.get("/hotcode", follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == "https://hot.example.com"
+
+
+@pytest.mark.asyncio
+async def test_delete_link_evicts_local_tier(async_client):
+    await async_client.post("/auth/register", json={"email": "localevict@example.com", "password": "secure123"})
+    login = await async_client.post("/auth/login", data={"username": "localevict@example.com", "password": "secure123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    create = await async_client.post("/links/shorten", json={"original_url": "https://evict.com"}, headers=headers)
+    short_code = create.json()["short_code"]
+
+    await async_client.get(f"/{short_code}", follow_redirects=False)
+    assert link_cache.get(short_code) is not None
+
+    await async_client.delete(f"/links/{short_code}", headers=headers)
+    assert link_cache.get(short_code) is None
+    resp = await async_client.get(f"/{short_code}", follow_redirects=False)
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_invalidation_listener_evicts_published_codes(monkeypatch):
+    class FakePubSub:
+        async def subscribe(self, *channels): pass
+        async def listen(self):
+            yield {"type": "subscribe", "channel": "links:invalidate", "data": 1}
+            yield {"type": "message", "channel": "links:invalidate", "data": "stale"}
+            await asyncio.Event().wait()
+        async def aclose(self): pass
+
+    class FakeRedis:
+        def pubsub(self): return FakePubSub()
+
+    async def fake_get_redis():
+        return FakeRedis()
+
+    monkeypatch.setattr("app.local_cache.get_blocking_redis", fake_get_redis)
+    link_cache.set("stale", "https://old.com")
+    link_cache.set("fresh", "https://keep.com")
+    task = asyncio.create_task(listen_for_invalidations())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert link_cache.get("stale") is None
+    assert link_cache.get("fresh") == "https://keep.com"
@@ -46,6 +46,7 @@ async def test_redirect_expired_link(async_client: AsyncClient):
 async def test_redirect_with_redis_hit(async_client: AsyncClient, monkeypatch):
     class FakeRedis:
         async def get(self, key): return "https://redis-test.com"
+        async def pttl(self, key): return -1
         async def setex(self, *args, **kwargs): pass
         async def delete(self, *args, **kwargs): pass
 
@@ -76,4 +77,26 @@ async def test_redirect_with_redis_hit(async_client: AsyncClient, monkeypatch):
 
 
 def test_app_instance():
-    assert app.title == "URL Shortener"
\ No newline at end of file
+    assert app.title == "URL Shortener"
+
+@pytest.mark.asyncio
+async def test_redirect_fast_path_skips_get_db(async_client: AsyncClient, async_session):
+    from app.db import get_db
+    from app.models.models import Link
+
+    async_session.add(Link(original_url="https://fast.example.com/a b", short_code="fastpath1"))
+    await async_session.commit()
+
+    async def broken_get_db():
+        raise AssertionError("redirect must not resolve get_db")
+        yield
+
+    previous = app.dependency_overrides[get_db]
+    app.dependency_overrides[get_db] = broken_get_db
+    try:
+        resp = await async_client.get("/fastpath1", follow_redirects=False)
+    finally:
+        app.dependency_overrides[get_db] = previous
+    assert resp.status_code == 307
+    assert resp.headers["location"] == "https://fast.example.com/a%20b"
+    assert resp.headers["content-length"] == "0"
@@ -0,0 +1,41 @@
+import pytest
+
+from app.metrics import Counter, Histogram, cache_lookups, request_latency
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(("/x",), value)
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/x"} 3' in lines
+
+    counter = Counter("demo_total", "Demo.", ("name",))
+    counter.inc(('say "hi"',))
+    assert counter.render()[-1] == 'demo_total{name="say \\"hi\\""} 1'
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_labels_by_route_template(async_client, async_session):
+    from app.models.models import Link
+
+    async_session.add(Link(original_url="https://metrics.com", short_code="metricscode"))
+    await async_session.commit()
+    db_hits = cache_lookups.values.get(("db", "hit"), 0)
+    for _ in range(2):
+        assert (await async_client.get("/metricscode", follow_redirects=False)).status_code == 307
+
+    assert cache_lookups.values[("db", "hit")] == db_hits + 1
+    assert ("/{short_code}", "GET", 307) in request_latency.series
+    assert not any("metricscode" in labels[0] for labels in request_latency.series)
+
+    resp = await async_client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'http_request_duration_seconds_count{route="/{short_code}",method="GET",status="307"}' in body
+    assert 'cache_lookups_total{tier="local",result="hit"}' in body
+    assert "local_cache_entries" in body
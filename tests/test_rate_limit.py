@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError, NoScriptError
+
+import app.rate_limit as rate_limit_module
+from app.auth.utils import create_access_token
+from app.rate_limit import RateLimiter, load_rules, parse_limit, parse_user_tiers, rate_limiter
+
+
+class FakeRedis:
+    # Grants tokens from a fixed budget the way the Lua script would.
+    def __init__(self, budget, retry_ms=1500, scripts_loaded=True):
+        self.budget = budget
+        self.retry_ms = retry_ms
+        self.scripts_loaded = scripts_loaded
+        self.calls = []
+
+    async def evalsha(self, sha, numkeys, key, interval, tolerance, wanted):
+        if not self.scripts_loaded:
+            raise NoScriptError("NOSCRIPT No matching script")
+        return self._grant(key, wanted)
+
+    async def eval(self, script, numkeys, key, interval, tolerance, wanted):
+        self.scripts_loaded = True
+        return self._grant(key, wanted)
+
+    def _grant(self, key, wanted):
+        self.calls.append((key, wanted))
+        granted = min(wanted, self.budget)
+        self.budget -= granted
+        return [granted, 0 if granted else self.retry_ms]
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    def configure(rules, redis=None):
+        monkeypatch.setattr(rate_limiter, "enabled", True)
+        monkeypatch.setattr(rate_limiter, "rules", load_rules(rules))
+        rate_limiter.leases.clear()
+        rate_limiter.fallback.clear()
+        rate_limiter.identities.clear()
+        rate_limiter.refills.clear()
+        for counter in ("local_grants", "early_grants", "redis_calls", "fallback_calls", "throttled"):
+            monkeypatch.setattr(rate_limiter, counter, 0)
+
+        async def get_redis():
+            if redis is None:
+                raise ConnectionError("down")
+            return redis
+
+        monkeypatch.setattr(rate_limit_module, "get_redis", get_redis)
+        return rate_limiter
+
+    return configure
+
+
+def test_parse_limit():
+    limit = parse_limit("60/minute:20")
+    assert (limit.count, limit.period, limit.burst) == (60, 60, 20)
+    assert limit.interval == 1000
+    assert parse_limit("5/2.5").burst == 5
+
+
+def test_rules_match_templates_and_fall_back_to_catch_all():
+    rules = load_rules('{"GET /links/{short_code}/stats": {"default": "1/second"}}')
+    limiter = RateLimiter(rules, {})
+    assert limiter.match("GET", "/links/abc/stats").name == "GET /links/{short_code}/stats"
+    assert limiter.match("GET", "/abc123").name == "GET /{short_code}"
+    assert limiter.match("POST", "/links/shorten").name == "POST /links/shorten"
+    assert limiter.match("DELETE", "/links/abc").name == "*"
+    assert limiter.match("GET", "/links", literal=True).name == "*"
+
+
+def test_identity_uses_verified_token_and_tier():
+    limiter = RateLimiter(load_rules(), parse_user_tiers("7:premium"))
+    token = create_access_token({"sub": "7"})
+    scope = {"headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 1)}
+    assert limiter.identify(scope) == ("user:7", "premium")
+    forged = {"headers": [(b"authorization", b"Bearer not-a-jwt")], "client": ("10.0.0.1", 1)}
+    assert limiter.identify(forged) == ("ip:10.0.0.1", "anonymous")
+
+
+def test_forwarded_for_is_read_only_from_trusted_proxies():
+    limiter = RateLimiter(load_rules(), {})
+    # Behind the load balancer: the client is the nearest hop that isn't one of our proxies.
+    proxied = {"headers": [(b"x-forwarded-for", b"6.6.6.6, 203.0.113.7, 10.0.0.2")], "client": ("10.0.0.1", 1)}
+    assert limiter.identify(proxied) == ("ip:203.0.113.7", "anonymous")
+    # Straight from the internet the header is the client's own word.
+    direct = {"headers": [(b"x-forwarded-for", b"203.0.113.7")], "client": ("198.51.100.9", 1)}
+    assert limiter.identify(direct) == ("ip:198.51.100.9", "anonymous")
+
+
+@pytest.mark.asyncio
+async def test_leased_tokens_skip_redis(async_client, limiter):
+    redis = FakeRedis(budget=10)
+    configured = limiter('{"GET /{short_code}": {"default": "100/minute:40"}}', redis)
+    for _ in range(10):
+        resp = await async_client.get("/rl-missing")
+        assert resp.status_code == 404
+    assert len(redis.calls) == 1
+    assert redis.calls[0] == ("ratelimit:GET /{short_code}:ip:127.0.0.1", 10)
+    assert configured.early_grants == 1
+    assert configured.local_grants == 9
+
+    resp = await async_client.get("/rl-missing")
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "2"
+    assert resp.json() == {"detail": "Too many requests"}
+
+
+@pytest.mark.asyncio
+async def test_missing_script_is_loaded_with_eval(async_client, limiter):
+    redis = FakeRedis(budget=1, scripts_loaded=False)
+    limiter('{"GET /{short_code}": {"default": "1/minute"}}', redis)
+    assert (await async_client.get("/rl-missing")).status_code == 404
+    assert redis.scripts_loaded
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_local_bucket_without_redis(async_client, limiter):
+    configured = limiter('{"GET /{short_code}": {"default": "2/minute:2"}}')
+    assert (await async_client.get("/rl-missing")).status_code == 404
+    assert (await async_client.get("/rl-missing")).status_code == 404
+    resp = await async_client.get("/rl-missing")
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers["retry-after"]) <= 30
+    assert configured.early_grants == 2
+
+
+@pytest.mark.asyncio
+async def test_metrics_is_exempt_but_internal_routes_are_limited(async_client, limiter, internal_headers):
+    limiter('{"*": {"default": "1/minute:1"}}')
+    for _ in range(3):
+        assert (await async_client.get("/metrics")).status_code == 200
+    assert (await async_client.get("/internal/rate-limit", headers=internal_headers)).status_code == 200
+    assert (await async_client.get("/internal/rate-limit", headers={"Authorization": "Bearer guess"})).status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_redirect_rule_leaves_literal_routes_alone(async_client, limiter, auth_headers):
+    limiter('{"GET /{short_code}": {"default": "1/minute:1"}}')
+    headers = await auth_headers("rl-literal@example.com")
+    for _ in range(3):
+        assert (await async_client.get("/links", headers=headers)).status_code == 200
+    assert (await async_client.get("/rl-missing")).status_code == 404
+    assert (await async_client.get("/rl-missing")).status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_first_request_does_not_wait_for_the_lease(limiter):
+    class SlowRedis(FakeRedis):
+        async def evalsha(self, *args):
+            await released.wait()
+            return await super().evalsha(*args)
+
+    released = asyncio.Event()
+    redis = SlowRedis(budget=10)
+    configured = limiter('{"GET /{short_code}": {"default": "100/minute:40"}}', redis)
+    rule = configured.match("GET", "/abc")
+    limit = rule.limit_for("anonymous")
+    assert await asyncio.wait_for(configured.check(rule, limit, "ip:first"), 0.1) == 0
+    assert configured.early_grants == 1 and not redis.calls
+
+    released.set()
+    await configured.refills["ratelimit:GET /{short_code}:ip:first"]
+    # The lease landed, less the token the first request already spent.
+    assert configured.leases.get("ratelimit:GET /{short_code}:ip:first") == [9]
+    assert await configured.check(rule, limit, "ip:first") == 0
+    assert configured.local_grants == 1
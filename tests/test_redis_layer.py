@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.redis_cache import CircuitBreaker, RedisLayer, RedisUnavailable, report_redis_error
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(("get", key))
+
+    def setex(self, key, ttl, value):
+        self.commands.append(("setex", key, value))
+
+    async def execute(self, raise_on_error=True):
+        self.client.round_trips += 1
+        if self.client.down:
+            raise ConnectionError("down")
+        results = []
+        for command in self.commands:
+            if command[0] == "get":
+                results.append(self.client.data.get(command[1]))
+            else:
+                self.client.data[command[1]] = command[2]
+                results.append(True)
+        return results
+
+
+class FakeClient:
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+        self.down = False
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        self.round_trips += 1
+        if self.down:
+            raise ConnectionError("down")
+        return self.data.get(key)
+
+    async def ping(self):
+        return await self.get("ping")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_commands_share_one_round_trip():
+    client = FakeClient()
+    layer = RedisLayer(client)
+    await asyncio.gather(*(layer.setex(f"k{i}", 60, f"v{i}") for i in range(10)))
+    assert client.round_trips == 1
+
+    values = await asyncio.gather(*(layer.get(f"k{i}") for i in range(10)), layer.get("missing"))
+    assert values == [f"v{i}" for i in range(10)] + [None]
+    assert client.round_trips == 2
+    assert layer.auto_pipeline.largest == 11
+
+
+@pytest.mark.asyncio
+async def test_breaker_skips_redis_until_cooldown():
+    client = FakeClient()
+    client.down = True
+    layer = RedisLayer(client)
+    layer.breaker = CircuitBreaker(failures=2, cooldown=0.05)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await layer.get("k")
+    trips = client.round_trips
+    with pytest.raises(RedisUnavailable):
+        await layer.ping()
+    assert client.round_trips == trips
+    assert layer.breaker.snapshot()["state"] == "open"
+
+    await asyncio.sleep(0.06)
+    client.down = False
+    assert await layer.ping() is None
+    assert layer.breaker.snapshot() == {"state": "closed", "consecutive_failures": 0, "opened": 1, "rejected": 1}
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_logs_once_not_per_call(capsys):
+    client = FakeClient()
+    client.down = True
+    layer = RedisLayer(client)
+    layer.breaker = CircuitBreaker(failures=2, cooldown=60)
+
+    for _ in range(5):
+        try:
+            await layer.ping()
+        except Exception as e:
+            report_redis_error("[Redis] GET", e)
+    lines = capsys.readouterr().out.splitlines()
+    # Two real failures, the breaker opening, and nothing for the three calls it skipped.
+    assert sum("[Redis] GET failed" in line for line in lines) == 2
+    assert sum("circuit open" in line for line in lines) == 1
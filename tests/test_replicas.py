@@ -0,0 +1,146 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, configure_engines
+import app.db.replicas as replicas
+from app.db.replicas import (
+    RoutingSession, current_user_id, load_recent_write, recent_writes, replica_set, request_writers, share_writes,
+)
+from app.models.models import Link
+from tests.conftest import engine_test
+
+
+async def make_stand_in(path):
+    # An empty SQLite database plays a replica that has not caught up yet.
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+async def find(maker, short_code):
+    async with maker(info={"replica": True}) as db:
+        return (await db.execute(select(Link.original_url).where(Link.short_code == short_code))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_own_write(tmp_path):
+    primary = await make_stand_in(tmp_path / "primary.db")
+    replica = await make_stand_in(tmp_path / "replica.db")
+    maker = sessionmaker(bind=primary, class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
+    replica_set.configure([("replica-0", replica)])
+    recent_writes.clear()
+    token = current_user_id.set(7)
+    try:
+        async with maker(info={"replica": True}) as db:
+            db.add(Link(original_url="https://primary.example", short_code="rw1"))
+            await db.commit()
+
+        assert await find(maker, "rw1") == "https://primary.example"
+
+        current_user_id.set(8)
+        assert await find(maker, "rw1") is None
+
+        current_user_id.set(7)
+        recent_writes.clear()
+        assert await find(maker, "rw1") is None
+    finally:
+        current_user_id.reset(token)
+        replica_set.configure([])
+        recent_writes.clear()
+        await primary.dispose()
+        await replica.dispose()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = str(value)
+
+    async def get(self, key):
+        return self.data.get(key)
+
+
+@pytest.mark.asyncio
+async def test_write_through_one_worker_pins_reads_on_another(tmp_path, monkeypatch):
+    primary = await make_stand_in(tmp_path / "primary.db")
+    replica = await make_stand_in(tmp_path / "replica.db")
+    maker = sessionmaker(bind=primary, class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
+    redis = FakeRedis()
+
+    async def get_redis():
+        return redis
+
+    monkeypatch.setattr(replicas, "get_redis", get_redis)
+    replica_set.configure([("replica-0", replica)])
+    recent_writes.clear()
+    writers = set()
+    token = current_user_id.set(9)
+    writers_token = request_writers.set(writers)
+    try:
+        async with maker(info={"replica": True}) as db:
+            db.add(Link(original_url="https://primary.example", short_code="rw2"))
+            await db.commit()
+        assert writers == {9}
+        await share_writes(writers)
+        assert "ryw:9" in redis.data
+
+        # Another worker: nothing local, the Redis marker sends user 9 to the primary.
+        recent_writes.clear()
+        await load_recent_write(9)
+        assert await find(maker, "rw2") == "https://primary.example"
+
+        current_user_id.set(10)
+        await load_recent_write(10)
+        assert await find(maker, "rw2") is None
+    finally:
+        request_writers.reset(writers_token)
+        current_user_id.reset(token)
+        replica_set.configure([])
+        recent_writes.clear()
+        await primary.dispose()
+        await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_replica_is_skipped(tmp_path):
+    primary = await make_stand_in(tmp_path / "primary.db")
+    broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db")
+    maker = sessionmaker(bind=primary, class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Link(original_url="https://primary.example", short_code="hc1"))
+        await db.commit()
+    replica_set.configure([("replica-0", broken)])
+    try:
+        await replica_set.check_all()
+        status = replica_set.snapshot()["replica-0"]
+        assert status["healthy"] is False
+        assert status["last_error"]
+        assert replica_set.pick() is None
+        assert await find(maker, "hc1") == "https://primary.example"
+    finally:
+        replica_set.configure([])
+        await primary.dispose()
+        await broken.dispose()
+
+
+@pytest.mark.asyncio
+async def test_redirect_rechecks_primary_on_replica_miss(async_client, async_session, tmp_path, internal_headers):
+    async_session.add(Link(original_url="https://fresh.example", short_code="fresh1"))
+    await async_session.commit()
+    replica = await make_stand_in(tmp_path / "replica.db")
+    configure_engines(engine_test, replicas=[replica])
+    try:
+        resp = await async_client.get("/fresh1", follow_redirects=False)
+        assert resp.status_code == 307
+        assert resp.headers["location"] == "https://fresh.example"
+
+        status = await async_client.get("/internal/db/replicas", headers=internal_headers)
+        assert status.json()["replica-0"]["healthy"] is True
+    finally:
+        configure_engines(engine_test)
+        await replica.dispose()
@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+
+from app.local_cache import LocalCache, link_cache
+from app.models.models import Link
+from app.stampede import SingleFlight, link_loads
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_load():
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(flight.do("key", load) for _ in range(10)))
+    assert results == ["value"] * 10
+    assert len(calls) == 1
+    assert flight.stats() == {"inflight": 0, "started": 1, "coalesced": 9}
+
+
+def test_lookup_serves_stale_and_refreshes_early():
+    cache = LocalCache(10, 30)
+    cache.set("stale", "v", ttl=0, stale=30)
+    assert cache.get("stale") is None
+    assert cache.lookup("stale") == ("v", True)
+
+    cache.set("slow", "v", ttl=1, delta=1000)
+    assert cache.lookup("slow") == ("v", True)
+    cache.set("fast", "v", ttl=60, delta=0.001)
+    assert cache.lookup("fast") == ("v", False)
+
+    cache.set("gone", "v", ttl=0)
+    assert cache.lookup("gone") == (None, False)
+
+
+class FakeLock:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def acquire(self):
+        self.redis.lock_attempts += 1
+        return self.redis.lock_free
+
+    async def release(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self, lock_free=True, fill_after=None):
+        self.lock_free = lock_free
+        self.lock_attempts = 0
+        self.gets = 0
+        self.fill_after = fill_after
+        self.data = {}
+
+    async def get(self, key):
+        self.gets += 1
+        await asyncio.sleep(0.01)
+        if self.fill_after is not None and self.gets > self.fill_after:
+            return "https://filled-by-other-worker.com"
+        return self.data.get(key)
+
+    async def pttl(self, key):
+        return -1
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def lock(self, name, timeout=None, blocking=True):
+        return FakeLock(self)
+
+
+def counting_sessions(monkeypatch):
+    from app.api import main
+
+    opened = []
+    real = main.RedirectSessionLocal
+
+    def sessions(*args, **kwargs):
+        opened.append(1)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(main, "RedirectSessionLocal", sessions)
+    return opened
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once(async_client, async_session, monkeypatch):
+    async_session.add(Link(original_url="https://viral.com", short_code="viral"))
+    await async_session.commit()
+    fake = FakeRedis()
+
+    async def fake_get_redis():
+        return fake
+
+    monkeypatch.setattr("app.api.main.get_redis", fake_get_redis)
+    opened = counting_sessions(monkeypatch)
+
+    responses = await asyncio.gather(*(async_client.get("/viral", follow_redirects=False) for _ in range(20)))
+    assert {resp.status_code for resp in responses} == {307}
+    assert len(opened) == 1
+    assert fake.lock_attempts == 1
+    assert fake.data["viral"] == "https://viral.com"
+
+
+@pytest.mark.asyncio
+async def test_lost_fill_lock_waits_for_other_worker(async_client, monkeypatch):
+    fake = FakeRedis(lock_free=False, fill_after=2)
+
+    async def fake_get_redis():
+        return fake
+
+    monkeypatch.setattr("app.api.main.get_redis", fake_get_redis)
+    opened = counting_sessions(monkeypatch)
+
+    resp = await async_client.get("/filledelsewhere", follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == "https://filled-by-other-worker.com"
+    assert opened == []
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshed(async_client, async_session):
+    async_session.add(Link(original_url="https://new.com", short_code="swrcode"))
+    await async_session.commit()
+    link_cache.set("swrcode", "https://old.com", ttl=0, stale=30)
+
+    resp = await async_client.get("/swrcode", follow_redirects=False)
+    assert resp.headers["location"] == "https://old.com"
+    await asyncio.gather(*link_loads._inflight.values())
+    assert link_cache.get("swrcode") == "https://new.com"
+
+
+@pytest.mark.asyncio
+async def test_miss_joining_a_background_refresh_gets_its_url(async_client, async_session, monkeypatch):
+    from app.api import main
+
+    async_session.add(Link(original_url="https://refreshed.com", short_code="joinrefresh"))
+    await async_session.commit()
+    release = asyncio.Event()
+    real_resolve = main.resolve_link
+
+    async def slow_resolve(short_code):
+        await release.wait()
+        return await real_resolve(short_code)
+
+    monkeypatch.setattr(main, "resolve_link", slow_resolve)
+    refresh = link_loads.start("joinrefresh", lambda: main.refresh_link("joinrefresh"))
+    # The entry is invalidated while its refresh is still running; the next miss joins that refresh.
+    link_cache.delete("joinrefresh")
+    pending = asyncio.ensure_future(async_client.get("/joinrefresh", follow_redirects=False))
+    await asyncio.sleep(0.05)
+    release.set()
+    resp = await pending
+    assert resp.status_code == 307
+    assert resp.headers["location"] == "https://refreshed.com"
+    assert await refresh == "https://refreshed.com"
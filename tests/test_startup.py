@@ -0,0 +1,155 @@
+import sys
+import pytest
+
+import app.settings as settings_module
+from app import db
+from app.db.metrics import pool_metrics
+from app.main import create_app
+from app.profiling import ImportTimer, StartupProfile
+from app.settings import Settings, acquire_settings, configure_settings, get_settings, release_settings
+
+
+@pytest.fixture
+def restore_settings(monkeypatch):
+    monkeypatch.setattr(settings_module, "current_settings", settings_module.current_settings)
+    monkeypatch.setattr(settings_module, "settings_users", settings_module.settings_users)
+
+
+def test_create_app_uses_given_settings(restore_settings):
+    before = get_settings()
+    settings = Settings(title="Shortener under test", redis_url="redis://cache:6379/1")
+    app = create_app(settings)
+    assert app.title == "Shortener under test"
+    assert app.state.settings is settings
+    # Building an app leaves the process' settings alone; only its lifespan takes them over.
+    assert get_settings() is before
+
+
+def test_running_app_keeps_its_settings(restore_settings):
+    first = Settings(title="first", redis_url="redis://cache:6379/1")
+    second = Settings(title="second", redis_url="redis://other-cache:6379/2")
+    # Lazily built clients such as the Redis pool read the running app's settings.
+    assert acquire_settings(first) is first
+    assert get_settings() is first
+    with pytest.raises(RuntimeError):
+        acquire_settings(second)
+    with pytest.raises(RuntimeError):
+        configure_settings(second)
+    assert get_settings() is first
+    # An app with equal settings may share the process; once both stop, other settings can take over.
+    acquire_settings(Settings(title="first", redis_url="redis://cache:6379/1"))
+    release_settings()
+    release_settings()
+    assert acquire_settings(second) is second
+    release_settings()
+
+
+@pytest.mark.asyncio
+async def test_second_app_with_other_settings_does_not_start(restore_settings):
+    running = Settings(title="running", redis_url="redis://cache:6379/1")
+    acquire_settings(running)
+    app = create_app(Settings(title="other", redis_url="redis://other-cache:6379/2"))
+    with pytest.raises(RuntimeError):
+        async with app.router.lifespan_context(app):
+            pass
+    assert get_settings() is running
+    assert settings_module.settings_users == 1
+
+
+@pytest.mark.asyncio
+async def test_init_engines_from_settings_and_dispose(tmp_path, restore_settings):
+    primary, redirect = db.engine, db.redirect_engine
+    metrics = dict(pool_metrics)
+    settings = Settings(database_url=f"sqlite+aiosqlite:///{tmp_path}/startup.db", db_redirect_pool=True,
+                        database_redirect_url=f"sqlite+aiosqlite:///{tmp_path}/startup.db")
+    try:
+        engine = db.init_engines(settings)
+        assert db.engine is engine
+        assert db.redirect_engine is not engine
+        assert len(db.owned_engines) == 2
+        await db.dispose_engines()
+        assert db.engine is None and db.owned_engines == []
+    finally:
+        db.configure_engines(primary, redirect)
+        pool_metrics.clear()
+        pool_metrics.update(metrics)
+    # Engines the caller configured are not the lifespan's to close.
+    await db.dispose_engines()
+    assert db.engine is primary
+
+
+def test_import_timer_reports_nested_modules(tmp_path, monkeypatch):
+    package = tmp_path / "timed_pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("import timed_pkg.child\n")
+    (package / "child.py").write_text("import time\ntime.sleep(0.01)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    timer = ImportTimer()
+    timer.install()
+    try:
+        import timed_pkg  # noqa: F401
+    finally:
+        timer.uninstall()
+        sys.modules.pop("timed_pkg.child", None)
+        sys.modules.pop("timed_pkg", None)
+    own, cumulative = timer.modules["timed_pkg"]
+    child_own, child_cumulative = timer.modules["timed_pkg.child"]
+    assert child_own >= 0.01
+    assert cumulative >= child_cumulative > own
+    assert sys.modules.get("timed_pkg") is None
+    assert any(line.startswith("timed_pkg ") for line in timer.report())
+
+
+def test_startup_profile_records_steps():
+    profile = StartupProfile()
+    with profile.step("engines"):
+        pass
+    lines = profile.report()
+    assert lines[1].startswith("engines")
+    assert lines[-1].startswith("total")
+
+
+@pytest.mark.asyncio
+async def test_migrations_run_against_the_configured_database(tmp_path):
+    from sqlalchemy import create_engine, inspect
+
+    from app.init_db import prepare_database
+
+    settings = Settings(database_url=f"sqlite+aiosqlite:///{tmp_path}/migrated.db", migrate_on_startup=True)
+    await prepare_database(settings)
+    engine = create_engine(f"sqlite:///{tmp_path}/migrated.db")
+    try:
+        tables = set(inspect(engine).get_table_names())
+    finally:
+        engine.dispose()
+    assert {"links", "users", "alembic_version"} <= tables
+
+
+def test_apply_settings_resizes_process_caches(monkeypatch):
+    from app.auth.utils import principal_cache
+    from app.bloom import link_guard
+    from app.click_events import click_events
+    from app.local_cache import link_cache
+    from app.main import apply_settings
+    from app.rate_limit import rate_limiter
+    from app.settings import AuthSettings, BloomSettings, CacheSettings, ClickSettings, RateLimitSettings
+
+    before = get_settings()
+    for target in (link_cache, principal_cache, click_events, link_guard, rate_limiter):
+        for name, value in list(vars(target).items()):
+            monkeypatch.setattr(target, name, value)
+    apply_settings(Settings(
+        auth=AuthSettings(cache_max_size=7, cache_ttl=11),
+        cache=CacheSettings(local_max_size=5, local_ttl=3, xfetch_beta=2.0),
+        clicks=ClickSettings(event_buffer_size=9, country_header="X-Country"),
+        bloom=BloomSettings(capacity=1000, error_rate=0.01),
+        rate_limit=RateLimitSettings(enabled=False, user_tiers="7:premium", lease=3, trusted_proxies=("10.0.0.0/8",)),
+    ))
+    assert (link_cache.max_size, link_cache.ttl, link_cache.xfetch_beta) == (5, 3, 2.0)
+    assert (principal_cache.max_size, principal_cache.ttl) == (7, 11)
+    assert click_events._events.maxlen == 9 and click_events.country_header == b"x-country"
+    assert (link_guard.capacity, link_guard.error_rate) == (1000, 0.01)
+    assert rate_limiter.user_tiers == {"7": "premium"} and rate_limiter.lease == 3
+    assert rate_limiter.is_trusted_proxy("10.1.2.3") and not rate_limiter.is_trusted_proxy("192.168.0.1")
+    # Applying settings doesn't make them the process' own; the lifespan does that.
+    assert get_settings() is before
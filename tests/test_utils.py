@@ -13,19 +13,30 @@ class FakeSession:
         return None
 
 
-def test_create_access_token(monkeypatch):
-    monkeypatch.setattr("app.auth.utils.SECRET_KEY", SECRET_KEY)
+def test_create_access_token(override_settings):
+    override_settings(auth={"secret_key": SECRET_KEY})
     token = create_access_token(data={"sub": "user@example.com"}, expires_delta=timedelta(minutes=5))
     decoded = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     assert decoded["sub"] == "user@example.com"
 
 
 @pytest.mark.asyncio
-async def test_get_current_user_invalid_token(monkeypatch):
-    monkeypatch.setattr("app.auth.utils.SECRET_KEY", SECRET_KEY)
+async def test_get_current_user_invalid_token(monkeypatch, override_settings):
+    override_settings(auth={"secret_key": SECRET_KEY})
     monkeypatch.setattr("app.auth.utils.ALGORITHM", ALGORITHM)
 
     invalid_token = "invalid.token.here"
 
     with pytest.raises(HTTPException):
-        await get_current_user(token=invalid_token, db=FakeSession())
\ No newline at end of file
+        await get_current_user(token=invalid_token, db=FakeSession())
+
+def test_url_hash_matches_normalized_spelling():
+    from app.utils.urls import normalize_url, url_hash
+
+    assert normalize_url("HTTPS://Example.COM:443") == "https://example.com/"
+    assert normalize_url("http://example.com:8080/a?b=1") == "http://example.com:8080/a?b=1"
+    assert url_hash("https://example.com") == url_hash("HTTPS://example.com:443/")
+    assert url_hash("https://example.com/a") != url_hash("https://example.com/b")
+    assert -2 ** 63 <= url_hash("https://example.com") < 2 ** 63
+    assert normalize_url(" http://[abc ") == "http://[abc"
+    assert normalize_url("http://example.com:99999") == "http://example.com:99999"